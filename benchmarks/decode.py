@@ -0,0 +1,62 @@
+# Decode throughput benchmark for depth messages.
+#
+# Usage: python -m benchmarks.decode [messages_file] [repeat]
+#
+# messages_file is either a capture file (see capture) or holds one raw
+# websocket depth message per line (as received from stream.binance.com).
+# Without it, synthetic messages in the same format are generated.
+# ast.literal_eval (the original decoder) is included as the baseline.
+import ast
+import sys
+import time
+
+import decoders
+from exchanges.simulated import diffGenerator
+from capture import MESSAGE, isCapture, readCapture
+
+
+# synthetic_messages : generate `count` Binance-style depth update messages
+#                      (see diffGenerator)
+def synthetic_messages(count, seed = 0):
+    generator = diffGenerator(seed = seed)
+    return [generator.message(event) for event in generator.events(count)]
+
+
+# load_messages : read the raw depth update messages of a capture file, or
+#                 one raw message per non-empty line of a text file
+def load_messages(path):
+    if isCapture(path):
+        return [record.payload for record in readCapture(path)
+                if record.kind == MESSAGE and
+                isinstance(record.payload, str) and
+                "depthUpdate" in record.payload]
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+# bench : messages decoded per second by `decode` over `repeat` passes
+def bench(decode, messages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for msg in messages:
+            decode(msg)
+    elapsed = time.perf_counter() - start
+    return len(messages) * repeat / elapsed
+
+
+def main(argv):
+    messages = load_messages(argv[1]) if len(argv) > 1 \
+        else synthetic_messages(10000)
+    repeat = int(argv[2]) if len(argv) > 2 else 5
+
+    candidates = dict(decoders.DECODERS)
+    candidates["ast.literal_eval"] = ast.literal_eval
+    size = sum(len(msg) for msg in messages) / len(messages)
+    print(f"{len(messages)} messages, {size:.0f} bytes on average")
+    for name, decode in candidates.items():
+        rate = bench(decode, messages, repeat)
+        print(f"{name:>18}: {rate:12,.0f} msgs/s")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
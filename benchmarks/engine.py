@@ -0,0 +1,222 @@
+# Book engine benchmark: update throughput, pricing latency and allocations
+# per update of every way of applying depth diffs to an orderBook.
+#
+# Usage: python -m benchmarks.engine [events] [json_file] [seed]
+#
+# events (default 100000) synthetic diffs are generated (see
+# exchanges.simulated.diffGenerator) and applied to a fresh book by every
+# update path.
+# The results are printed as a table and, if json_file is given, written to
+# it as JSON ("-" for stdout) for regression tracking.
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from exchanges.simulated import diffGenerator
+from book import orderBook
+from bookManager import processMsg
+from conflation import mergeDepthEvents
+from latency import latencyHistogram
+
+# Order sizes (base asset) and quote budgets priced after every update
+ORDER_SIZES = [0.1, 1.0, 10.0, 100.0]
+BUDGETS = [0.01, 0.1, 1.0]
+
+# Events merged into one diff by the conflated path
+CONFLATE = 10
+
+# Events run under tracemalloc for the allocation figures (tracing slows
+# everything down, so it runs on a prefix of the stream)
+ALLOC_EVENTS = 20000
+
+
+# _raw : an event's levels as raw [price, quantity] strings, as received
+def _raw(generator, event):
+    return generator.raw_levels(event.bids), generator.raw_levels(event.asks)
+
+
+# _updateBook : one orderBook.update_book call per raw level
+def _updateBook(book, item):
+    bids, asks = item
+    for px, qty in bids:
+        book.update_book('buy', px, qty)
+    for px, qty in asks:
+        book.update_book('sell', px, qty)
+
+
+# _applyDiff : one orderBook.apply_diff call per raw event
+def _applyDiff(book, item):
+    book.apply_diff(*item)
+
+
+# _conflated : processMsg on the net diff of CONFLATE events, as bookManager
+#              does with messages that queue up
+def _conflated(book, item):
+    processMsg(mergeDepthEvents(item), book)
+
+
+# Update paths by name: (prepare, apply, events per item). prepare(generator,
+# events) turns the generated events into the items apply(book, item) takes;
+# only apply is measured.
+UPDATE_PATHS = {
+    "update_book": (lambda generator, events:
+                    [_raw(generator, event) for event in events],
+                    _updateBook, 1),
+    "apply_diff": (lambda generator, events:
+                   [_raw(generator, event) for event in events],
+                   _applyDiff, 1),
+    "processMsg": (lambda generator, events: events,
+                   lambda book, item: processMsg(item, book), 1),
+    "conflated": (lambda generator, events:
+                  [events[i:i + CONFLATE]
+                   for i in range(0, len(events), CONFLATE)],
+                  _conflated, CONFLATE),
+}
+
+
+# _percentiles : p50/p99/p999/max of a latencyHistogram of nanoseconds, in
+#                microseconds
+def _percentiles(hist):
+    return {"p50": hist.percentile(50) / 1000,
+            "p99": hist.percentile(99) / 1000,
+            "p999": hist.percentile(99.9) / 1000,
+            "max": hist.max / 1000}
+
+
+# _freshBook : an orderBook loaded with the generator's initial snapshot
+def _freshBook(generator, depth):
+    book = orderBook(generator.symbol, config = generator.config)
+    book.load_levels(depth.bids, depth.asks)
+    return book
+
+
+# run : benchmark one update path over the generated events, starting from
+#       `depth` every pass. Returns a dict of results.
+def run(generator, depth, events, prepare, apply, per_item,
+        sizes = ORDER_SIZES, budgets = BUDGETS):
+    items = prepare(generator, events)
+    count = len(events)
+    levels = sum(len(event.bids) + len(event.asks) for event in events)
+
+    # Throughput: updates only
+    book = _freshBook(generator, depth)
+    gc.collect()
+    start = time.perf_counter()
+    for item in items:
+        apply(book, item)
+    elapsed = time.perf_counter() - start
+
+    # Latencies: every update followed by pricing, as the engine does
+    book = _freshBook(generator, depth)
+    clock = time.perf_counter_ns
+    apply_hist = latencyHistogram()
+    price_hist = latencyHistogram()
+    gc.collect()
+    for item in items:
+        start = clock()
+        apply(book, item)
+        applied = clock()
+        book.quote(sizes)
+        book.quote_notional(budgets)
+        price_hist.record(clock() - applied)
+        apply_hist.record(applied - start)
+
+    # Allocations: bytes allocated at peak while applying and pricing one
+    # item, and how many of them are still held afterwards (the book's own
+    # growth). clear_traces() forgets earlier blocks and resets the peak,
+    # so every item is measured on its own.
+    book = _freshBook(generator, depth)
+    traced = items[:max(1, ALLOC_EVENTS // per_item)]
+    peak_bytes = 0
+    retained_bytes = 0
+    gc.collect()
+    tracemalloc.start()
+    for item in traced:
+        tracemalloc.clear_traces()
+        apply(book, item)
+        book.quote(sizes)
+        book.quote_notional(budgets)
+        current, peak = tracemalloc.get_traced_memory()
+        peak_bytes += peak
+        retained_bytes += current
+    tracemalloc.stop()
+    traced_events = min(len(traced) * per_item, count)
+
+    return {"updates_per_sec": count / elapsed,
+            "levels_per_sec": levels / elapsed,
+            "apply_us": _percentiles(apply_hist),
+            "price_us": _percentiles(price_hist),
+            "alloc_peak_bytes_per_update": peak_bytes / traced_events,
+            "alloc_retained_bytes_per_update":
+                retained_bytes / traced_events}
+
+
+# benchmark : run every update path over `count` events generated with
+#             `seed`. Returns the results as a JSON-ready dict.
+def benchmark(count = 100000, seed = 0, paths = None):
+    generator = diffGenerator(seed = seed)
+    depth = generator.snapshot()
+    events = generator.events(count)
+    results = {}
+    for name in paths or UPDATE_PATHS:
+        results[name] = run(generator, depth, events, *UPDATE_PATHS[name])
+    return {
+        "benchmark": "engine",
+        "time": time.time(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "events": count,
+        "levels": sum(len(event.bids) + len(event.asks) for event in events),
+        "seed": seed,
+        "symbol": generator.symbol,
+        "snapshot_levels": len(depth.bids) + len(depth.asks),
+        "order_sizes": ORDER_SIZES,
+        "budgets": BUDGETS,
+        "conflate": CONFLATE,
+        "results": results,
+    }
+
+
+# report : the results of benchmark() as a table
+def report(results):
+    lines = [f"{results['events']} events, {results['levels']} levels "
+             f"(seed {results['seed']}, {results['symbol']}, "
+             f"{results['implementation']} {results['python']})",
+             f"{'path':>12} {'updates/s':>11} {'levels/s':>11} "
+             f"{'apply p50':>9} {'p99':>7} {'price p50':>9} {'p99':>7} "
+             f"{'peak B':>7} {'kept B':>7}"]
+    for name, result in results["results"].items():
+        apply_us = result["apply_us"]
+        price_us = result["price_us"]
+        lines.append(
+            f"{name:>12} {result['updates_per_sec']:>11,.0f} "
+            f"{result['levels_per_sec']:>11,.0f} "
+            f"{apply_us['p50']:>9.2f} {apply_us['p99']:>7.2f} "
+            f"{price_us['p50']:>9.2f} {price_us['p99']:>7.2f} "
+            f"{result['alloc_peak_bytes_per_update']:>7.0f} "
+            f"{result['alloc_retained_bytes_per_update']:>7.0f}")
+    lines.append("(latencies in us, allocations in bytes per update)")
+    return "\n".join(lines)
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 100000
+    output = argv[2] if len(argv) > 2 else None
+    seed = int(argv[3]) if len(argv) > 3 else 0
+
+    results = benchmark(count, seed)
+    print(report(results), file = sys.stderr if output == "-" else sys.stdout)
+    if output == "-":
+        json.dump(results, sys.stdout, indent = 2)
+        print()
+    elif output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent = 2)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
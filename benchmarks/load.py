@@ -0,0 +1,239 @@
+# End-to-end load test: the whole client (orderBook.stream, from the
+# websocket to the rendered quotes) against a local Binance simulator (see
+# benchmarks.simulator) under a ramp of message rates.
+#
+# Usage: python -m benchmarks.load [rates] [step_seconds] [symbols]
+#                                  [json_file]
+#
+# rates is a comma-separated list of messages per second, stepped through in
+# order (default 1000,2000,5000,10000,20000), each held for step_seconds
+# (default 5). The simulator runs in its own process, so the client has a
+# core to itself. Every step reports the rate the client actually
+# processed and its exchange-to-receive and exchange-to-output latencies;
+# the highest step the client keeps up with is the maximum sustained rate.
+# Steps where the simulator itself could not send at the requested rate are
+# flagged, and count for the rate actually sent.
+# The results are printed as a table and, if json_file is given, written
+# to it as JSON ("-" for stdout).
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+import urllib.request
+
+import websockets
+
+from benchmarks.simulator import serve
+from exchanges import binanceAdapter, binanceCombinedFeed
+from latency import latencyRecorder
+from orderBook import stream
+
+RATES = [1000, 2000, 5000, 10000, 20000]
+
+# Seconds at each rate before measuring, for queues to settle
+WARMUP = 1
+
+# A step is sustained if the client processes at least this share of the
+# messages the simulator sent, with a p99 exchange-to-receive latency within
+# LATENCY_LIMIT_MS. The simulator falls short if it sends less than this
+# share of the requested rate.
+SUSTAINED_SHARE = 0.95
+LATENCY_LIMIT_MS = 100
+
+
+# runSimulator : entry point of the simulator process; sends the port it
+#                listens on over `conn`
+def runSimulator(conn, options):
+    try:
+        asyncio.run(serve(lambda simulator: conn.send(simulator.port),
+                          **options))
+    except KeyboardInterrupt:
+        pass
+
+
+# _control : send a control command to the simulator (see
+#            benchmarks.simulator) and return its counters
+async def _control(api_base, command):
+    def get():
+        with urllib.request.urlopen(f"{api_base}/sim/{command}") as response:
+            return json.loads(response.read())
+    return await asyncio.get_running_loop().run_in_executor(None, get)
+
+
+# _keepStreaming : run stream() on fresh feeds from makeFeed, reconnecting
+#                  whenever the connection drops (until cancelled)
+async def _keepStreaming(makeFeed, orderSizes, latency, counters):
+    while True:
+        try:
+            await stream(makeFeed(), orderSizes, latency = latency)
+        except (websockets.ConnectionClosed, OSError):
+            counters["reconnects"] += 1
+            await asyncio.sleep(0.1)
+
+
+# _step : measure the client at `rate` messages per second for `seconds`
+async def _step(api_base, rate, seconds, latency, counters):
+    await _control(api_base, f"rate?rate={rate}")
+    await asyncio.sleep(WARMUP)
+    before = await _control(api_base, "stats")
+    reconnects = counters["reconnects"]
+    latency.reset()
+    start = time.monotonic()
+    await asyncio.sleep(seconds)
+    after = await _control(api_base, "stats")
+    elapsed = time.monotonic() - start
+
+    histograms = latency.histograms
+    receive = histograms["exchange_to_receive"]
+    output = histograms["exchange_to_output"]
+    processed = histograms["decode"].count / elapsed
+    sent = (after["sent"] - before["sent"]) / elapsed
+    result = {
+        "rate": rate,
+        "sent_per_sec": sent,
+        "processed_per_sec": processed,
+        "receive_ms": {"p50": receive.percentile(50) / 1000,
+                       "p99": receive.percentile(99) / 1000,
+                       "max": receive.max / 1000},
+        "output_ms": {"p50": output.percentile(50) / 1000,
+                      "p99": output.percentile(99) / 1000,
+                      "max": output.max / 1000},
+        "gaps": after["dropped"] - before["dropped"],
+        "resyncs": sum(sequencer.resyncs
+                       for sequencer in latency.sequencers.values()),
+        "disconnects": after["disconnects"] - before["disconnects"],
+        "reconnects": counters["reconnects"] - reconnects,
+    }
+    result["sustained"] = (processed >= SUSTAINED_SHARE * sent and
+                           receive.percentile(99) / 1000 <= LATENCY_LIMIT_MS)
+    result["simulator_short"] = sent < SUSTAINED_SHARE * rate
+    return result
+
+
+# loadTest : ramp the simulator at api_base/stream_base through `rates`
+#            while stream() consumes `symbols`, `seconds` per rate. Returns
+#            one result per step.
+async def loadTest(api_base, stream_base, symbols, rates = RATES,
+                   seconds = 5, orderSizes = (1.0,)):
+    def makeFeed():
+        if len(symbols) == 1:
+            return binanceAdapter(symbols[0], api_base = api_base,
+                                  stream_base = stream_base)
+        return binanceCombinedFeed(symbols, api_base = api_base,
+                                   stream_base = stream_base)
+
+    latency = latencyRecorder()
+    counters = {"reconnects": 0}
+    streaming = asyncio.ensure_future(
+        _keepStreaming(makeFeed, list(orderSizes), latency, counters))
+    results = []
+    try:
+        for rate in rates:
+            result = await _step(api_base, rate, seconds, latency, counters)
+            if streaming.done():
+                # The client failed for another reason than the connection
+                streaming.result()
+            print(report([result], header = not results), file = sys.stderr,
+                  flush = True)
+            results.append(result)
+    finally:
+        streaming.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await streaming
+    return results
+
+
+# report : step results as a table
+def report(results, header = True):
+    lines = []
+    if header:
+        lines.append(f"{'rate':>8} {'sent/s':>9} {'processed/s':>11} "
+                     f"{'recv p50':>9} {'p99':>8} {'out p50':>8} "
+                     f"{'p99':>8} {'gaps':>5} {'resync':>6} {'reconn':>6}"
+                     f"  (ms)")
+    for result in results:
+        receive = result["receive_ms"]
+        output = result["output_ms"]
+        lines.append(
+            f"{result['rate']:>8} {result['sent_per_sec']:>9,.0f} "
+            f"{result['processed_per_sec']:>11,.0f} "
+            f"{receive['p50']:>9.1f} {receive['p99']:>8.1f} "
+            f"{output['p50']:>8.1f} {output['p99']:>8.1f} "
+            f"{result['gaps']:>5} {result['resyncs']:>6} "
+            f"{result['reconnects']:>6}"
+            f"{'' if result['sustained'] else '  not sustained'}"
+            f"{'  simulator short' if result['simulator_short'] else ''}")
+    return "\n".join(lines)
+
+
+# maxSustained : highest rate of the steps the client kept up with (0 if
+#                none), taking the rate actually sent where the simulator
+#                fell short
+def maxSustained(results):
+    return max([round(result["sent_per_sec"]) if result["simulator_short"]
+                else result["rate"]
+                for result in results if result["sustained"]], default = 0)
+
+
+# run : start a simulator process with `options` (see binanceSimulator) and
+#       load test the client against it. Returns the results as a
+#       JSON-ready dict.
+def run(symbols, rates = RATES, seconds = 5, **options):
+    receiver, sender = multiprocessing.Pipe(duplex = False)
+    options = dict(options, symbols = symbols, rate = rates[0])
+    process = multiprocessing.Process(target = runSimulator,
+                                      name = "binanceSimulator",
+                                      args = (sender, options), daemon = True)
+    process.start()
+    try:
+        port = receiver.recv()
+        host = options.get("host", "127.0.0.1")
+
+        # The client prints its quotes on every render; keep them off the
+        # console
+        with open(os.devnull, "w") as devnull, \
+                contextlib.redirect_stdout(devnull):
+            steps = asyncio.run(loadTest(f"http://{host}:{port}",
+                                         f"ws://{host}:{port}", symbols,
+                                         rates, seconds))
+    finally:
+        process.terminate()
+        process.join()
+    return {
+        "benchmark": "load",
+        "time": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "symbols": symbols,
+        "seconds": seconds,
+        "simulator": {key: value for key, value in options.items()
+                      if key not in ("symbols", "rate")},
+        "max_sustained": maxSustained(steps),
+        "steps": steps,
+    }
+
+
+def main(argv):
+    rates = ([int(rate) for rate in argv[1].split(',')] if len(argv) > 1
+             else RATES)
+    seconds = float(argv[2]) if len(argv) > 2 else 5
+    symbols = (argv[3].upper().split(',') if len(argv) > 3 else ["BNBBTC"])
+    output = argv[4] if len(argv) > 4 else None
+
+    results = run(symbols, rates, seconds)
+    print(f"Maximum sustained rate: {results['max_sustained']} msgs/s",
+          file = sys.stderr if output == "-" else sys.stdout)
+    if output == "-":
+        json.dump(results, sys.stdout, indent = 2)
+        print()
+    elif output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent = 2)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
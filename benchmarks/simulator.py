@@ -0,0 +1,322 @@
+# Local stand-in for the Binance spot depth endpoints, for offline
+# end-to-end and load tests.
+#
+# Usage: python -m benchmarks.simulator [symbols] [port] [rate]
+#
+# Serves, on one port, synthetic diff depth streams for `symbols` (default
+# BNBBTC) at `rate` messages per second in total (default 100), and their
+# REST depth snapshots:
+#   ws://host:port/ws/<symbol>@depth               one symbol
+#   ws://host:port/stream?streams=<a>@depth/...    combined streams
+#   http://host:port/api/v3/depth?symbol=<symbol>&limit=<limit>
+# Point a client at it with the adapters' api_base/stream_base (see
+# exchanges.binance). The simulation is driven over HTTP while it runs:
+#   /sim/rate?rate=<msgs/s>          change the message rate
+#   /sim/burst?count=<n>             send n extra messages at once
+#   /sim/gap?symbol=<symbol>         drop the next message of a symbol
+#   /sim/disconnect                  close every stream connection
+#   /sim/stats                       counters, as JSON
+import asyncio
+import json
+import random
+import sys
+import time
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import websockets
+
+from exchanges.simulated import diffGenerator
+
+# Bounds of the REST depth limit parameter, as on Binance
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 5000
+
+JSON_HEADERS = [("Content-Type", "application/json")]
+
+
+class binanceSimulator:
+    def __init__(self, symbols = ("BNBBTC",), host = "127.0.0.1", port = 0,
+                 rate = 100, burst_prob = 0, burst_size = 100,
+                 gap_prob = 0, disconnect_interval = None,
+                 snapshot_delay = 0, seed = 0):
+        """
+        Class serving synthetic Binance diff depth streams and REST depth
+        snapshots, generated by one diffGenerator per symbol
+
+        symbols            : symbols to simulate
+        host               : interface to listen on
+        port               : port to listen on (0 picks a free one; see
+                             port once started)
+        rate               : messages per second, over all symbols
+        burst_prob         : probability per second of a burst
+        burst_size         : extra messages sent at once by a burst
+        gap_prob           : probability that a message is dropped (its
+                             update ids are skipped, so clients see a gap
+                             and have to resync)
+        disconnect_interval: seconds between forced disconnects of every
+                             stream connection (None for never)
+        snapshot_delay     : seconds every REST snapshot takes to serve, so
+                             clients buffer events while it is in flight
+        seed               : random seed of the generators and the injected
+                             faults
+
+        Diffs are stamped with the time they are generated and follow the
+        Binance update id rules, and a snapshot is the book as of the last
+        generated diff (dropped ones included), so a correct client stays
+        in sync through gaps, disconnects and resyncs. Messages are
+        generated on a fixed schedule, in batches of everything due, so the
+        rate holds as long as the simulator keeps up; compare the counters
+        (see stats) with the requested rate to tell.
+        """
+        self.host = host
+        self.port = port
+        self.burst_prob = burst_prob
+        self.burst_size = burst_size
+        self.gap_prob = gap_prob
+        self.disconnect_interval = disconnect_interval
+        self.snapshot_delay = snapshot_delay
+        self.random = random.Random(seed)
+        self.generators = {symbol: diffGenerator(symbol, start_time = None,
+                                                 seed = seed + i)
+                           for i, symbol in enumerate(symbols)}
+        self.symbols = list(self.generators)
+        self.clients = {}
+        self.gaps = set()
+        self.server = None
+        self.set_rate(rate)
+        self.sent = 0
+        self.generated = 0
+        self.dropped = 0
+        self.bursts = 0
+        self.disconnects = 0
+        self.snapshots = 0
+
+    # set_rate : change the message rate (messages per second)
+    def set_rate(self, rate):
+        self.rate = rate
+        self.rate_start = time.monotonic()
+        self.rate_generated = 0
+
+    # stats : counters of messages generated, sent (per connection),
+    #         dropped as gaps, bursts, disconnects and snapshots served
+    def stats(self):
+        return {"rate": self.rate, "generated": self.generated,
+                "sent": self.sent, "dropped": self.dropped,
+                "bursts": self.bursts, "disconnects": self.disconnects,
+                "snapshots": self.snapshots, "clients": len(self.clients)}
+
+    # start : start listening; the port is known once this returns
+    async def start(self):
+        self.server = await websockets.serve(
+            self._handler, self.host, self.port,
+            process_request = self._process_request)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    # api_base/stream_base : base URLs to hand the adapters
+    @property
+    def api_base(self):
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def stream_base(self):
+        return f"ws://{self.host}:{self.port}"
+
+    # close : stop listening and close every connection
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    # run : generate and send messages (until cancelled)
+    async def run(self):
+        rng = self.random
+        next_disconnect = None
+        if self.disconnect_interval:
+            next_disconnect = time.monotonic() + self.disconnect_interval
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(0.001)
+            now = time.monotonic()
+            elapsed = now - last
+            last = now
+
+            # Everything due at the current rate, plus any burst
+            due = (int((now - self.rate_start) * self.rate)
+                   - self.rate_generated)
+            self.rate_generated += due
+            if self.burst_prob and rng.random() < self.burst_prob * elapsed:
+                due += self.burst_size
+                self.bursts += 1
+            if due > 0:
+                await self.send(self.generate(due))
+
+            if next_disconnect is not None and now >= next_disconnect:
+                next_disconnect = now + self.disconnect_interval
+                self.disconnect()
+
+    # generate : the next `count` messages, spread over the symbols, as
+    #            (symbol, raw message) pairs. Dropped messages (gaps) are
+    #            generated but left out.
+    def generate(self, count):
+        rng = self.random
+        messages = []
+        for _ in range(count):
+            symbol = rng.choice(self.symbols)
+            generator = self.generators[symbol]
+            event = generator.next_update()
+            self.generated += 1
+            if symbol in self.gaps or (self.gap_prob and
+                                       rng.random() < self.gap_prob):
+                self.gaps.discard(symbol)
+                self.dropped += 1
+                continue
+            messages.append((symbol, generator.message(event)))
+        return messages
+
+    # send : send (symbol, raw message) pairs to every connection subscribed
+    #        to their symbol, wrapped for combined-stream connections
+    async def send(self, messages):
+        for websocket, streams in list(self.clients.items()):
+            combined, names = streams
+            try:
+                for symbol, message in messages:
+                    name = names.get(symbol)
+                    if name is None:
+                        continue
+                    if combined:
+                        message = f'{{"stream":"{name}","data":{message}}}'
+                    await websocket.send(message)
+                    self.sent += 1
+            except websockets.ConnectionClosed:
+                self.clients.pop(websocket, None)
+
+    # disconnect : close every stream connection, as the venue does now and
+    #              then (clients have to reconnect and resync). Nothing is
+    #              sent to them from now on; the closing handshakes finish
+    #              in the background.
+    def disconnect(self):
+        self.disconnects += 1
+        for websocket in self.clients:
+            asyncio.ensure_future(
+                websocket.close(1001, "simulated disconnect"))
+        self.clients.clear()
+
+    # _streams : (combined, {symbol: stream name}) of a stream request path,
+    #            or None if it does not name any simulated depth stream
+    def _streams(self, path):
+        url = urlsplit(path)
+        if url.path.startswith("/ws/"):
+            combined = False
+            names = [url.path[len("/ws/"):]]
+        elif url.path == "/stream":
+            combined = True
+            names = parse_qs(url.query).get("streams", [""])[-1].split("/")
+        else:
+            return None
+        streams = {}
+        for name in names:
+            symbol, _, kind = name.partition("@")
+            if kind.startswith("depth") and symbol.upper() in self.generators:
+                streams[symbol.upper()] = name
+        return (combined, streams) if streams else None
+
+    # _handler : serve one stream connection until it closes
+    async def _handler(self, websocket, path):
+        streams = self._streams(path)
+        if streams is None:
+            await websocket.close(1008, "unknown stream")
+            return
+        self.clients[websocket] = streams
+        try:
+            await websocket.wait_closed()
+        finally:
+            self.clients.pop(websocket, None)
+
+    # _process_request : answer the REST and control requests, leaving the
+    #                    stream requests to the websocket handshake
+    async def _process_request(self, path, request_headers):
+        url = urlsplit(path)
+        query = {key: values[-1]
+                 for key, values in parse_qs(url.query).items()}
+        if url.path == "/api/v3/depth":
+            return await self._depth(query)
+        if url.path.startswith("/sim/"):
+            return self._control(url.path[len("/sim/"):], query)
+        return None
+
+    # _depth : REST depth snapshot response
+    async def _depth(self, query):
+        generator = self.generators.get(query.get("symbol", ""))
+        if generator is None:
+            return (HTTPStatus.BAD_REQUEST, JSON_HEADERS,
+                    b'{"code":-1121,"msg":"Invalid symbol."}')
+        try:
+            limit = int(query.get("limit", DEFAULT_LIMIT))
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= MAX_LIMIT:
+            return (HTTPStatus.BAD_REQUEST, JSON_HEADERS,
+                    b'{"code":-1100,"msg":"Illegal characters found in '
+                    b'parameter \'limit\'."}')
+        if self.snapshot_delay:
+            await asyncio.sleep(self.snapshot_delay)
+        self.snapshots += 1
+        body = generator.snapshot_message(generator.snapshot(limit))
+        return HTTPStatus.OK, JSON_HEADERS, body.encode()
+
+    # _control : simulator control response
+    def _control(self, command, query):
+        try:
+            if command == "rate":
+                self.set_rate(float(query["rate"]))
+            elif command == "burst":
+                count = int(query.get("count", self.burst_size))
+                asyncio.ensure_future(self.send(self.generate(count)))
+                self.bursts += 1
+            elif command == "gap":
+                symbol = query.get("symbol")
+                self.gaps.update([symbol] if symbol else self.symbols)
+            elif command == "disconnect":
+                self.disconnect()
+            elif command != "stats":
+                return HTTPStatus.NOT_FOUND, JSON_HEADERS, b'{}'
+        except (KeyError, ValueError) as exc:
+            return (HTTPStatus.BAD_REQUEST, JSON_HEADERS,
+                    json.dumps({"msg": repr(exc)}).encode())
+        return (HTTPStatus.OK, JSON_HEADERS,
+                json.dumps(self.stats()).encode())
+
+
+# serve : run a binanceSimulator (until cancelled). `started`, if given, is
+#         called with the simulator once it listens.
+async def serve(started = None, **options):
+    simulator = binanceSimulator(**options)
+    await simulator.start()
+    if started is not None:
+        started(simulator)
+    try:
+        await simulator.run()
+    finally:
+        await simulator.close()
+
+
+def main(argv):
+    symbols = (argv[1].upper().split(',') if len(argv) > 1 else ["BNBBTC"])
+    port = int(argv[2]) if len(argv) > 2 else 0
+    rate = float(argv[3]) if len(argv) > 3 else 100
+
+    def started(simulator):
+        print(f"Serving {', '.join(simulator.symbols)} at {rate:g} msgs/s")
+        print(f"  api_base    = {simulator.api_base}")
+        print(f"  stream_base = {simulator.stream_base}", flush = True)
+
+    try:
+        asyncio.run(serve(started, symbols = symbols, port = port,
+                          rate = rate))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main(sys.argv)
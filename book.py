@@ -0,0 +1,514 @@
+import bisect
+import math
+from collections import namedtuple
+from symbols import SYMBOL_CONFIGS
+
+# Smallest and largest number of slots of a ladder's levelIndex. The index
+# covers at most MAX_INDEX_SLOTS ticks from the touch; levels beyond that
+# window are priced by walking them (see priceLadder).
+MIN_INDEX_SLOTS = 1024
+MAX_INDEX_SLOTS = 1 << 16
+
+
+# sizeQuote : average execution prices for one order size (None where the
+#             book does not hold enough liquidity on that side)
+sizeQuote = namedtuple('sizeQuote', ['size', 'bid', 'ask'])
+
+# notionalQuote : base quantity a quote-currency budget sells into the bids
+#                 (bid_qty at average price bid) and buys from the asks
+#                 (ask_qty at average price ask); None where a side cannot
+#                 absorb the whole budget
+notionalQuote = namedtuple('notionalQuote',
+                           ['budget', 'bid_qty', 'bid', 'ask_qty', 'ask'])
+
+
+class levelIndex:
+    def __init__(self, size):
+        """
+        Fenwick (binary indexed) tree over the price levels of one ladder,
+        holding cumulative quantity and cumulative notional (price * quantity)
+
+        size: number of slots (rounded up to a power of two)
+
+        Slot 0 is the best possible price on the side and higher slots move
+        away from the touch, so a prefix sum up to a slot is the liquidity
+        available down to that price.
+        """
+        self.size = 1
+        while self.size < size:
+            self.size *= 2
+        self.qty = [0] * (self.size + 1)
+        self.notional = [0] * (self.size + 1)
+
+    # build : rebuild the tree in linear time from (slot, qty, notional)
+    #         entries
+    def build(self, entries):
+        qty = [0] * (self.size + 1)
+        notional = [0] * (self.size + 1)
+        for (slot, q, n) in entries:
+            qty[slot + 1] += q
+            notional[slot + 1] += n
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                qty[parent] += qty[i]
+                notional[parent] += notional[i]
+        self.qty = qty
+        self.notional = notional
+
+    # add : add quantity and notional deltas at a slot
+    def add(self, slot, dq, dn):
+        i = slot + 1
+        size = self.size
+        qty = self.qty
+        notional = self.notional
+        while i <= size:
+            qty[i] += dq
+            notional[i] += dn
+            i += i & -i
+
+    # search : find the first slot at which the running total of `tree`
+    #          (self.qty or self.notional) reaches target. Returns the slot
+    #          together with the cumulative quantity and notional of all the
+    #          slots before it, so that the caller only has to add the partial
+    #          last level.
+    def search(self, tree, target):
+        pos = 0
+        qty_before = 0
+        notional_before = 0
+        step = self.size
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and tree[nxt] < target:
+                pos = nxt
+                target -= tree[nxt]
+                qty_before += self.qty[nxt]
+                notional_before += self.notional[nxt]
+            step //= 2
+        return pos, qty_before, notional_before
+
+
+class priceLadder:
+    def __init__(self, side):
+        """
+        Class representing one side (bids or asks) of an order book, kept in
+        sorted order
+
+        side: 'buy' for the bid ladder, 'sell' for the ask ladder
+
+        Prices are integer ticks and quantities integer lots (see
+        symbolConfig). Prices are stored in self.keys as sort keys, ordered
+        from the worst level to the best one, so that the best level is
+        always keys[-1] and updates near the touch only shift a handful of
+        list entries. Bids use the price itself as the key; asks use the
+        negated price.
+
+        Alongside the sorted keys, a levelIndex holds the cumulative quantity
+        and notional from the touch outwards. A key maps to slot
+        anchor - key, where anchor is at or above the best key; the index is
+        rebuilt around the live levels when a level falls outside its range,
+        so it follows the market and keeps a size in line with the book. The
+        index has one slot per tick, so it only covers a window of at most
+        MAX_INDEX_SLOTS ticks from the touch: levels beyond it (a stray
+        order far from the market) are left out of the index, and fills
+        that reach past the window walk them from the sorted keys.
+
+        Results of fill() are cached per size together with depth_key, the
+        sort key of the deepest level any cached result consumed. Updates
+        strictly beyond that level cannot change a cached result, so the
+        cache is only dropped when an update lands at or inside it.
+        Callables in watchers are called with the sort key of every update
+        (the innermost one of a batch) in the same way, so views built on
+        top of the ladder (see consolidated) can keep caches of their own.
+        """
+        self.side = side
+        self.sign = 1 if side == 'buy' else -1
+        self.keys = []
+        self.levels = {}
+        self.total_qty = 0
+        self.total_notional = 0
+        self.index = levelIndex(MIN_INDEX_SLOTS)
+        self.anchor = None
+        self.fills = {}
+        self.depth_key = None
+        self.watchers = []
+
+    def __len__(self):
+        return len(self.levels)
+
+    def __contains__(self, px):
+        return px in self.levels
+
+    # best : best price on this side (highest bid / lowest ask), or None if
+    #        the ladder is empty
+    def best(self):
+        if self.keys:
+            return self.sign * self.keys[-1]
+        return None
+
+    # _slot : index slot for a sort key, or None if the level lies beyond
+    #         the index window. The index is rebuilt first if the key is
+    #         better than the window, or deeper than it while the window can
+    #         still grow or the key is near the touch.
+    def _slot(self, key):
+        if self.anchor is None:
+            self.anchor = key + self.index.size // 4
+        slot = self.anchor - key
+        size = self.index.size
+        if slot < 0 or (slot >= size and
+                        (size < MAX_INDEX_SLOTS or
+                         (self.keys and
+                          self.keys[-1] - key < MAX_INDEX_SLOTS // 2))):
+            self._reindex(key)
+            slot = self.anchor - key
+        return slot if slot < self.index.size else None
+
+    # _reindex : rebuild the levelIndex around the live levels (and `key`, a
+    #            level about to be set, if given). The anchor is put a
+    #            quarter of the index above the best key, so a trending
+    #            market does not re-anchor on every new best price, and the
+    #            index is sized from the span of the levels (up to
+    #            MAX_INDEX_SLOTS), so it shrinks back when the market drifts
+    #            away from old prices.
+    def _reindex(self, key = None):
+        sign = self.sign
+        keys = [sign * px for px in self.levels]
+        if key is not None:
+            keys.append(key)
+        if not keys:
+            self.anchor = None
+            self.index = levelIndex(MIN_INDEX_SLOTS)
+            return
+        highest = max(keys)
+        span = highest - min(keys) + 1
+        index = levelIndex(min(max(2 * span, MIN_INDEX_SLOTS),
+                               MAX_INDEX_SLOTS))
+        anchor = highest + index.size // 4
+        size = index.size
+        index.build((anchor - sign * px, qty, px * qty)
+                    for px, qty in self.levels.items()
+                    if anchor - sign * px < size)
+        self.anchor = anchor
+        self.index = index
+
+    # _beyond : iterate over (price, quantity) pairs of the levels beyond the
+    #           index window, from the best one outwards
+    def _beyond(self):
+        sign = self.sign
+        levels = self.levels
+        keys = self.keys
+        floor = self.anchor - self.index.size + 1
+        for i in range(bisect.bisect_left(keys, floor) - 1, -1, -1):
+            px = sign * keys[i]
+            yield px, levels[px]
+
+    # _touch : drop cached fills if an update at `key` could change them, and
+    #          report the update to the watchers
+    def _touch(self, key):
+        if self.fills and key >= self.depth_key:
+            self.fills.clear()
+            self.depth_key = None
+        for watcher in self.watchers:
+            watcher(key)
+
+    # set_level : set the quantity at a price level, inserting the level in
+    #             sorted position if it is new
+    def set_level(self, px, qty):
+        key = self.sign * px
+        self._touch(key)
+        slot = self._slot(key)
+        old_qty = self.levels.get(px)
+        if old_qty is None:
+            bisect.insort(self.keys, key)
+            old_qty = 0
+        self.levels[px] = qty
+        self.total_qty += qty - old_qty
+        self.total_notional += px * (qty - old_qty)
+        if slot is not None:
+            self.index.add(slot, qty - old_qty, px * (qty - old_qty))
+
+    # remove_level : remove a price level (no-op if it is not in the ladder)
+    def remove_level(self, px):
+        old_qty = self.levels.pop(px, None)
+        if old_qty is None:
+            return
+        key = self.sign * px
+        self._touch(key)
+        del self.keys[bisect.bisect_left(self.keys, key)]
+        self.total_qty -= old_qty
+        self.total_notional -= px * old_qty
+        slot = self.anchor - key
+        if slot < self.index.size:
+            self.index.add(slot, -old_qty, -px * old_qty)
+
+    # apply : apply a batch of (price, quantity) updates in one pass, where a
+    #         quantity of 0 removes the level. Quantities, totals and the
+    #         levelIndex are updated as the batch is read; the sorted keys
+    #         and the fill cache are fixed up once at the end, merging all
+    #         new levels with a single sort when the batch adds or removes
+    #         many of them.
+    def apply(self, updates):
+        sign = self.sign
+        levels = self.levels
+        added = []
+        removed = []
+        innermost = None
+        d_qty = 0
+        d_notional = 0
+        for (px, qty) in updates:
+            key = sign * px
+            if innermost is None or key > innermost:
+                innermost = key
+            old_qty = levels.get(px)
+            if qty == 0:
+                if old_qty is None:
+                    continue
+                del levels[px]
+                removed.append(key)
+                slot = self.anchor - key
+                if slot >= self.index.size:
+                    slot = None
+            else:
+                slot = self._slot(key)
+                if old_qty is None:
+                    added.append(key)
+                    old_qty = 0
+                levels[px] = qty
+            delta = qty - old_qty
+            d_qty += delta
+            d_notional += px * delta
+            if slot is not None:
+                self.index.add(slot, delta, px * delta)
+        self.total_qty += d_qty
+        self.total_notional += d_notional
+        if innermost is not None:
+            self._touch(innermost)
+
+        # Fix up the sorted keys. A level may have been removed and re-added
+        # (or added and removed) within the batch, so new keys are only kept
+        # if their level still exists.
+        keys = self.keys
+        if len(added) + len(removed) <= 8:
+            for key in removed:
+                i = bisect.bisect_left(keys, key)
+                if i < len(keys) and keys[i] == key:
+                    del keys[i]
+            for key in added:
+                i = bisect.bisect_left(keys, key)
+                if (sign * key in levels and
+                        (i == len(keys) or keys[i] != key)):
+                    keys.insert(i, key)
+        else:
+            removed = set(removed)
+            keys = [key for key in keys if key not in removed]
+            keys.extend(key for key in set(added) if sign * key in levels)
+            keys.sort()
+            self.keys = keys
+
+    # fill : total notional (in ticks * lots) of sweeping `lots` from the best
+    #        level outwards, or None if the ladder does not hold enough
+    #        quantity. One descent of the levelIndex finds the last level
+    #        touched; only that level is filled partially. Results are
+    #        reused until an update lands inside the depth they consumed.
+    def fill(self, lots):
+        if lots in self.fills:
+            return self.fills[lots]
+        index = self.index
+        if lots > self.total_qty:
+            # Depends on every level, so any update invalidates it
+            total = None
+            key = -math.inf
+        else:
+            slot, qty_before, notional_before = index.search(index.qty, lots)
+            if slot < index.size:
+                key = self.anchor - slot
+                total = notional_before + (lots - qty_before) * self.sign * key
+            else:
+                # Past the window: walk the levels beyond it
+                remaining = lots - qty_before
+                total = notional_before
+                for px, qty in self._beyond():
+                    take = min(qty, remaining)
+                    total += take * px
+                    remaining -= take
+                    if not remaining:
+                        break
+                key = self.sign * px
+        self.fills[lots] = total
+        if self.depth_key is None or key < self.depth_key:
+            self.depth_key = key
+        return total
+
+    # fill_notional : number of whole lots that a notional budget (in
+    #                 ticks * lots) sweeps from the best level outwards,
+    #                 together with the notional actually spent on them, or
+    #                 None if the ladder cannot absorb the whole budget (or
+    #                 the budget is not positive). The same descent as
+    #                 fill(), run over cumulative notional.
+    def fill_notional(self, budget):
+        if budget <= 0 or budget > self.total_notional:
+            return None
+        index = self.index
+        slot, qty_before, notional_before = index.search(index.notional,
+                                                         budget)
+        if slot < index.size:
+            px = self.sign * (self.anchor - slot)
+            lots = (budget - notional_before) // px
+            return qty_before + lots, notional_before + lots * px
+
+        # Past the window: walk the levels beyond it
+        lots = qty_before
+        spent = notional_before
+        for px, qty in self._beyond():
+            if spent + px * qty >= budget:
+                take = (budget - spent) // px
+                return lots + take, spent + take * px
+            lots += qty
+            spent += px * qty
+
+    # walk : iterate over (price, quantity) pairs from the best level outwards
+    def walk(self):
+        for key in reversed(self.keys):
+            px = self.sign * key
+            yield px, self.levels[px]
+
+    # load : replace every level with (price, quantity) pairs already sorted
+    #        from the best level outwards (e.g. from a checkpoint), in linear
+    #        time - the keys are taken in order and the levelIndex is built
+    #        in one pass
+    def load(self, levels):
+        self._touch(math.inf)
+        sign = self.sign
+        self.levels = dict(levels)
+        self.keys = [sign * px for px, _ in reversed(levels)]
+        self.total_qty = sum(qty for _, qty in levels)
+        self.total_notional = sum(px * qty for px, qty in levels)
+        self._reindex()
+
+
+class orderBook:
+    def __init__(self, name, max_price = 100000, start_order_id = 0,
+                 config = None):
+        """
+        Class representing a single order book
+
+        name          : asset name (in this case, BNBBTC)
+        max_price     : maximum price
+        start_order_id: first number to use for next order
+        config        : symbolConfig for this asset (looked up in
+                        SYMBOL_CONFIGS by name if not given)
+
+        version is bumped on every update, so readers can tell whether the
+        book changed since they last looked at it.
+        """
+        self.name = name
+        self.order_id = start_order_id
+        self.config = config if config is not None else SYMBOL_CONFIGS[name]
+        self.max_price = max_price
+        self.max_tick = self.config.to_ticks(max_price)
+        self.bids = priceLadder('buy')
+        self.asks = priceLadder('sell')
+        self.version = 0
+
+    # bid_max : best bid in ticks, or 0 if there are no bids
+    @property
+    def bid_max(self):
+        best = self.bids.best()
+        return 0 if best is None else best
+
+    # ask_min : best ask in ticks, or max_tick + 1 if there are no asks
+    @property
+    def ask_min(self):
+        best = self.asks.best()
+        return self.max_tick + 1 if best is None else best
+
+    # update_order : I assume this is what we are supposed to do with the events
+    #                we stream from the binance site - update bids and asks to
+    #                the quantities we are given, rather than actually placing
+    #                orders. px and qty are the raw decimal strings from the
+    #                feed; each is parsed exactly once into ticks/lots.
+    def update_book(self, side, px, qty):
+        # Select the ladder for this side
+        if side == 'buy':
+            ladder = self.bids
+        elif side == 'sell':
+            ladder = self.asks
+        else:
+            print("Order side must be either 'buy' or 'sell'!")
+            return
+
+        # Delete price level if needed, otherwise modify it (always possible).
+        # The ladder keeps itself sorted, so the best bid/ask is always at
+        # hand without rescanning the book.
+        px = self.config.parse_px(px)
+        qty = self.config.parse_qty(qty)
+        self.version += 1
+        if qty == 0:
+            ladder.remove_level(px)
+        else:
+            ladder.set_level(px, qty)
+
+    # apply_diff : apply the raw "b"/"a" arrays of one depth event (lists of
+    #              [price, quantity] strings). Each array is parsed in one
+    #              batch and handed to its ladder, which applies it in one
+    #              pass and re-sorts at most once.
+    def apply_diff(self, bids, asks):
+        parse_px = self.config.parse_px
+        parse_qty = self.config.parse_qty
+        self.apply_levels(
+            [(parse_px(px), parse_qty(qty)) for px, qty in bids or ()],
+            [(parse_px(px), parse_qty(qty)) for px, qty in asks or ()])
+
+    # apply_levels : apply already parsed (ticks, lots) updates for each side
+    #                (as produced by the exchange adapters)
+    def apply_levels(self, bids, asks):
+        self.version += 1
+        if bids:
+            self.bids.apply(bids)
+        if asks:
+            self.asks.apply(asks)
+
+    # load_levels : replace both sides with (ticks, lots) levels sorted from
+    #               the best level outwards (see priceLadder.load)
+    def load_levels(self, bids, asks):
+        self.version += 1
+        self.bids.load(bids)
+        self.asks.load(asks)
+
+    # quote : average execution price to sell (bid) and buy (ask) each of the
+    #         given order sizes, as a list of sizeQuote. Every size is one
+    #         prefix-sum lookup per side, and sizes whose consumed depth was
+    #         not touched since the last call come straight from the cache.
+    #         Sizes below one lot are not quoted.
+    def quote(self, sizes):
+        config = self.config
+        quotes = []
+        for size in sizes:
+            lots = config.to_lots(size)
+            bid = self.bids.fill(lots) if lots > 0 else None
+            ask = self.asks.fill(lots) if lots > 0 else None
+            quotes.append(sizeQuote(
+                size,
+                None if bid is None else config.price(bid / lots),
+                None if ask is None else config.price(ask / lots)))
+        return quotes
+
+    # quote_notional : inverse of quote() - for each quote-currency budget
+    #                  (e.g. 2.5 BTC), how much base asset it sells into the
+    #                  bids / buys from the asks and at what average price,
+    #                  as a list of notionalQuote
+    def quote_notional(self, budgets):
+        config = self.config
+        quotes = []
+        for budget in budgets:
+            sides = []
+            for ladder in (self.bids, self.asks):
+                result = ladder.fill_notional(config.to_notional(budget))
+                if result is None or result[0] == 0:
+                    sides += [None, None]
+                else:
+                    lots, spent = result
+                    sides += [config.quantity(lots),
+                              config.price(spent / lots)]
+            quotes.append(notionalQuote(budget, *sides))
+        return quotes
@@ -0,0 +1,231 @@
+import asyncio
+import sys
+import time
+
+from book import orderBook
+from conflation import mergeDepthEvents
+from latency import latencyRecorder
+
+
+# buildBook : create an orderBook from a depthSnapshot and the buffered
+#             events that follow it. With `load`, the snapshot's levels are
+#             known to be sorted from the best level outwards (a checkpoint)
+#             and are loaded in linear time (see orderBook.load_levels).
+def buildBook(adapter, depth, events, load = False):
+    # Create empty orderbook
+    myOB = orderBook(adapter.symbol, config = adapter.config)
+
+    # Populate orderbook with current bids and asks (from the snapshot)
+    if load:
+        myOB.load_levels(depth.bids, depth.asks)
+    else:
+        myOB.apply_levels(depth.bids, depth.asks)
+
+    # Catch up with the events received while the snapshot was in flight
+    for event in events:
+        myOB.apply_levels(event.bids, event.asks)
+    return myOB
+
+
+# processMsg : given a depthUpdate, update the input orderBook (pricing and
+#              output are left to the caller)
+def processMsg(event, orderBook):
+    # Update order book with the whole event at once
+    orderBook.apply_levels(event.bids, event.asks)
+    return orderBook
+
+
+class bookManager:
+    def __init__(self, feed, max_batch = 1000, latency = None,
+                 on_book = None, on_update = None, retry_delay = 1,
+                 capture = None, checkpoints = None):
+        """
+        Class keeping one orderBook per symbol of a feed in sync with the
+        feed's depth stream
+
+        feed       : exchange adapter (one symbol) or multi-symbol feed (see
+                     exchanges)
+        max_batch  : maximum number of queued messages handled per batch
+        latency    : latencyRecorder for the decode/sequence/apply stages,
+                     which also reports the sequencers' gap and resync
+                     counters
+        on_book    : called as on_book(symbol, book) whenever a symbol's book
+                     is (re)built from a snapshot
+        on_update  : called as on_update(symbol, book, event) after an update
+                     is applied
+        retry_delay: seconds to wait before retrying a failed snapshot
+        capture    : captureWriter recording every raw message and snapshot
+                     with its local receive time (see capture)
+        checkpoints: {symbol: depthSnapshot} of books saved by an earlier run
+                     (see checkpoint.warmStarts), to start from instead of a
+                     REST snapshot where the stream still continues them
+
+        Every symbol has its own sequencer and its own resync: while a
+        symbol's snapshot is in flight its events are buffered, and the book
+        is rebuilt from the snapshot plus the buffered events as soon as the
+        snapshot arrives (see depthSequencer). Snapshots of different
+        symbols are fetched concurrently, within the feed's rate limit.
+        Messages that queue up while the loop is busy are drained together,
+        sequenced one by one, and applied as one merged diff per symbol (see
+        conflation).
+
+        A symbol with a checkpoint is not resynced at start-up. Once its
+        first events arrive, the checkpoint is installed like a snapshot if
+        one of them straddles its last update id (see
+        depthSequencer.covers); otherwise it is discarded and the symbol is
+        resynced from a REST snapshot as usual. A start-up snapshot that
+        arrives before any event is held the same way: installed at once,
+        the first live event would often start after it and count as a gap.
+        """
+        self.feed = feed
+        self.max_batch = max_batch
+        self.latency = latencyRecorder() if latency is None else latency
+        self.on_book = on_book
+        self.on_update = on_update
+        self.retry_delay = retry_delay
+        self.capture = capture
+        # Snapshots waiting for their symbol's first events, as (depth,
+        # checkpoint) pairs
+        self.held = {symbol: (depth, True)
+                     for symbol, depth in (checkpoints or {}).items()
+                     if symbol in feed.adapters}
+        self.books = {symbol: None for symbol in feed.adapters}
+        self.sequencers = {symbol: adapter.new_sequencer()
+                           for symbol, adapter in feed.adapters.items()}
+        self.latency.sequencers.update(
+            (f"{adapter.name}:{symbol}", self.sequencers[symbol])
+            for symbol, adapter in feed.adapters.items())
+        self.resyncs = {}
+
+    # resync : start fetching a snapshot for `symbol`, unless one is already
+    #          in flight (its result is checked against the buffered events
+    #          anyway, and refetched if too old)
+    def resync(self, symbol):
+        task = self.resyncs.get(symbol)
+        if task is None or task.done():
+            self.resyncs[symbol] = asyncio.ensure_future(self._resync(symbol))
+
+    # _resync : fetch snapshots until one lines up with the buffered events,
+    #           then rebuild the symbol's book from it (or hold it, if no
+    #           event arrived yet)
+    async def _resync(self, symbol):
+        adapter = self.feed.adapters[symbol]
+        while True:
+            try:
+                raw = await adapter.fetch_snapshot()
+                if self.capture is not None:
+                    self.capture.snapshot(time.time(), symbol, raw)
+                depth = adapter.decode_snapshot(raw)
+            except Exception as exc:
+                print(f"\nSnapshot of {symbol} failed ({exc!r}), retrying",
+                      file = sys.stderr)
+                await asyncio.sleep(self.retry_delay)
+                continue
+            if not self.sequencers[symbol].buffer:
+                self.held[symbol] = (depth, False)
+                return
+            if self.install(symbol, depth):
+                return
+
+    # install : rebuild `symbol`'s book from a depthSnapshot and the buffered
+    #           events that follow it. Returns False, leaving the book alone,
+    #           if the snapshot is too old for the buffered events.
+    #           `checkpoint` marks a snapshot read back from a checkpoint,
+    #           whose levels are sorted and can be loaded in linear time.
+    def install(self, symbol, depth, checkpoint = False):
+        events = self.sequencers[symbol].on_snapshot(depth.last_update_id)
+        if events is None:
+            return False
+        book = buildBook(self.feed.adapters[symbol], depth, events,
+                         load = checkpoint)
+        self.books[symbol] = book
+        if self.on_book is not None:
+            self.on_book(symbol, book)
+        return True
+
+    # process : decode, sequence and apply a batch of raw messages received
+    #           at `received` (seconds since the epoch). Returns the symbols
+    #           that hit a gap or whose warm start failed; their events are
+    #           buffered until a snapshot is installed.
+    def process(self, msgs, received):
+        latency = self.latency
+        route = self.feed.route
+
+        # Decode the messages into depth updates and keep the ones that
+        # continue their book (out-of-sync events are buffered by their
+        # sequencer)
+        pending = {}
+        gaps = []
+        for msg in msgs:
+            start = time.perf_counter()
+            routed = route(msg)
+            latency.record("decode", time.perf_counter() - start)
+            if routed is None:
+                continue
+            symbol, event = routed
+            sequencer = self.sequencers[symbol]
+            start = time.perf_counter()
+            action = sequencer.push(event)
+            latency.record("sequence", time.perf_counter() - start)
+            latency.record_since_event("exchange_to_receive",
+                                       event.event_time, received)
+            if action == 'apply':
+                pending.setdefault(symbol, []).append(event)
+            elif action == 'gap':
+                gaps.append(symbol)
+
+        # Install the held snapshots (checkpoints, and snapshots that arrived
+        # before any event) of the symbols whose first events arrived, if the
+        # stream continues them. Events the snapshot already covers do not
+        # tell yet.
+        for symbol in list(self.held):
+            buffer = self.sequencers[symbol].buffer
+            depth, checkpoint = self.held[symbol]
+            if not buffer or buffer[-1].last_id <= depth.last_update_id:
+                continue
+            del self.held[symbol]
+            if not (self.sequencers[symbol].covers(depth.last_update_id) and
+                    self.install(symbol, depth, checkpoint = checkpoint)):
+                gaps.append(symbol)
+
+        # Apply each symbol's updates as one net diff
+        for symbol, events in pending.items():
+            start = time.perf_counter()
+            event = mergeDepthEvents(events)
+            book = processMsg(event, self.books[symbol])
+            latency.record("apply", time.perf_counter() - start)
+            if self.on_update is not None:
+                self.on_update(symbol, book, event)
+        return gaps
+
+    # run : connect to the feed and keep every book up to date (until
+    #       cancelled or the connection fails)
+    async def run(self):
+        feed = self.feed
+
+        # Start fetching every snapshot straight away, so the round trips
+        # overlap connecting to the stream (symbols with a checkpoint wait
+        # for their first events instead, see process)
+        for symbol in self.books:
+            if symbol not in self.held:
+                self.resync(symbol)
+
+        try:
+            await feed.connect()
+            while True:
+                # Obtain the next message and every other message that queued
+                # up in the meantime
+                msgs = [await feed.recv()]
+                msgs += await feed.drain(self.max_batch - 1)
+                received = time.time()
+                if self.capture is not None:
+                    for msg in msgs:
+                        self.capture.message(received, msg)
+
+                # Apply them, and resync the symbols that hit a gap
+                for symbol in self.process(msgs, received):
+                    self.resync(symbol)
+        finally:
+            for task in self.resyncs.values():
+                task.cancel()
+            await feed.close()
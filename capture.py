@@ -0,0 +1,195 @@
+import pickle
+import queue
+import struct
+import threading
+import zlib
+from collections import namedtuple
+
+# Capture file layout: MAGIC, then blocks of
+#   block header: compressed length, uncompressed length (uint32 each)
+#   zlib-compressed records, each
+#     record header: kind, encoding (uint8 each), local receive time (double,
+#                    seconds since the epoch), symbol length (uint16),
+#                    payload length (uint32)
+#     symbol (utf-8, empty for messages), payload
+# Blocks are only ever appended, so a capture cut short (e.g. by a crash)
+# is readable up to its last complete block.
+MAGIC = b"OBCAPTURE1\n"
+BLOCK = struct.Struct("<II")
+RECORD = struct.Struct("<BBdHI")
+
+# Record kinds
+MESSAGE = 1
+SNAPSHOT = 2
+
+# Payload encodings: raw bytes, text (utf-8), or a pickled object (venues
+# whose messages are already normalized, e.g. the simulated venue)
+BYTES = 0
+TEXT = 1
+PICKLE = 2
+
+# captureRecord : one captured input - kind is MESSAGE (a raw stream message)
+#                 or SNAPSHOT (a raw REST snapshot of `symbol`), timestamp
+#                 the local receive time in seconds since the epoch
+captureRecord = namedtuple('captureRecord',
+                           ['kind', 'timestamp', 'symbol', 'payload'])
+
+
+# _encode : payload as (encoding, bytes)
+def _encode(payload):
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        return BYTES, bytes(payload)
+    if isinstance(payload, str):
+        return TEXT, payload.encode()
+    return PICKLE, pickle.dumps(payload, pickle.HIGHEST_PROTOCOL)
+
+
+# _decode : payload from (encoding, bytes)
+def _decode(encoding, data):
+    if encoding == BYTES:
+        return data
+    if encoding == TEXT:
+        return data.decode()
+    return pickle.loads(data)
+
+
+class captureWriter:
+    def __init__(self, path, block_size = 1 << 20, level = 1,
+                 flush_interval = 1):
+        """
+        Class appending raw stream messages and REST snapshots to a capture
+        file, for offline reproduction and benchmarks (see readCapture)
+
+        path          : capture file (appended to if it exists)
+        block_size    : uncompressed bytes collected before a block is
+                        compressed and written
+        level         : zlib compression level
+        flush_interval: seconds without new records after which a partial
+                        block is written anyway
+
+        message() and snapshot() only queue a reference to the payload
+        (payloads are immutable: strings, bytes or normalized records), so
+        the ingestion loop never waits for encoding, compression or disk.
+        A background thread does the rest. records counts the records
+        written.
+        """
+        self.path = path
+        self.block_size = block_size
+        self.level = level
+        self.flush_interval = flush_interval
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.records = 0
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target = self._run, name = "capture",
+                                       daemon = True)
+        self.thread.start()
+
+    # message : capture a raw stream message received at `timestamp`
+    def message(self, timestamp, raw):
+        self.queue.put((MESSAGE, timestamp, "", raw))
+
+    # snapshot : capture the raw REST snapshot of `symbol` received at
+    #            `timestamp`
+    def snapshot(self, timestamp, symbol, raw):
+        self.queue.put((SNAPSHOT, timestamp, symbol, raw))
+
+    # close : write every queued record and close the file
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.file.close()
+
+    # _run : encode queued records into blocks until close()
+    def _run(self):
+        block = bytearray()
+        while True:
+            try:
+                item = self.queue.get(timeout = self.flush_interval)
+            except queue.Empty:
+                self._write_block(block)
+                continue
+            if item is None:
+                break
+            kind, timestamp, symbol, payload = item
+            encoding, data = _encode(payload)
+            symbol = symbol.encode()
+            block += RECORD.pack(kind, encoding, timestamp, len(symbol),
+                                 len(data))
+            block += symbol
+            block += data
+            self.records += 1
+            if len(block) >= self.block_size:
+                self._write_block(block)
+        self._write_block(block)
+
+    # _write_block : compress and append a block, then empty it
+    def _write_block(self, block):
+        if not block:
+            return
+        data = zlib.compress(block, self.level)
+        self.file.write(BLOCK.pack(len(data), len(block)))
+        self.file.write(data)
+        self.file.flush()
+        del block[:]
+
+
+# readCapture : iterate over the captureRecords of a capture file, in the
+#               order they were captured
+def readCapture(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        while True:
+            header = f.read(BLOCK.size)
+            if len(header) < BLOCK.size:
+                return
+            size, raw_size = BLOCK.unpack(header)
+            data = f.read(size)
+            if len(data) < size:
+                return
+            block = memoryview(zlib.decompress(data, bufsize = raw_size))
+            offset = 0
+            while offset < len(block):
+                kind, encoding, timestamp, symbol_len, payload_len = \
+                    RECORD.unpack_from(block, offset)
+                offset += RECORD.size
+                symbol = bytes(block[offset:offset + symbol_len]).decode()
+                offset += symbol_len
+                payload = _decode(encoding,
+                                  bytes(block[offset:offset + payload_len]))
+                offset += payload_len
+                yield captureRecord(kind, timestamp, symbol, payload)
+
+
+# captureBatches : group captureRecords into the batches they were received
+#                  in - ("messages", timestamp, [raw, ...]) for messages
+#                  received together, and ("snapshot", timestamp,
+#                  (symbol, raw)) for snapshots
+def captureBatches(records):
+    msgs = []
+    received = None
+    for record in records:
+        if record.kind == MESSAGE and record.timestamp == received:
+            msgs.append(record.payload)
+            continue
+        if msgs:
+            yield "messages", received, msgs
+            msgs = []
+        if record.kind == MESSAGE:
+            msgs = [record.payload]
+            received = record.timestamp
+        else:
+            received = None
+            yield "snapshot", record.timestamp, (record.symbol,
+                                                 record.payload)
+    if msgs:
+        yield "messages", received, msgs
+
+
+# isCapture : whether `path` is a capture file
+def isCapture(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
@@ -0,0 +1,203 @@
+# Inspect book checkpoints (see checkpointWriter).
+#
+# Usage: python checkpoint.py checkpoint_file [levels]
+#
+# Prints when the book was saved, its last update id, totals and the best
+# `levels` levels of each side (default 5).
+import asyncio
+import itertools
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import namedtuple
+
+from book import orderBook
+from exchanges.base import depthSnapshot
+from symbols import symbolConfig
+
+# Checkpoint file layout (little-endian):
+#   header: magic, last applied update id (u), book version, save time
+#           (seconds since the epoch), number of bids and of asks, then the
+#           symbol name, tick size and step size (16-byte null-padded
+#           strings)
+#   levels: bid prices, bid quantities, ask prices, ask quantities (int64
+#           ticks/lots each), every side from the best level outwards
+MAGIC = b"OBCKPT1\n"
+HEADER = struct.Struct("<8sQQdII16s16s16s")
+
+# bookCheckpoint : one book as saved - bids/asks are lists of (ticks, lots)
+#                  pairs from the best level outwards, last_update_id the
+#                  last update applied to it
+bookCheckpoint = namedtuple('bookCheckpoint',
+                            ['symbol', 'config', 'last_update_id', 'version',
+                             'saved_at', 'bids', 'asks'])
+
+
+# checkpointPath : checkpoint file of `symbol` in `directory`
+def checkpointPath(directory, symbol):
+    return os.path.join(directory, f"{symbol}.ckpt")
+
+
+# writeCheckpoint : write a bookCheckpoint to `path`, atomically (readers
+#                   see either the previous checkpoint or this one)
+def writeCheckpoint(path, checkpoint):
+    tick_size, step_size = checkpoint.config.sizes()
+    columns = []
+    for side in (checkpoint.bids, checkpoint.asks):
+        columns.append(array('q', [px for px, _ in side]))
+        columns.append(array('q', [qty for _, qty in side]))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, checkpoint.last_update_id,
+                            checkpoint.version, checkpoint.saved_at,
+                            len(checkpoint.bids), len(checkpoint.asks),
+                            checkpoint.symbol.encode(), tick_size.encode(),
+                            step_size.encode()))
+        for column in columns:
+            column.tofile(f)
+    os.replace(tmp_path, path)
+
+
+# readCheckpoint : read the bookCheckpoint at `path`
+def readCheckpoint(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    (magic, last_update_id, version, saved_at, n_bids, n_asks, symbol,
+     tick_size, step_size) = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a checkpoint file")
+    symbol, tick_size, step_size = (field.rstrip(b"\0").decode() for field
+                                    in (symbol, tick_size, step_size))
+    offset = HEADER.size
+    sides = []
+    for count in (n_bids, n_asks):
+        prices = array('q', data[offset:offset + 8 * count])
+        offset += 8 * count
+        quantities = array('q', data[offset:offset + 8 * count])
+        offset += 8 * count
+        sides.append(list(zip(prices, quantities)))
+    return bookCheckpoint(symbol, symbolConfig(symbol, tick_size, step_size),
+                          last_update_id, version, saved_at, *sides)
+
+
+# restoreBook : rebuild an orderBook from a bookCheckpoint, in linear time
+#               (see orderBook.load_levels)
+def restoreBook(checkpoint):
+    book = orderBook(checkpoint.symbol, config = checkpoint.config)
+    book.load_levels(checkpoint.bids, checkpoint.asks)
+    return book
+
+
+# warmStarts : {symbol: depthSnapshot} of the checkpoints in `directory` for
+#              the symbols of `feed` (see bookManager checkpoints), skipping
+#              missing or unreadable ones and those saved with other tick or
+#              step sizes
+def warmStarts(directory, feed):
+    depths = {}
+    for symbol, adapter in feed.adapters.items():
+        try:
+            checkpoint = readCheckpoint(checkpointPath(directory, symbol))
+        except (OSError, ValueError, struct.error):
+            continue
+        if checkpoint.config.sizes() == adapter.config.sizes():
+            depths[symbol] = depthSnapshot(checkpoint.last_update_id,
+                                           checkpoint.bids, checkpoint.asks)
+    return depths
+
+
+class checkpointWriter:
+    def __init__(self, directory, interval = 60):
+        """
+        Class saving the books of a bookManager to disk periodically, for
+        warm restarts (see warmStarts) and post-mortem inspection (see
+        readCheckpoint)
+
+        directory: directory the checkpoints are written to, one file per
+                   symbol (see checkpointPath)
+        interval : seconds between checkpoints
+
+        Saving a book only copies its sorted keys and level dict, which are
+        C-level copies; building and writing the file happen on a
+        background thread, so ingestion is not held up by the disk. Only
+        books that are in sync and changed since their last checkpoint are
+        saved. saved counts the checkpoints written.
+        """
+        self.directory = directory
+        self.interval = interval
+        self.saved = 0
+        self.versions = {}
+        os.makedirs(directory, exist_ok = True)
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target = self._run,
+                                       name = "checkpoint", daemon = True)
+        self.thread.start()
+
+    # save : queue a checkpoint of every changed, in-sync book of `manager`
+    def save(self, manager):
+        now = time.time()
+        for symbol, book in manager.books.items():
+            sequencer = manager.sequencers[symbol]
+            if (book is None or not sequencer.synced or
+                    self.versions.get(symbol) == (book, book.version)):
+                continue
+            self.versions[symbol] = (book, book.version)
+            self.queue.put((symbol, book.config, sequencer.last_update_id,
+                            book.version, now,
+                            (list(book.bids.keys), dict(book.bids.levels)),
+                            (list(book.asks.keys), dict(book.asks.levels))))
+
+    # run : save `manager`'s books every interval seconds (until cancelled)
+    async def run(self, manager):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.save(manager)
+
+    # close : write every queued checkpoint and stop the writer thread
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    # _run : write queued checkpoints until close()
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            symbol, config, last_update_id, version, saved_at, bids, asks = \
+                item
+            sides = []
+            for sign, (keys, levels) in ((1, bids), (-1, asks)):
+                sides.append([(sign * key, levels[sign * key])
+                              for key in reversed(keys)])
+            writeCheckpoint(checkpointPath(self.directory, symbol),
+                            bookCheckpoint(symbol, config, last_update_id,
+                                           version, saved_at, *sides))
+            self.saved += 1
+
+
+def main(argv):
+    if len(argv) < 2:
+        print("Usage: python checkpoint.py checkpoint_file [levels]")
+        return
+    checkpoint = readCheckpoint(argv[1])
+    levels = int(argv[2]) if len(argv) > 2 else 5
+    book = restoreBook(checkpoint)
+    config = checkpoint.config
+    saved_at = time.strftime('%Y-%m-%d %H:%M:%S',
+                             time.localtime(checkpoint.saved_at))
+    print(f"{checkpoint.symbol} saved {saved_at}, last update id "
+          f"{checkpoint.last_update_id}, version {checkpoint.version}")
+    for name, ladder in (("Bids", book.bids), ("Asks", book.asks)):
+        print(f"{name}: {len(ladder)} levels, "
+              f"{config.quantity(ladder.total_qty)} in total")
+        for px, qty in itertools.islice(ladder.walk(), levels):
+            print(f"  {config.price(px)} x {config.quantity(qty)}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,293 @@
+# Convert a capture file (see capture) into the columnar event format.
+#
+# Usage: python columnar.py capture_file output_file [venue] [symbols]
+#
+# venue and symbols are those the capture was recorded with (default:
+# binance BNBBTC). The output can be replayed with replay.py like a capture,
+# without any decoding, or mapped for analysis with columnarFile.
+import mmap
+import struct
+import sys
+from array import array
+
+from capture import captureBatches, readCapture
+from exchanges.base import depthSnapshot, depthUpdate, exchangeAdapter
+from supervisor import makeFeed
+from symbols import symbolConfig
+
+# Optional zero-copy NumPy views of the columns; memoryviews otherwise
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Columnar file layout (little-endian):
+#   header : magic, number of rows, number of symbols
+#   symbols: name, tick size and step size (16-byte null-padded strings) per
+#            symbol, so prices and quantities convert back exactly
+#   columns: one array per column, in COLUMNS order, each starting on a
+#            64-byte boundary
+# Every row is one price level of a depth update or snapshot: the levels of
+# one event are consecutive rows sharing its received time, symbol, ids and
+# flags. An update without levels is a single row with side NONE.
+MAGIC = b"OBCOLS1\n"
+HEADER = struct.Struct("<8sQI4x")
+SYMBOL = struct.Struct("<16s16s16s")
+COLUMN_ALIGN = 64
+
+# Column names and array typecodes: local receive time (microseconds since
+# the epoch), venue event time (ms), first and last update id (U and u; both
+# the snapshot's lastUpdateId for snapshots), price in ticks, quantity in
+# lots, symbol index, flags and side
+COLUMNS = (("received", "q"), ("event_time", "q"), ("first_id", "q"),
+           ("last_id", "q"), ("px", "q"), ("qty", "q"), ("symbol", "H"),
+           ("flags", "B"), ("side", "B"))
+
+# Values of the side column
+BID = 0
+ASK = 1
+NONE = 2
+
+# Bits of the flags column
+SNAPSHOT_FLAG = 1
+
+
+# _columnOffsets : offset of every column in a file of n_rows rows and
+#                  n_symbols symbols, and the size of the file
+def _columnOffsets(n_rows, n_symbols):
+    offsets = {}
+    offset = HEADER.size + SYMBOL.size * n_symbols
+    for name, typecode in COLUMNS:
+        offset = -(-offset // COLUMN_ALIGN) * COLUMN_ALIGN
+        offsets[name] = offset
+        offset += array(typecode).itemsize * n_rows
+    return offsets, offset
+
+
+class columnarWriter:
+    def __init__(self, symbols):
+        """
+        Class collecting depth events into columns, to be written as one
+        columnar file
+
+        symbols: {symbol: symbolConfig} of the symbols the events belong to
+        """
+        self.symbols = dict(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.columns = {name: array(typecode) for name, typecode in COLUMNS}
+
+    # _add : append the rows of one event
+    def _add(self, received, symbol, flags, first_id, last_id, event_time,
+             bids, asks):
+        rows = ([(BID, px, qty) for px, qty in bids] +
+                [(ASK, px, qty) for px, qty in asks]) or [(NONE, 0, 0)]
+        values = (int(received * 1000000), event_time, first_id, last_id,
+                  self.index[symbol], flags)
+        columns = self.columns
+        for name, value in zip(("received", "event_time", "first_id",
+                                "last_id", "symbol", "flags"), values):
+            columns[name].extend([value] * len(rows))
+        for side, px, qty in rows:
+            columns["side"].append(side)
+            columns["px"].append(px)
+            columns["qty"].append(qty)
+
+    # update : append a depthUpdate of `symbol` received at `received`
+    #          (seconds since the epoch)
+    def update(self, received, symbol, event):
+        self._add(received, symbol, 0, event.first_id, event.last_id,
+                  event.event_time, event.bids, event.asks)
+
+    # snapshot : append a depthSnapshot of `symbol` received at `received`
+    def snapshot(self, received, symbol, depth):
+        self._add(received, symbol, SNAPSHOT_FLAG, depth.last_update_id,
+                  depth.last_update_id, 0, depth.bids, depth.asks)
+
+    # write : write the collected events to `path`
+    def write(self, path):
+        n_rows = len(self.columns["px"])
+        offsets, size = _columnOffsets(n_rows, len(self.symbols))
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, n_rows, len(self.symbols)))
+            for symbol, config in self.symbols.items():
+                tick_size, step_size = config.sizes()
+                f.write(SYMBOL.pack(symbol.encode(), tick_size.encode(),
+                                    step_size.encode()))
+            for name, _ in COLUMNS:
+                f.write(b"\0" * (offsets[name] - f.tell()))
+                self.columns[name].tofile(f)
+            f.write(b"\0" * (size - f.tell()))
+
+
+# convertCapture : convert the capture at `path`, recorded from `feed`, into
+#                  a columnar file at out_path. Returns the number of rows.
+def convertCapture(path, out_path, feed):
+    adapters = feed.adapters
+    writer = columnarWriter({symbol: adapter.config
+                             for symbol, adapter in adapters.items()})
+    for kind, received, payload in captureBatches(readCapture(path)):
+        if kind == "messages":
+            for raw in payload:
+                routed = feed.route(raw)
+                if routed is not None:
+                    writer.update(received, *routed)
+        else:
+            symbol, raw = payload
+            if symbol in adapters:
+                writer.snapshot(received, symbol,
+                                adapters[symbol].decode_snapshot(raw))
+    writer.write(out_path)
+    return len(writer.columns["px"])
+
+
+class columnarAdapter(exchangeAdapter):
+    name = "columnar"
+
+    # Events and snapshots of a columnar file are already normalized
+    def decode(self, raw):
+        return raw
+
+    def decode_snapshot(self, raw):
+        return raw
+
+
+class columnarFeed:
+    def __init__(self, configs):
+        """
+        Feed of pre-decoded events read from a columnar file, for
+        bookManager.process/install (see replay)
+
+        configs: {symbol: symbolConfig} of the file's symbols
+
+        Messages are already (symbol, depthUpdate) pairs, so route() only
+        passes them through.
+        """
+        self.adapters = {symbol: columnarAdapter(symbol, config)
+                         for symbol, config in configs.items()}
+
+    def route(self, raw):
+        return raw
+
+
+class columnarFile:
+    def __init__(self, path):
+        """
+        Class mapping a columnar file into memory
+
+        path: columnar file (see columnarWriter)
+
+        columns holds one read-only view per column (see COLUMNS), straight
+        over the mapped file - NumPy arrays if NumPy is installed,
+        memoryviews otherwise - so analyses can use whole columns without
+        copying or parsing them. batches() turns the rows back into the
+        events replay needs. configs holds the symbolConfig of every symbol,
+        by name.
+        """
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        magic, self.rows, n_symbols = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a columnar file")
+        self.configs = {}
+        for i in range(n_symbols):
+            name, tick_size, step_size = (
+                field.rstrip(b"\0").decode() for field in
+                SYMBOL.unpack_from(self.map, HEADER.size + SYMBOL.size * i))
+            self.configs[name] = symbolConfig(name, tick_size, step_size)
+        self.symbols = list(self.configs)
+        offsets, _ = _columnOffsets(self.rows, n_symbols)
+        self.columns = {}
+        for name, typecode in COLUMNS:
+            itemsize = array(typecode).itemsize
+            if numpy is not None:
+                self.columns[name] = numpy.frombuffer(
+                    self.map, numpy.dtype(typecode).newbyteorder("<"),
+                    self.rows, offsets[name])
+            else:
+                self.columns[name] = memoryview(self.map)[
+                    offsets[name]:offsets[name] + itemsize * self.rows] \
+                    .cast(typecode)
+
+    # _starts : index of the first row of every event
+    def _starts(self):
+        columns = [self.columns[name] for name in
+                   ("received", "symbol", "first_id", "last_id", "flags")]
+        if numpy is not None:
+            change = numpy.zeros(self.rows, dtype = bool)
+            change[:1] = True
+            for column in columns:
+                change[1:] |= column[1:] != column[:-1]
+            return numpy.flatnonzero(change).tolist()
+        starts = []
+        previous = None
+        for i, key in enumerate(zip(*columns)):
+            if key != previous:
+                starts.append(i)
+                previous = key
+        return starts
+
+    # batches : the file's events grouped as in capture.captureBatches -
+    #           ("messages", received, [(symbol, depthUpdate), ...]) for
+    #           updates received together and ("snapshot", received,
+    #           (symbol, depthSnapshot)) for snapshots
+    def batches(self):
+        c = self.columns
+        symbols = self.symbols
+        starts = self._starts() + [self.rows]
+        events = []
+        batch_received = None
+        for start, end in zip(starts, starts[1:]):
+            received = c["received"][start] / 1000000
+            symbol = symbols[c["symbol"][start]]
+            sides = c["side"][start:end].tolist()
+            pxs = c["px"][start:end].tolist()
+            qtys = c["qty"][start:end].tolist()
+            bids = [(px, qty) for side, px, qty in zip(sides, pxs, qtys)
+                    if side == BID]
+            asks = [(px, qty) for side, px, qty in zip(sides, pxs, qtys)
+                    if side == ASK]
+            if c["flags"][start] & SNAPSHOT_FLAG:
+                if events:
+                    yield "messages", batch_received, events
+                    events = []
+                yield "snapshot", received, (
+                    symbol, depthSnapshot(int(c["last_id"][start]), bids,
+                                          asks))
+                continue
+            if events and received != batch_received:
+                yield "messages", batch_received, events
+                events = []
+            batch_received = received
+            events.append((symbol, depthUpdate(
+                int(c["first_id"][start]), int(c["last_id"][start]),
+                int(c["event_time"][start]), bids, asks)))
+        if events:
+            yield "messages", batch_received, events
+
+    # close : release the column views and unmap the file
+    def close(self):
+        self.columns = {}
+        self.map.close()
+        self.file.close()
+
+
+# isColumnar : whether `path` is a columnar file
+def isColumnar(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def main(argv):
+    if len(argv) < 3:
+        print("Usage: python columnar.py capture_file output_file [venue] "
+              "[symbols]")
+        return
+    venue = argv[3] if len(argv) > 3 else "binance"
+    symbols = (argv[4].upper().split(',') if len(argv) > 4 else ["BNBBTC"])
+    rows = convertCapture(argv[1], argv[2], makeFeed(venue, symbols))
+    print(f"{rows} rows written to {argv[2]}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
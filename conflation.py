@@ -0,0 +1,32 @@
+# conflation : merge the depth events that piled up while the consumer was
+#              busy into a single net diff, so a burst costs one book update
+#              instead of one per message
+
+
+# drainMessages : return the messages already queued on a websocket
+#                 connection (at most `limit`), without waiting for the
+#                 network. Relies on the queue (`messages`) of the websockets
+#                 protocol; recv() returns immediately while it is non-empty.
+async def drainMessages(websocket, limit):
+    messages = []
+    queued = getattr(websocket, "messages", ())
+    while queued and len(messages) < limit:
+        messages.append(await websocket.recv())
+    return messages
+
+
+# mergeDepthEvents : merge consecutive, already sequenced depthUpdate events
+#                    into one with a net diff per price level (the last
+#                    quantity for a level wins), the first event's first_id
+#                    and the last event's last_id and event_time
+def mergeDepthEvents(events):
+    if len(events) == 1:
+        return events[0]
+    bids = {}
+    asks = {}
+    for event in events:
+        bids.update(event.bids)
+        asks.update(event.asks)
+    return events[-1]._replace(first_id = events[0].first_id,
+                               bids = list(bids.items()),
+                               asks = list(asks.items()))
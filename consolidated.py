@@ -0,0 +1,256 @@
+import functools
+import heapq
+import math
+from collections import namedtuple
+
+from book import notionalQuote
+from symbols import decimalString, decimalUnits, symbolConfig
+
+# consolidatedQuote : average execution prices for one order size against
+#                     the combined books, together with the quantity each
+#                     venue would fill ({venue: quantity}, in sweep order);
+#                     None where the books do not hold enough liquidity
+consolidatedQuote = namedtuple('consolidatedQuote',
+                               ['size', 'bid', 'ask', 'bid_venues',
+                                'ask_venues'])
+
+
+# _commonSize : finest size that every decimal size string is a multiple
+#               of, as a decimal string, together with each size's multiple
+#               of it (e.g. ["0.01", "0.005"] -> ("0.005", [2, 1]))
+def _commonSize(sizes):
+    split = [decimalUnits(size) for size in sizes]
+    decimals = max(d for d, _ in split)
+    units = [u * 10 ** (decimals - d) for d, u in split]
+    common = functools.reduce(math.gcd, units)
+    return (decimalString(decimals, common),
+            [u // common for u in units])
+
+
+# commonConfig : symbolConfig on the common grid of several configs of the
+#                same symbol, with the tick and lot multiples of each
+def commonConfig(name, configs):
+    tick_size, px_mults = _commonSize([c.sizes()[0] for c in configs])
+    step_size, qty_mults = _commonSize([c.sizes()[1] for c in configs])
+    return (symbolConfig(name, tick_size, step_size),
+            list(zip(px_mults, qty_mults)))
+
+
+class consolidatedSide:
+    def __init__(self, side):
+        """
+        Class merging one side (bids or asks) of several venues' ladders
+
+        side: 'buy' for the bid ladders, 'sell' for the ask ladders
+
+        Prices and quantities are converted to the common grid of the
+        venues (see commonConfig) by their integer multiples, so the merge
+        stays exact. Fills walk the ladders lazily with a k-way merge, from
+        the best level outwards and only as deep as they need.
+
+        Like priceLadder, results of fill() are cached per size with
+        depth_key, the sort key (on the common grid) of the deepest level
+        any cached result consumed. Every ladder reports its updates to this
+        side (see priceLadder.watchers), and the cache is only dropped when
+        an update on any venue lands at or inside that level.
+        """
+        self.side = side
+        self.sign = 1 if side == 'buy' else -1
+        self.ladders = {}
+        self.watchers = []
+        self.fills = {}
+        self.depth_key = None
+
+    # set_ladders : merge the given {venue: (ladder, px_mult, qty_mult)}
+    #               from now on, dropping cached fills
+    def set_ladders(self, ladders):
+        for ladder, watcher in self.watchers:
+            ladder.watchers.remove(watcher)
+        self.ladders = dict(ladders)
+        self.watchers = []
+        for ladder, px_mult, _ in self.ladders.values():
+            watcher = self._watcher(px_mult)
+            ladder.watchers.append(watcher)
+            self.watchers.append((ladder, watcher))
+        self.fills.clear()
+        self.depth_key = None
+
+    # _watcher : callback reporting updates of a ladder whose ticks are
+    #            px_mult common ticks
+    def _watcher(self, px_mult):
+        def watcher(key):
+            self._touch(key * px_mult)
+        return watcher
+
+    # _touch : drop cached fills if an update at `key` (a sort key on the
+    #          common grid) could change them
+    def _touch(self, key):
+        if self.fills and key >= self.depth_key:
+            self.fills.clear()
+            self.depth_key = None
+
+    # _levels : (sort key, venue, price, quantity) of every venue's levels on
+    #           the common grid, merged from the best level outwards
+    def _levels(self):
+        return heapq.merge(*[self._walk(venue, *ladder)
+                             for venue, ladder in self.ladders.items()])
+
+    # _walk : (sort key, venue, price, quantity) of one venue's levels on the
+    #         common grid, from the best level outwards
+    def _walk(self, venue, ladder, px_mult, qty_mult):
+        sign = self.sign
+        for px, qty in ladder.walk():
+            yield -sign * px * px_mult, venue, px * px_mult, qty * qty_mult
+
+    # fill : total notional (in common ticks * lots) of sweeping `lots` from
+    #        the best level of any venue outwards, together with the lots
+    #        taken from each venue, or None if the venues do not hold enough
+    #        quantity together
+    def fill(self, lots):
+        if lots in self.fills:
+            return self.fills[lots]
+        remaining = lots
+        total = 0
+        venues = {}
+        key = -math.inf
+        for _, venue, px, qty in self._levels():
+            take = min(qty, remaining)
+            total += take * px
+            venues[venue] = venues.get(venue, 0) + take
+            remaining -= take
+            if not remaining:
+                key = self.sign * px
+                break
+        # Unfilled results depend on every level, so any update invalidates
+        # them
+        result = (total, venues) if not remaining else None
+        self.fills[lots] = result
+        if self.depth_key is None or key < self.depth_key:
+            self.depth_key = key
+        return result
+
+    # fill_notional : number of whole lots that a notional budget (in common
+    #                 ticks * lots) sweeps from the best level of any venue
+    #                 outwards, together with the notional actually spent on
+    #                 them, or None if the venues cannot absorb the whole
+    #                 budget (or the budget is not positive)
+    def fill_notional(self, budget):
+        if budget <= 0:
+            return None
+        remaining = budget
+        lots = 0
+        for _, _, px, qty in self._levels():
+            if qty * px >= remaining:
+                take = remaining // px
+                return lots + take, budget - remaining + take * px
+            lots += qty
+            remaining -= qty * px
+        return None
+
+
+class consolidatedBook:
+    def __init__(self, name):
+        """
+        Class pricing order sizes against the combined liquidity of one
+        symbol's order books on several venues
+
+        name: symbol name (e.g. BNBBTC)
+
+        Component books are set per venue with set_book (e.g. from each
+        venue's bookManager on_book callback) and are read in place - the
+        consolidated view holds no levels of its own and is never out of
+        date. It quotes like an orderBook, so a quoteRenderer can render it
+        (with formatConsolidatedQuotes), and version changes whenever a
+        component book does.
+        """
+        self.name = name
+        self.books = {}
+        self.config = None
+        self.bids = consolidatedSide('buy')
+        self.asks = consolidatedSide('sell')
+        self.rebuilds = 0
+
+    # version : changes whenever a component book is updated or replaced
+    @property
+    def version(self):
+        return (self.rebuilds,) + tuple(book.version
+                                        for book in self.books.values())
+
+    # set_book : use `book` as `venue`'s component from now on (e.g. after it
+    #            was rebuilt from a snapshot)
+    def set_book(self, venue, book):
+        self.books[venue] = book
+        self.rebuilds += 1
+        venues = list(self.books)
+        self.config, mults = commonConfig(
+            self.name, [self.books[v].config for v in venues])
+        for side, attr in ((self.bids, 'bids'), (self.asks, 'asks')):
+            side.set_ladders({
+                venue: (getattr(self.books[venue], attr), px_mult, qty_mult)
+                for venue, (px_mult, qty_mult) in zip(venues, mults)})
+
+    # _venues : {venue: quantity} of the lots taken from each venue
+    def _venues(self, venues):
+        return {venue: self.config.quantity(lots)
+                for venue, lots in venues.items()}
+
+    # quote : average execution price to sell (bid) and buy (ask) each of the
+    #         given order sizes across every venue, as a list of
+    #         consolidatedQuote
+    def quote(self, sizes):
+        config = self.config
+        quotes = []
+        for size in sizes:
+            sides = []
+            lots = config.to_lots(size) if config is not None else 0
+            for side in (self.bids, self.asks):
+                result = side.fill(lots) if lots > 0 else None
+                if result is None:
+                    sides.append((None, None))
+                else:
+                    total, venues = result
+                    sides.append((config.price(total / lots),
+                                  self._venues(venues)))
+            (bid, bid_venues), (ask, ask_venues) = sides
+            quotes.append(consolidatedQuote(size, bid, ask, bid_venues,
+                                            ask_venues))
+        return quotes
+
+    # quote_notional : for each quote-currency budget, how much base asset
+    #                  it sells into / buys from the combined books and at
+    #                  what average price, as a list of notionalQuote
+    def quote_notional(self, budgets):
+        config = self.config
+        quotes = []
+        for budget in budgets:
+            sides = []
+            for side in (self.bids, self.asks):
+                result = (side.fill_notional(config.to_notional(budget))
+                          if config is not None else None)
+                if result is None or result[0] == 0:
+                    sides += [None, None]
+                else:
+                    lots, spent = result
+                    sides += [config.quantity(lots),
+                              config.price(spent / lots)]
+            quotes.append(notionalQuote(budget, *sides))
+        return quotes
+
+
+# formatConsolidatedQuotes : render a list of consolidatedQuote for the
+#                            console
+def formatConsolidatedQuotes(quotes):
+    parts = []
+    for q in quotes:
+        sides = []
+        for name, price, venues, missing in (
+                ("Bid", q.bid, q.bid_venues, "Insufficient bids"),
+                ("Ask", q.ask, q.ask_venues, "Insufficient asks")):
+            if price is None:
+                sides.append(missing)
+            else:
+                swept = ", ".join(f"{venue} {qty}"
+                                  for venue, qty in venues.items())
+                sides.append(f"{name} Avg = {price} ({swept})")
+        parts.append(f"For order size {q.size}, {sides[0]}, {sides[1]}")
+    return " | ".join(parts)
@@ -0,0 +1,33 @@
+import json
+
+# Optional faster JSON backends; stdlib json is always available
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+# Available decoders by name, fastest first. Every decoder takes the raw
+# message (str or bytes) and returns the decoded object.
+DECODERS = {}
+if orjson is not None:
+    DECODERS["orjson"] = orjson.loads
+if ujson is not None:
+    DECODERS["ujson"] = ujson.loads
+DECODERS["json"] = json.loads
+
+
+# get_decoder : return the decoder called `name`, or the fastest installed
+#               one if no name is given (stdlib json when no faster backend
+#               is installed)
+def get_decoder(name = None):
+    if name is None:
+        return next(iter(DECODERS.values()))
+    if name not in DECODERS:
+        raise ValueError(f"Unknown or unavailable decoder '{name}' "
+                         f"(available: {', '.join(DECODERS)})")
+    return DECODERS[name]
@@ -0,0 +1,15 @@
+from exchanges.base import depthSnapshot, depthUpdate, exchangeAdapter
+from exchanges.binance import binanceAdapter, binanceCombinedFeed
+from exchanges.simulated import simulatedAdapter
+
+
+# Adapters by venue name
+ADAPTERS = {
+    binanceAdapter.name: binanceAdapter,
+    simulatedAdapter.name: simulatedAdapter,
+}
+
+# Feeds carrying many symbols over one connection, by venue name
+MULTI_SYMBOL_FEEDS = {
+    binanceCombinedFeed.name: binanceCombinedFeed,
+}
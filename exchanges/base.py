@@ -0,0 +1,98 @@
+from collections import namedtuple
+
+from sequencer import depthSequencer
+from symbols import SYMBOL_CONFIGS
+
+
+# depthSnapshot : normalized full-depth snapshot. bids/asks are lists of
+#                 (ticks, lots) pairs; last_update_id is the id of the last
+#                 update the snapshot includes.
+depthSnapshot = namedtuple('depthSnapshot', ['last_update_id', 'bids', 'asks'])
+
+# depthUpdate : normalized depth diff covering update ids first_id..last_id.
+#               bids/asks are lists of (ticks, lots) pairs, where 0 lots
+#               removes the level; event_time is the venue's event time in
+#               milliseconds since the epoch.
+depthUpdate = namedtuple('depthUpdate',
+                         ['first_id', 'last_id', 'event_time', 'bids', 'asks'])
+
+
+class exchangeAdapter:
+    # Venue name, used to select the adapter (see exchanges.ADAPTERS)
+    name = None
+
+    def __init__(self, symbol, config = None):
+        """
+        Base class for a venue's depth feed. An adapter owns everything
+        venue-specific - connecting, fetching snapshots, decoding messages
+        and the sequencing rules - and hands stream() normalized,
+        pre-parsed depthSnapshot/depthUpdate records, so every venue shares
+        the same orderBook and pricing paths.
+
+        symbol: symbol on the venue (e.g. BNBBTC)
+        config: symbolConfig for the symbol (looked up in SYMBOL_CONFIGS by
+                name if not given)
+        """
+        self.symbol = symbol
+        self.config = config if config is not None else SYMBOL_CONFIGS[symbol]
+
+    # adapters : per-symbol adapters carried by this feed, by symbol. An
+    #            adapter is a feed carrying its own symbol only; multi-symbol
+    #            feeds (e.g. binanceCombinedFeed) implement the same
+    #            connect/close/recv/drain/route interface.
+    @property
+    def adapters(self):
+        return {self.symbol: self}
+
+    # route : decode a raw message into (symbol, depthUpdate), or None if it
+    #         is not a depth update
+    def route(self, raw):
+        event = self.decode(raw)
+        if event is None:
+            return None
+        return self.symbol, event
+
+    # connect : open the streaming connection
+    async def connect(self):
+        raise NotImplementedError
+
+    # close : close the streaming connection and release any other resources
+    async def close(self):
+        raise NotImplementedError
+
+    # recv : wait for the next raw message
+    async def recv(self):
+        raise NotImplementedError
+
+    # drain : raw messages already received and waiting (at most `limit`),
+    #         without waiting for new ones
+    async def drain(self, limit):
+        return []
+
+    # snapshot : fetch a depthSnapshot of the book
+    async def snapshot(self):
+        return self.decode_snapshot(await self.fetch_snapshot())
+
+    # fetch_snapshot : fetch a raw snapshot of the book, as received (e.g.
+    #                  the body of a REST response), for decode_snapshot
+    async def fetch_snapshot(self):
+        raise NotImplementedError
+
+    # decode_snapshot : turn a raw snapshot into a depthSnapshot
+    def decode_snapshot(self, raw):
+        raise NotImplementedError
+
+    # decode : turn a raw message into a depthUpdate, or None if it is not a
+    #          depth update (e.g. a subscription acknowledgement)
+    def decode(self, raw):
+        raise NotImplementedError
+
+    # new_sequencer : sequencing stage enforcing this venue's update id rules
+    def new_sequencer(self):
+        return depthSequencer()
+
+    # parse_levels : parse [price, quantity] string pairs into (ticks, lots)
+    def parse_levels(self, levels):
+        parse_px = self.config.parse_px
+        parse_qty = self.config.parse_qty
+        return [(parse_px(px), parse_qty(qty)) for px, qty in levels]
@@ -0,0 +1,172 @@
+import websockets
+
+import decoders
+from conflation import drainMessages
+from exchanges.base import depthSnapshot, depthUpdate, exchangeAdapter
+from exchanges.rest import rateLimiter, snapshotClient
+
+
+# Venue endpoints; the adapters take others (e.g. a local simulator, see
+# benchmarks.simulator) as api_base/stream_base
+API_BASE = "https://api.binance.com"
+STREAM_BASE = "wss://stream.binance.com:9443"
+DEPTH_API_URL = "{api}/api/v3/depth?symbol={symbol}&limit={limit}"
+STREAMING_URL = "{streams}/ws/{stream}@depth"
+COMBINED_STREAMING_URL = "{streams}/stream?streams={names}"
+
+# Request weight budget per minute for REST snapshots (Binance allows more
+# in total, but leave headroom for anything else sharing the IP)
+SNAPSHOT_WEIGHT_PER_MINUTE = 1200
+
+
+# depthWeight : request weight of a depth snapshot with `limit` levels
+def depthWeight(limit):
+    if limit <= 100:
+        return 5
+    if limit <= 500:
+        return 25
+    if limit <= 1000:
+        return 50
+    return 250
+
+
+class binanceAdapter(exchangeAdapter):
+    name = "binance"
+
+    def __init__(self, symbol, config = None, decode = None,
+                 snapshot_limit = 1000, client = None, api_base = API_BASE,
+                 stream_base = STREAM_BASE):
+        """
+        Adapter for the Binance spot diff depth stream
+
+        symbol        : Binance symbol (e.g. BNBBTC)
+        config        : symbolConfig for the symbol
+        decode        : JSON decoder (see decoders.get_decoder; the fastest
+                        installed backend by default)
+        snapshot_limit: number of levels per side in REST snapshots
+        client        : snapshotClient to share with other adapters (one is
+                        created, with its own rate limit, if not given)
+        api_base      : base URL of the REST API
+        stream_base   : base URL of the websocket streams
+
+        Snapshots are fetched off the event loop over a keep-alive connection
+        (see snapshotClient). Events follow the Binance update id rules
+        enforced by depthSequencer.
+        """
+        super().__init__(symbol, config)
+        self.decode_json = decoders.get_decoder() if decode is None else decode
+        self.depth_url = DEPTH_API_URL.format(api = api_base, symbol = symbol,
+                                              limit = snapshot_limit)
+        self.depth_weight = depthWeight(snapshot_limit)
+        self.stream_url = STREAMING_URL.format(streams = stream_base,
+                                               stream = symbol.lower())
+        if client is None:
+            client = snapshotClient(
+                self.decode_json,
+                limiter = rateLimiter(SNAPSHOT_WEIGHT_PER_MINUTE))
+        self.client = client
+        self.websocket = None
+
+    async def connect(self):
+        self.websocket = await websockets.connect(self.stream_url)
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+        self.client.close()
+
+    async def recv(self):
+        return await self.websocket.recv()
+
+    async def drain(self, limit):
+        return await drainMessages(self.websocket, limit)
+
+    async def fetch_snapshot(self):
+        return await self.client.fetch_raw(self.depth_url, self.depth_weight)
+
+    def decode_snapshot(self, raw):
+        depthMsg = self.decode_json(raw)
+        return depthSnapshot(int(depthMsg["lastUpdateId"]),
+                             self.parse_levels(depthMsg["bids"]),
+                             self.parse_levels(depthMsg["asks"]))
+
+    def decode(self, raw):
+        return self.decode_event(self.decode_json(raw))
+
+    # decode_event : normalize an already decoded depth update message
+    def decode_event(self, msg):
+        if "U" not in msg:
+            return None
+        return depthUpdate(msg["U"], msg["u"], msg["E"],
+                           self.parse_levels(msg["b"]),
+                           self.parse_levels(msg["a"]))
+
+
+class binanceCombinedFeed:
+    name = "binance"
+
+    def __init__(self, symbols, configs = None, decode = None,
+                 snapshot_limit = 1000,
+                 weight_per_minute = SNAPSHOT_WEIGHT_PER_MINUTE,
+                 snapshot_concurrency = 4, api_base = API_BASE,
+                 stream_base = STREAM_BASE):
+        """
+        Many Binance symbols over a single combined-stream websocket
+
+        symbols             : Binance symbols (e.g. ["BNBBTC", "ETHBTC"])
+        configs             : symbolConfig per symbol (looked up in
+                              SYMBOL_CONFIGS if not given)
+        decode              : JSON decoder (see decoders.get_decoder)
+        snapshot_limit      : number of levels per side in REST snapshots
+        weight_per_minute   : request weight budget shared by all snapshots
+        snapshot_concurrency: snapshots fetched at the same time
+        api_base            : base URL of the REST API
+        stream_base         : base URL of the websocket streams
+
+        Messages arrive wrapped as {"stream": "<symbol>@depth", "data": ...};
+        route() unwraps them and hands the update to the symbol's own
+        binanceAdapter, which also fetches that symbol's snapshots through
+        one shared, rate-limited snapshotClient.
+        """
+        configs = configs or {}
+        self.decode_json = decoders.get_decoder() if decode is None else decode
+        self.client = snapshotClient(self.decode_json,
+                                     pool_size = snapshot_concurrency,
+                                     limiter = rateLimiter(weight_per_minute))
+        self.adapters = {}
+        self.streams = {}
+        for symbol in symbols:
+            adapter = binanceAdapter(symbol, configs.get(symbol),
+                                     self.decode_json, snapshot_limit,
+                                     self.client, api_base, stream_base)
+            self.adapters[symbol] = adapter
+            self.streams[symbol.lower() + "@depth"] = adapter
+        self.stream_url = COMBINED_STREAMING_URL.format(
+            streams = stream_base, names = "/".join(self.streams))
+        self.websocket = None
+
+    async def connect(self):
+        self.websocket = await websockets.connect(self.stream_url)
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+        self.client.close()
+
+    async def recv(self):
+        return await self.websocket.recv()
+
+    async def drain(self, limit):
+        return await drainMessages(self.websocket, limit)
+
+    # route : decode a raw combined-stream message into (symbol, depthUpdate),
+    #         or None if it is not a depth update
+    def route(self, raw):
+        msg = self.decode_json(raw)
+        adapter = self.streams.get(msg.get("stream"))
+        if adapter is None:
+            return None
+        event = adapter.decode_event(msg["data"])
+        if event is None:
+            return None
+        return adapter.symbol, event
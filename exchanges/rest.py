@@ -0,0 +1,78 @@
+import asyncio
+import concurrent.futures
+import time
+
+import requests
+
+
+class rateLimiter:
+    def __init__(self, weight_per_minute):
+        """
+        Token bucket keeping REST requests within a venue's request-weight
+        budget
+
+        weight_per_minute: weight that may be spent per minute; up to a
+                           minute's worth can be spent in a burst
+        """
+        self.capacity = weight_per_minute
+        self.rate = weight_per_minute / 60
+        self.tokens = weight_per_minute
+        self.updated = time.monotonic()
+
+    # acquire : wait until `weight` can be spent, then spend it
+    async def acquire(self, weight):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= weight:
+                self.tokens -= weight
+                return
+            await asyncio.sleep((weight - self.tokens) / self.rate)
+
+
+class snapshotClient:
+    def __init__(self, decode, pool_size = 4, limiter = None):
+        """
+        Class fetching REST depth snapshots without blocking the event loop
+
+        decode   : function decoding the response body (see decoders)
+        pool_size: number of keep-alive connections to keep per host, and of
+                   snapshots fetched concurrently
+        limiter  : optional rateLimiter every request is charged against
+
+        Requests go through one requests.Session, so the TCP/TLS connection
+        to the exchange is kept alive and reused by later snapshots (e.g. on
+        resync). The blocking HTTP calls run on a pool of worker threads.
+        """
+        self.decode = decode
+        self.limiter = limiter
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections = 1,
+                                                pool_maxsize = pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers = pool_size, thread_name_prefix = "snapshot")
+
+    # fetch : fetch and decode the snapshot at url (see fetch_raw)
+    async def fetch(self, url, weight = 1):
+        return self.decode(await self.fetch_raw(url, weight))
+
+    # fetch_raw : fetch the raw body of the snapshot at url, once `weight`
+    #             fits in the rate limit; the event loop keeps running while
+    #             the request is in flight
+    async def fetch_raw(self, url, weight = 1):
+        if self.limiter is not None:
+            await self.limiter.acquire(weight)
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(self.executor,
+                                              self.session.get, url)
+        response.raise_for_status()
+        return response.content
+
+    # close : release the pooled connections and the worker thread
+    def close(self):
+        self.executor.shutdown(wait = False)
+        self.session.close()
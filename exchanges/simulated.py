@@ -0,0 +1,209 @@
+import asyncio
+import json
+import random
+import time
+
+from exchanges.base import depthSnapshot, depthUpdate, exchangeAdapter
+from symbols import SYMBOL_CONFIGS
+
+
+class diffGenerator:
+    def __init__(self, symbol = "BNBBTC", config = None, mid = 8100,
+                 depth = 1000, touch_scale = 8, burst_alpha = 1.2,
+                 max_burst = 1000, delete_prob = 0.3, drift_prob = 0.05,
+                 start_time = 1620000000000, interval_ms = 1, seed = 0):
+        """
+        Class generating a realistic stream of Binance depth diffs (see
+        diff depth stream) for one symbol, from a book it keeps itself - the
+        simulated venue, and the benchmarks' synthetic workload
+
+        symbol     : symbol the diffs are for
+        config     : symbolConfig for the symbol (looked up in
+                     SYMBOL_CONFIGS by name if not given)
+        mid        : starting mid price, in ticks
+        depth      : levels per side in the initial book
+        touch_scale: mean distance from the touch of a changed level, in
+                     ticks - changes cluster near the touch and thin out
+                     exponentially with depth
+        burst_alpha: Pareto shape of the number of levels changed by one
+                     diff (1 or more; lower is heavier tailed). Most diffs
+                     change a handful of levels, a few change hundreds.
+        max_burst  : cap on the levels changed by one diff
+        delete_prob: probability that a level change removes the level
+        drift_prob : probability that a diff moves the mid by one tick (the
+                     levels the mid crosses are removed in the same diff)
+        start_time : event time of the first diff, in milliseconds since
+                     the epoch, or None to stamp every diff with the current
+                     time (as a live venue does)
+        interval_ms: event time between consecutive diffs (with a
+                     start_time)
+        seed       : random seed; the same seed generates the same stream
+
+        Update ids follow the Binance rules: every diff covers
+        first_id..last_id and starts right after the previous one, and
+        snapshot() is the book as of the last generated diff. Diffs are
+        generated as normalized depthUpdate records; message() and
+        snapshot_message() render them in the venue's wire format.
+        """
+        self.symbol = symbol
+        self.config = config if config is not None else SYMBOL_CONFIGS[symbol]
+        self.mid = mid
+        self.touch_scale = touch_scale
+        self.burst_alpha = burst_alpha
+        self.max_burst = max_burst
+        self.delete_prob = delete_prob
+        self.drift_prob = drift_prob
+        self.event_time = start_time
+        self.interval_ms = interval_ms
+        self.random = random.Random(seed)
+        self.update_id = 1000000
+        self.bids = {}
+        self.asks = {}
+        for distance in range(1, depth + 1):
+            self.bids[mid - distance] = self._random_lots()
+            self.asks[mid + distance - 1] = self._random_lots()
+
+    # _random_lots : random level quantity, heavy-tailed like real books
+    def _random_lots(self):
+        return int(self.random.paretovariate(1.5) * 1000)
+
+    # _burst : number of levels changed by the next diff
+    def _burst(self):
+        return min(int(self.random.paretovariate(self.burst_alpha)),
+                   self.max_burst)
+
+    # next_update : generate the next depthUpdate and apply it to the
+    #               generator's own book
+    def next_update(self):
+        rng = self.random
+        changes = {'buy': {}, 'sell': {}}
+
+        # Occasionally move the mid, removing the level it crosses (bids
+        # stay below the mid, asks at or above it)
+        if rng.random() < self.drift_prob:
+            self.mid += rng.choice((-1, 1))
+            if self.mid - 1 in self.asks:
+                changes['sell'][self.mid - 1] = 0
+            if self.mid in self.bids:
+                changes['buy'][self.mid] = 0
+
+        # Change a burst of levels, mostly close to the touch
+        for _ in range(self._burst()):
+            side = rng.choice(('buy', 'sell'))
+            distance = int(rng.expovariate(1 / self.touch_scale))
+            if side == 'buy':
+                px = self.mid - 1 - distance
+            else:
+                px = self.mid + distance
+            if px <= 0:
+                continue
+            deleting = rng.random() < self.delete_prob
+            changes[side][px] = 0 if deleting else self._random_lots()
+
+        # Apply to the generator's book
+        for side, book in (('buy', self.bids), ('sell', self.asks)):
+            for px, lots in changes[side].items():
+                if lots:
+                    book[px] = lots
+                else:
+                    book.pop(px, None)
+
+        count = len(changes['buy']) + len(changes['sell'])
+        first_id = self.update_id + 1
+        self.update_id += max(count, 1)
+        if self.event_time is None:
+            event_time = int(time.time() * 1000)
+        else:
+            self.event_time += self.interval_ms
+            event_time = self.event_time
+        return depthUpdate(first_id, self.update_id, event_time,
+                           list(changes['buy'].items()),
+                           list(changes['sell'].items()))
+
+    # events : the next `count` depthUpdates
+    def events(self, count):
+        return [self.next_update() for _ in range(count)]
+
+    # snapshot : depthSnapshot of the generator's book (at most `limit`
+    #            levels per side), as of the last generated diff
+    def snapshot(self, limit = None):
+        return depthSnapshot(self.update_id,
+                             sorted(self.bids.items(), reverse = True)[:limit],
+                             sorted(self.asks.items())[:limit])
+
+    # raw_levels : (ticks, lots) pairs as the [price, quantity] strings of
+    #              the wire format
+    def raw_levels(self, levels):
+        format_px = self.config.format_px
+        format_qty = self.config.format_qty
+        return [[format_px(px), format_qty(lots)] for px, lots in levels]
+
+    # message : a depthUpdate as a raw diff depth stream message
+    def message(self, event):
+        return json.dumps({
+            "e": "depthUpdate", "E": event.event_time, "s": self.symbol,
+            "U": event.first_id, "u": event.last_id,
+            "b": self.raw_levels(event.bids),
+            "a": self.raw_levels(event.asks)}, separators = (',', ':'))
+
+    # snapshot_message : a depthSnapshot as the body of a REST depth
+    #                    response
+    def snapshot_message(self, depth):
+        return json.dumps({
+            "lastUpdateId": depth.last_update_id,
+            "bids": self.raw_levels(depth.bids),
+            "asks": self.raw_levels(depth.asks)}, separators = (',', ':'))
+
+
+class simulatedAdapter(exchangeAdapter):
+    name = "simulated"
+
+    def __init__(self, symbol = "BNBBTC", config = None, rate = 100,
+                 mid = 8100, depth = 500, max_levels = 10,
+                 delete_prob = 0.3, seed = None):
+        """
+        Local simulated venue, for testing the engine without a network
+
+        symbol     : symbol to simulate
+        config     : symbolConfig for the symbol
+        rate       : depth updates generated per second
+        mid        : starting mid price, in ticks
+        depth      : levels per side in the initial book
+        max_levels : maximum levels changed by one update
+        delete_prob: probability that a level change is a deletion
+        seed       : random seed, for reproducible runs
+
+        Updates come from a diffGenerator, which keeps the venue's book:
+        random changes close to the touch, with a slowly drifting mid price,
+        stamped with the current time. Update ids follow the Binance rules
+        (each update covers first_id..last_id and starts right after the
+        previous one), and snapshots are the venue's book as of the last
+        generated update. Messages and snapshots are already normalized, so
+        decode() and decode_snapshot() are the identity.
+        """
+        super().__init__(symbol, config)
+        self.rate = rate
+        self.generator = diffGenerator(symbol, self.config, mid = mid,
+                                       depth = depth, max_burst = max_levels,
+                                       delete_prob = delete_prob,
+                                       start_time = None, seed = seed)
+
+    async def connect(self):
+        return
+
+    async def close(self):
+        return
+
+    async def recv(self):
+        await asyncio.sleep(1 / self.rate)
+        return self.generator.next_update()
+
+    async def fetch_snapshot(self):
+        await asyncio.sleep(0)
+        return self.generator.snapshot()
+
+    def decode(self, raw):
+        return raw
+
+    def decode_snapshot(self, raw):
+        return raw
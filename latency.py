@@ -0,0 +1,158 @@
+import asyncio
+import signal
+import sys
+
+
+class latencyHistogram:
+    def __init__(self, precision_bits = 7, max_exponent = 40):
+        """
+        Class recording latencies (in microseconds) into HDR-style
+        log-linear buckets
+
+        precision_bits: values below 2**precision_bits are counted exactly;
+                        larger values keep precision_bits significant bits
+                        (under 1% relative error with the default)
+        max_exponent  : values are clamped below 2**(precision_bits +
+                        max_exponent)
+
+        Recording is a couple of integer operations and one list increment,
+        with no allocation, so it can be left on in the hot path.
+        """
+        self.bits = precision_bits
+        self.half = 1 << (precision_bits - 1)
+        self.max_value = (1 << (precision_bits + max_exponent)) - 1
+        self.counts = [0] * ((1 << precision_bits) + max_exponent * self.half)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    # record : add one value (microseconds; negative values count as 0)
+    def record(self, value):
+        value = min(max(int(value), 0), self.max_value)
+        shift = value.bit_length() - self.bits
+        if shift <= 0:
+            self.counts[value] += 1
+        else:
+            self.counts[(1 << self.bits) + (shift - 1) * self.half
+                        + (value >> shift) - self.half] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    # _bucket_value : highest value that falls into bucket `index`
+    def _bucket_value(self, index):
+        if index < (1 << self.bits):
+            return index
+        shift, offset = divmod(index - (1 << self.bits), self.half)
+        shift += 1
+        return ((offset + self.half + 1) << shift) - 1
+
+    # percentile : value at or below which `q` percent of the recorded values
+    #              fall (0 if nothing was recorded)
+    def percentile(self, q):
+        if not self.count:
+            return 0
+        target = max(1, -(-self.count * q // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._bucket_value(index), self.max)
+        return self.max
+
+    # reset : forget every recorded value
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+
+# Stages of the pipeline, in order: exchange_to_receive is measured from the
+# event's "E" timestamp (and so includes any clock offset to the exchange),
+# exchange_to_output from "E" to the quote reaching the console; the other
+# stages are local processing times
+STAGES = ("exchange_to_receive", "decode", "sequence", "apply", "price",
+          "render", "exchange_to_output")
+
+
+class latencyRecorder:
+    def __init__(self, stages = STAGES):
+        """
+        Class holding one latencyHistogram per pipeline stage
+
+        stages: stage names, in the order they are reported
+
+        sequencers holds the depthSequencer of every book timed into the
+        recorder, by "venue:symbol" (bookManager registers its own); their
+        gap and resync counters are reported and reset with the stages.
+        """
+        self.histograms = {stage: latencyHistogram() for stage in stages}
+        self.sequencers = {}
+
+    # record : record a duration in seconds for a stage
+    def record(self, stage, seconds):
+        self.histograms[stage].record(seconds * 1e6)
+
+    # record_since_event : record the time elapsed since an exchange event
+    #                      time (milliseconds since the epoch, as in "E"),
+    #                      given the current wall-clock time in seconds
+    def record_since_event(self, stage, event_ms, now):
+        self.histograms[stage].record((now * 1000 - event_ms) * 1000)
+
+    # report : one line per stage with the count and p50/p99/p999/max in
+    #          microseconds, then one line per book with its sequence gaps,
+    #          stale snapshots, resyncs and p50/max resync durations in
+    #          milliseconds
+    def report(self):
+        lines = [f"{'stage':>20} {'count':>9} {'p50':>9} {'p99':>9} "
+                 f"{'p999':>9} {'max':>9}  (us)"]
+        for stage, hist in self.histograms.items():
+            lines.append(f"{stage:>20} {hist.count:>9} "
+                         f"{hist.percentile(50):>9} {hist.percentile(99):>9} "
+                         f"{hist.percentile(99.9):>9} {hist.max:>9}")
+        if self.sequencers:
+            lines.append(f"{'book':>20} {'gaps':>9} {'stale':>9} "
+                         f"{'resyncs':>9} {'resync p50':>10} {'max':>9}  (ms)")
+        for name, sequencer in self.sequencers.items():
+            stats = sequencer.stats()
+            lines.append(f"{name:>20} {stats['gaps']:>9} "
+                         f"{stats['stale_snapshots']:>9} "
+                         f"{stats['resyncs']:>9} "
+                         f"{stats['resync_p50'] * 1000:>10.1f} "
+                         f"{stats['resync_max'] * 1000:>9.1f}")
+        return "\n".join(lines)
+
+    # dump : write the report (on its own lines, so it does not clobber the
+    #        quote line on the console)
+    def dump(self, out = None):
+        out = sys.stderr if out is None else out
+        print("\n" + self.report(), file = out, flush = True)
+
+    # reset : forget every recorded value and sequencer counter
+    def reset(self):
+        for hist in self.histograms.values():
+            hist.reset()
+        for sequencer in self.sequencers.values():
+            sequencer.reset_counters()
+
+    # dump_periodically : dump the report every `interval` seconds (until
+    #                     cancelled)
+    async def dump_periodically(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            self.dump()
+
+    # install_signal_handler : dump the report whenever the process receives
+    #                          SIGUSR1. Returns False where the platform or
+    #                          event loop does not support it (e.g. Windows).
+    def install_signal_handler(self, loop = None):
+        if not hasattr(signal, "SIGUSR1"):
+            return False
+        loop = asyncio.get_event_loop() if loop is None else loop
+        try:
+            loop.add_signal_handler(signal.SIGUSR1, self.dump)
+        except (NotImplementedError, RuntimeError):
+            return False
+        return True
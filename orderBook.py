@@ -1,217 +1,349 @@
+import argparse
 import asyncio
-import websockets
-import requests
-import ast
-import math
-from collections import deque, namedtuple, defaultdict
-
-class orderBook:
-    def __init__(self, name, max_price = 100000, start_order_id = 0):
-        """
-        Class representing a single order book
-
-        name          : asset name (in this case, BNBBTC)
-        max_price     : maximum price
-        start_order_id: first number to use for next order
-        """
-        self.name = name
-        self.order_id = start_order_id
-        self.max_price = max_price
-        self.book = defaultdict(lambda: deque())
-        self.bookDepth = defaultdict(lambda: 0)
-        self.bid_max = 0
-        self.ask_min = max_price + 1
-
-    # update_order : I assume this is what we are supposed to do with the events
-    #                we stream from the binance site - update bids and asks to
-    #                the quantities we are given, rather than actually placing
-    #                orders.
-    def update_book(self, side, px, qty):
-        # Delete order if needed
-        if float(qty) == 0:
-            # Check if order book contains any volume at this price level
-            if float(px) in self.book:
-                del self.book[float(px)]
-
-                # Update best bid/ask if needed
-                prices = sorted(list(self.book))
-                if ((side == 'buy') and (px == self.bid_max)):
-                    if self.book[prices[-1]][0] == 'buy':
-                        self.bid_max = prices[-1]
-                    else:
-                        for i in range(len(prices)):
-                            if self.book[prices[i]][0] == 'sell':
-                                if i == 0:
-                                    self.bid_max = 0
-                                else:
-                                    self.bid_max = prices[i-1]
-                if ((side == 'sell') and (px == self.ask_min)):
-                    if self.book[prices[0]][0] == 'sell':
-                        self.ask_min = prices[0]
-                    else:
-                        for i in range(len(prices) - 1, -1, -1):
-                            if self.book[prices[i]][0] == 'buy':
-                                if i == len(prices) - 1:
-                                    self.ask_min = math.inf
-                                else:
-                                    self.ask_min = prices[i + 1]
-        # Modify order (always possible)
-        else:
-            self.book[float(px)] = (side, float(qty))
-
-            # Update best bid/ask accordingly
-            if side == 'buy':
-                self.bid_max = max(self.bid_max, float(px))
-            elif side == 'sell':
-                self.ask_min = min(self.ask_min, float(px))
-            else:
-                print("Order side must be either 'buy' or 'sell'!")
-                return
-
-
-DEPTH_API_URL = "https://api.binance.com/api/v3/depth?symbol=BNBBTC&limit=1000"
-STREAMING_URL = "wss://stream.binance.com:9443/ws/bnbbtc@depth"
-
-
-# stream : 1. Obtain the depth message (lastUpdateId) before streaming events.
-#               I assume that is what we had to do, because the alternative was
-#               constantly (in the while loop) obtaining a new lastUpdateId as
-#               well as streaming the events, but when I did that, the events'
-#               "u" fields never passed the criterion listed in the Binance
-#               documentation.
-#          2. If the criterion listed in the Binance documentation (relating to
-#             update time and lastUpdateId) is met, process this message
-async def stream(uri, orderSize):
-    # Set firstRun flag
-    firstRun = True
-    
-    # Connect to streaming websocket
-    async with websockets.connect(uri) as websocket:
-        while True:
-            # On first run, obtain lastUpdateId and initialize orderbook based
-            # on depth message
-            if firstRun:
-                # Get depth message and convert it to a dict
-                depthMsg = ast.literal_eval(requests.get(DEPTH_API_URL).text)
-
-                # Get lastUpdateId
-                lastUpdateId = int(depthMsg["lastUpdateId"])
-                
-                # Get current list of bids and asks
-                bids = [(float(px), float(qty)) for px, qty in depthMsg["bids"]]
-                asks = [(float(px), float(qty)) for px, qty in depthMsg["asks"]]
-
-                # Create empty orderbook
-                myOB = orderBook("BNBBTC")
-
-                # Populate orderbook with current bids and asks (from depth
-                # message)
-                for (px, qty) in bids:
-                    myOB.update_book('buy', px, qty)
-                for (px, qty) in asks:
-                    myOB.update_book('sell', px, qty)
-
-                # Set firstRun flag so that lastUpdateId is not recomputed
-                firstRun = False
-                
-                # Obtain the message from the websocket connection
-                msg = await websocket.recv()
-
-                # Convert the (string) message into a dictionary
-                msg = ast.literal_eval(msg)
-            
-                # Check lastUpdateId condition
-                if int(msg["u"]) > lastUpdateId:
-                    myOB = processMsg(msg, myOB, orderSize)
-
-            else:
-                # Obtain the message from the websocket connection
-                msg = await websocket.recv()
-
-                # Convert the (string) message into a dictionary
-                msg = ast.literal_eval(msg)
-            
-                # Check lastUpdateId condition
-                if int(msg["u"]) > lastUpdateId:
-                    myOB = processMsg(msg, myOB, orderSize)
-        return
+import sys
+import exchanges
+# The book classes, ingestion helpers and renderer live in book,
+# bookManager and rendering, and are re-exported here for existing users of
+# this module
+from book import (levelIndex, notionalQuote, orderBook, priceLadder,
+                  sizeQuote)
+from bookManager import bookManager, buildBook, processMsg
+from capture import captureWriter
+from checkpoint import checkpointWriter, warmStarts
+from consolidated import consolidatedBook, formatConsolidatedQuotes
+from latency import latencyRecorder
+from profiling import samplingProfiler
+from publishing import quotePublisher, quoteReader
+from rendering import formatNotionalQuotes, formatQuotes, quoteRenderer
+from supervisor import partitionSymbols, supervisor
+from symbols import SYMBOL_CONFIGS
 
+# stream : 1. Start fetching the depth snapshot of every symbol and connect
+#             to the venue's depth stream at the same time. Events received
+#             before a snapshot arrives are buffered (see depthSequencer).
+#          2. Once a snapshot arrives, build the book from it and apply the
+#             buffered events that follow it, as described in the Binance
+#             documentation ("How to manage a local order book correctly").
+#          3. Process every following event that continues the sequence. If
+#             an event is missing (gap), buffer events again and resync with
+#             a fresh snapshot plus the buffered events.
+#          Everything venue-specific (connection, snapshots, decoding and
+#          sequencing rules) is done by `feed` - an exchange adapter, or a
+#          multi-symbol feed (see exchanges) - and the books are kept by a
+#          bookManager.
+#          Ingestion never prices or prints: a quoteRenderer does both every
+#          render_interval seconds, and only if a book changed, so bursts
+#          are conflated and only the latest state is priced.
+#          Every stage is timed into `latency` (a latencyRecorder), which is
+#          dumped to stderr on SIGUSR1 and every stats_interval seconds if
+#          given.
+#          SIGUSR2 samples every thread's stack for `profile_duration`
+#          seconds and writes them as a collapsed-stack flame graph file
+#          into profile_dir (see samplingProfiler); a second SIGUSR2 ends
+#          the profile early. Where there are no signals, creating the file
+#          profile_trigger does the same. Nothing is sampled in between.
+#          If shm_name is given, the top of book of every symbol is also
+#          published into that shared memory block after every update, and
+#          its quotes whenever the renderer prices them, for other
+#          processes on the host (see quoteReader).
+#          If capture_path is given, every raw message and snapshot is
+#          appended to that capture file (see captureWriter).
+#          If checkpoint_dir is given, the books are saved there every
+#          checkpoint_interval seconds and on exit, and the next run starts
+#          from those checkpoints when the stream still continues them (see
+#          checkpointWriter and bookManager).
+async def stream(feed, orderSizes, budgets = (), render_interval = 0.1,
+                 max_batch = 1000, latency = None, stats_interval = None,
+                 shm_name = None, capture_path = None, checkpoint_dir = None,
+                 checkpoint_interval = 60, profile_dir = ".",
+                 profile_duration = 30, profile_trigger = None):
+    # Per-stage latency histograms
+    if latency is None:
+        latency = latencyRecorder()
+    latency.install_signal_handler()
 
-# processMsg : given a message, update the input orderBook and then output the
-#              average bid and ask prices for the input order size
-def processMsg(msg, orderBook, orderSize):
-    # Update order book
-    if "b" in msg:
-        for [update_px, update_qty] in msg["b"]:
-            orderBook.update_book('buy', update_px, update_qty)
-    if "a" in msg:
-        for [update_px, update_qty] in msg["a"]:
-            orderBook.update_book('sell', update_px, update_qty)
-
-    # Get list of bids/asks
-    bids = []
-    asks = []
-    prices = sorted(list(orderBook.book))
-    pLen = len(prices)
-    i = 0
-    while((orderBook.book[prices[i]][0] == 'buy') and (i < pLen)):
-        bids.append((prices[i], orderBook.book[prices[i]][1]))
-        i += 1
-    while i < pLen:
-        asks.append((prices[i], orderBook.book[prices[i]][1]))
-        i += 1
-    
-    originalOrderSize = orderSize
-
-    # Assume order is bid to compute average bid price
-    if sum([i for (_, i) in bids]) >= originalOrderSize:
-        total = 0
-        i = -1
-        while orderSize >= 0:
-            if orderSize > bids[i][1]:
-                total += bids[i][0] * bids[i][1]
-                orderSize -= bids[i][1]
-                i -= 1
-            else:
-                total += bids[i][0] * min(bids[i][1], orderSize)
-                break
-        bidAvg = f"Bid Avg = {total/originalOrderSize}"
-    else:
-        bidAvg = "Insufficient bids"
-    
-    # Reset order size for computations
-    orderSize = originalOrderSize
-
-    # Assume order is ask to copmute average ask price
-    if sum([i for (_, i) in asks]) >= originalOrderSize:
-        total = 0
-        i = 0
-        while orderSize >= 0:
-            if orderSize > asks[i][1]:
-                total += asks[i][0] * asks[i][1]
-                orderSize -= asks[i][1]
-                i += 1
-            else:
-                total += asks[i][0] * min(asks[i][1], orderSize)
-                break
-        askAvg = f"Ask Avg = {total/originalOrderSize}"
-    else:
-        askAvg = "Insufficient asks"
+    # On-demand profiling
+    profiler = samplingProfiler(duration = profile_duration,
+                                directory = profile_dir)
+    profiler.install_signal_handler()
+    watching = None
+    if profile_trigger:
+        watching = asyncio.ensure_future(
+            profiler.watch_trigger(profile_trigger))
+
+    # Pricing, console output and publishing of the quotes run on their own
+    # cadence; only the top of book is published after every update
+    publisher = None
+    if shm_name:
+        publisher = quotePublisher(shm_name, feed.adapters, orderSizes,
+                                   budgets)
+    renderer = quoteRenderer(orderSizes, budgets, render_interval, latency,
+                             publisher = publisher)
+    rendering = asyncio.ensure_future(renderer.run())
+    reporting = None
+    if stats_interval:
+        reporting = asyncio.ensure_future(
+            latency.dump_periodically(stats_interval))
+
+    # Books are handed to the renderer and, if any, the shared memory
+    # publisher
+    consumers = [renderer]
+    if publisher is not None:
+        consumers.append(publisher)
+
+    def on_book(symbol, book):
+        for consumer in consumers:
+            consumer.set_book(symbol, book)
+
+    def on_update(symbol, book, event):
+        for consumer in consumers:
+            consumer.on_update(symbol, book, event)
+
+    # Record the raw inputs, if asked to
+    capture = None
+    if capture_path:
+        capture = captureWriter(capture_path)
+
+    # Keep the books up to date (until manual termination), checkpointing
+    # them if asked to
+    checkpoints = None
+    checkpointing = None
+    if checkpoint_dir:
+        checkpoints = checkpointWriter(checkpoint_dir, checkpoint_interval)
+    manager = bookManager(
+        feed, max_batch, latency, on_book = on_book, on_update = on_update,
+        capture = capture,
+        checkpoints = warmStarts(checkpoint_dir, feed) if checkpoint_dir
+        else None)
+    if checkpoints is not None:
+        checkpointing = asyncio.ensure_future(checkpoints.run(manager))
+    try:
+        await manager.run()
+    finally:
+        for task in (rendering, reporting, checkpointing, watching):
+            if task is not None:
+                task.cancel()
+        profiler.stop()
+        if checkpoints is not None:
+            checkpoints.save(manager)
+            checkpoints.close()
+        if publisher is not None:
+            publisher.close()
+        if capture is not None:
+            capture.close()
+
+
+# consolidate : keep one symbol's book on several venues (a {venue: feed}
+#               dict of single-symbol feeds) and render the average
+#               execution prices against their combined liquidity, with the
+#               venues each order size would sweep (see consolidatedBook).
+#               SIGUSR1, SIGUSR2, stats_interval and profile_trigger work as
+#               in stream().
+async def consolidate(feeds, orderSizes, budgets = (), render_interval = 0.1,
+                      max_batch = 1000, latency = None, stats_interval = None,
+                      profile_dir = ".", profile_duration = 30,
+                      profile_trigger = None):
+    if latency is None:
+        latency = latencyRecorder()
+    latency.install_signal_handler()
+    profiler = samplingProfiler(duration = profile_duration,
+                                directory = profile_dir)
+    profiler.install_signal_handler()
+    watching = None
+    if profile_trigger:
+        watching = asyncio.ensure_future(
+            profiler.watch_trigger(profile_trigger))
+    symbol = next(iter(next(iter(feeds.values())).adapters))
+    book = consolidatedBook(symbol)
+    renderer = quoteRenderer(orderSizes, budgets, render_interval, latency,
+                             formatter = formatConsolidatedQuotes)
+    rendering = asyncio.ensure_future(renderer.run())
+    reporting = None
+    if stats_interval:
+        reporting = asyncio.ensure_future(
+            latency.dump_periodically(stats_interval))
+
+    # Every venue's bookManager hands its book to the consolidated view
+    def on_book(venue):
+        def set_book(symbol, venueBook):
+            book.set_book(venue, venueBook)
+            renderer.set_book(symbol, book)
+        return set_book
+
+    def on_update(symbol, venueBook, event):
+        renderer.on_update(symbol, book, event)
 
-    # Reset order size for printing
-    orderSize = originalOrderSize
-    print(f"For order size {orderSize}, {bidAvg}, {askAvg}", end = "\r")
-    return orderBook
+    managers = [bookManager(feed, max_batch, latency,
+                            on_book = on_book(venue), on_update = on_update)
+                for venue, feed in feeds.items()]
+    try:
+        await asyncio.gather(*[manager.run() for manager in managers])
+    finally:
+        for task in (rendering, reporting, watching):
+            if task is not None:
+                task.cancel()
+        profiler.stop()
 
 
-# main : main function which will call appropriate helpers
-async def main():
-    # Obtain input order size (allows floats)
-    orderSize = float(input("Enter order size: "))
+# promptQuantities : obtain the order sizes and optional quote budgets to
+#                    price from the console, checked against the symbolConfig
+#                    of every symbol priced (`configs`). Returns (orderSizes,
+#                    budgets), or None after saying why they were rejected.
+#                    Shared by main() and replay.
+def promptQuantities(configs):
+    # Obtain input order sizes (allows floats, separated by commas and/or
+    # spaces, e.g. "0.1, 1, 5, 25")
+    orderSizes = [float(size) for size in
+                  input("Enter order size(s): ").replace(',', ' ').split()]
+
+    # Obtain optional quote-currency budgets (e.g. "2.5" BTC) for the
+    # inverse query
+    budgets = [float(budget) for budget in
+               input("Enter quote budget(s) (optional): ").replace(',', ' ')
+               .split()]
+
+    if any(budget <= 0 for budget in budgets):
+        print("Quote budgets must be positive!")
+        return None
+
+    # Every size must be a whole number of lots (at least one) of every
+    # symbol, or it would be priced for a rounded size
+    for config in configs:
+        if not orderSizes or min(config.to_lots(s) for s in orderSizes) <= 0:
+            print(f"Order sizes must be at least {config.step_size} "
+                  f"for {config.name}!")
+            return None
+        if not all(config.is_lots(s) for s in orderSizes):
+            print(f"Order sizes must be multiples of {config.step_size} "
+                  f"for {config.name}!")
+            return None
+    return orderSizes, budgets
+
+
+# main : main function which will call appropriate helpers. The venue,
+#        symbols and number of worker processes can be given on the command
+#        line (default: binance BNBBTC, no workers), e.g.
+#        "python orderBook.py simulated",
+#        "python orderBook.py binance BNBBTC,ETHBTC" or
+#        "python orderBook.py binance BNBBTC,ETHBTC,BTCUSDT,ETHUSDT 2".
+#        Several symbols share one connection where the venue supports it;
+#        with workers, the symbols are split across that many processes
+#        (see supervisor). Several venues (e.g.
+#        "python orderBook.py binance,simulated BTCUSDT") are priced as one
+#        consolidated book of a single symbol (see consolidate).
+#        Publishing, capture and checkpoints are enabled with options, e.g.
+#        "python orderBook.py binance BNBBTC --shm quotes --capture
+#        bnbbtc.cap --checkpoints ckpt" (see --help).
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog = "orderBook.py",
+        description = "Keep local order books in sync with a venue's depth "
+                      "stream and quote average execution prices")
+    parser.add_argument("venues", nargs = "?", default = "binance",
+                        help = "venue, or comma-separated venues to "
+                               "consolidate (default: binance)")
+    parser.add_argument("symbols", nargs = "?", default = "BNBBTC",
+                        help = "comma-separated symbols (default: BNBBTC)")
+    parser.add_argument("workers", nargs = "?", type = int, default = 0,
+                        help = "worker processes to split the symbols "
+                               "across (default: none)")
+    parser.add_argument("--shm", metavar = "NAME",
+                        help = "shared memory block to publish quotes into "
+                               "(see publishing.quoteReader; single venue)")
+    parser.add_argument("--capture", metavar = "FILE",
+                        help = "capture file to record the raw stream into "
+                               "(see replay; single venue, no workers)")
+    parser.add_argument("--checkpoints", metavar = "DIR",
+                        help = "directory to checkpoint the books into and "
+                               "warm start them from (single venue, no "
+                               "workers)")
+    parser.add_argument("--checkpoint-interval", metavar = "SECONDS",
+                        type = float, default = 60,
+                        help = "seconds between checkpoints (default: 60)")
+    parser.add_argument("--stats-interval", metavar = "SECONDS",
+                        type = float,
+                        help = "seconds between latency and sequencing "
+                               "reports on stderr (default: only on "
+                               "SIGUSR1)")
+    parser.add_argument("--profile-dir", metavar = "DIR", default = ".",
+                        help = "directory profiles are written to (see "
+                               "profiling; default: current directory)")
+    parser.add_argument("--profile-trigger", metavar = "FILE",
+                        help = "file whose creation starts a profile, where "
+                               "SIGUSR2 is not available (e.g. Windows); "
+                               "worker i watches FILE-i")
+    args = parser.parse_args(argv[1:])
+    venues = args.venues.split(',')
+    symbols = args.symbols.upper().split(',')
+    workers = args.workers
+    venue = venues[0]
+    for name in venues:
+        if name not in exchanges.ADAPTERS:
+            print(f"Unknown venue '{name}' "
+                  f"(available: {', '.join(exchanges.ADAPTERS)})!")
+            return
+    if len(venues) > 1 and (len(symbols) > 1 or workers):
+        print("Several venues are consolidated for a single symbol, "
+              "without workers!")
+        return
+    if len(venues) > 1 and args.shm:
+        print("Quotes are published for a single venue only!")
+        return
+    if (len(venues) > 1 or workers) and (args.capture or args.checkpoints):
+        print("Capture and checkpoints need a single venue, without "
+              "workers!")
+        return
+    shards = partitionSymbols(symbols, workers or 1)
+    if (max(len(shard) for shard in shards) > 1 and
+            venue not in exchanges.MULTI_SYMBOL_FEEDS):
+        print(f"Venue '{venue}' supports a single symbol per connection "
+              f"only (use at least {len(symbols)} workers)!")
+        return
+    for symbol in symbols:
+        if symbol not in SYMBOL_CONFIGS:
+            print(f"No tick/lot size configuration for '{symbol}' "
+                  f"(see symbols.SYMBOL_CONFIGS)!")
+            return
+
+    quantities = promptQuantities([SYMBOL_CONFIGS[symbol]
+                                   for symbol in symbols])
+    if quantities is None:
+        return
+    orderSizes, budgets = quantities
 
     # Perform computations (until manual termination, i.e. Ctrl + C)
-    await stream(STREAMING_URL, orderSize)
+    if len(venues) > 1:
+        feeds = {name: exchanges.ADAPTERS[name](symbols[0])
+                 for name in venues}
+        asyncio.run(consolidate(feeds, orderSizes, budgets,
+                                stats_interval = args.stats_interval,
+                                profile_dir = args.profile_dir,
+                                profile_trigger = args.profile_trigger))
+    elif workers:
+        supervisor(venue, symbols, workers, orderSizes, budgets,
+                   shm_name = args.shm, stats_interval = args.stats_interval,
+                   profile_dir = args.profile_dir,
+                   profile_trigger = args.profile_trigger).run()
+    elif len(symbols) > 1:
+        feed = exchanges.MULTI_SYMBOL_FEEDS[venue](symbols)
+        asyncio.run(stream(feed, orderSizes, budgets, shm_name = args.shm,
+                           stats_interval = args.stats_interval,
+                           capture_path = args.capture,
+                           checkpoint_dir = args.checkpoints,
+                           checkpoint_interval = args.checkpoint_interval,
+                           profile_dir = args.profile_dir,
+                           profile_trigger = args.profile_trigger))
+    else:
+        feed = exchanges.ADAPTERS[venue](symbols[0])
+        asyncio.run(stream(feed, orderSizes, budgets, shm_name = args.shm,
+                           stats_interval = args.stats_interval,
+                           capture_path = args.capture,
+                           checkpoint_dir = args.checkpoints,
+                           checkpoint_interval = args.checkpoint_interval,
+                           profile_dir = args.profile_dir,
+                           profile_trigger = args.profile_trigger))
 
 
 # Run main()
-asyncio.run(main())
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,167 @@
+import asyncio
+import os
+import signal
+import sys
+import threading
+import time
+
+
+# Interpreter switch interval while sampling (see _run)
+SWITCH_INTERVAL = 1e-5
+
+
+# _frameLabel : name of a stack frame in a collapsed stack, as
+#               module:function (e.g. bookManager:process)
+def _frameLabel(frame):
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{frame.f_code.co_name}"
+
+
+class samplingProfiler:
+    def __init__(self, interval = 0.005, duration = 30, directory = "."):
+        """
+        Class sampling the stacks of every thread of the running process for
+        a while and writing them as collapsed stacks, the input format of
+        flame graph tools (flamegraph.pl, speedscope, ...)
+
+        interval : seconds between samples
+        duration : seconds a profile lasts unless given to start()
+        directory: directory the profiles are written to, as
+                   profile-<pid>-<time>.collapsed
+
+        Nothing runs while the profiler is off. start() starts a thread
+        that wakes every interval seconds, walks the current stack of every
+        other thread (the event loop with stream, the book updates and the
+        websocket internals, the snapshot and writer threads) and counts
+        each distinct stack; the counts are written when the profile ends.
+        Every stack starts with its thread's name. path is the last profile
+        written.
+
+        A thread only sees another thread's stack while holding the GIL,
+        and a busy event loop only gives it up when it waits for the network
+        or after the interpreter's switch interval (5 ms by default), so a
+        sampler would mostly find the loop idle. While a profile is taken,
+        the switch interval is lowered to SWITCH_INTERVAL, so each sample
+        catches the loop wherever it is when the sampler wakes up.
+        """
+        self.interval = interval
+        self.duration = duration
+        self.directory = directory
+        self.thread = None
+        self.stopping = None
+        self.path = None
+
+    # running : whether a profile is being taken
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    # start : sample for `duration` seconds (the default duration if not
+    #         given). Returns False if a profile is already being taken.
+    def start(self, duration = None):
+        if self.running:
+            return False
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(
+            target = self._run, name = "profiler", daemon = True,
+            args = (self.duration if duration is None else duration,
+                    self.stopping))
+        self.thread.start()
+        return True
+
+    # stop : end the current profile early, if any, and wait until it is
+    #        written
+    def stop(self):
+        if self.running:
+            self.stopping.set()
+            self.thread.join()
+
+    # toggle : start a profile, or end the current one early (without
+    #          waiting for it to be written)
+    def toggle(self):
+        if self.running:
+            self.stopping.set()
+        else:
+            self.start()
+
+    # _run : take samples until `stopping` is set or `duration` has passed,
+    #        then write them
+    def _run(self, duration, stopping):
+        own = threading.get_ident()
+        names = {}
+        counts = {}
+        samples = 0
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(SWITCH_INTERVAL)
+        deadline = time.monotonic() + duration
+        try:
+            while (not stopping.wait(self.interval) and
+                   time.monotonic() < deadline):
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    if ident not in names:
+                        names.update((thread.ident, thread.name)
+                                     for thread in threading.enumerate())
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frameLabel(frame))
+                        frame = frame.f_back
+                    stack.append(names.get(ident, f"thread-{ident}"))
+                    key = ";".join(reversed(stack))
+                    counts[key] = counts.get(key, 0) + 1
+                samples += 1
+        finally:
+            sys.setswitchinterval(switch_interval)
+        self.path = self.write(counts)
+        print(f"\nProfile of {samples} samples written to {self.path}",
+              file = sys.stderr, flush = True)
+
+    # write : write collapsed stack counts ({stack: count}) to a new file in
+    #         the directory. Returns its path.
+    def write(self, counts):
+        os.makedirs(self.directory, exist_ok = True)
+        path = os.path.join(self.directory,
+                            f"profile-{os.getpid()}-"
+                            f"{time.strftime('%Y%m%d-%H%M%S')}.collapsed")
+        with open(path, "w") as f:
+            for stack, count in sorted(counts.items()):
+                f.write(f"{stack} {count}\n")
+        return path
+
+    # install_signal_handler : start a profile (or end the current one
+    #                          early) whenever the process receives SIGUSR2.
+    #                          Returns False where the platform or event loop
+    #                          does not support it (e.g. Windows; see
+    #                          watch_trigger).
+    def install_signal_handler(self, loop = None):
+        if not hasattr(signal, "SIGUSR2"):
+            return False
+        loop = asyncio.get_event_loop() if loop is None else loop
+        try:
+            loop.add_signal_handler(signal.SIGUSR2, self.toggle)
+        except (NotImplementedError, RuntimeError):
+            return False
+        return True
+
+    # watch_trigger : start a profile whenever a file appears at `path`,
+    #                 checking every `poll` seconds (until cancelled). The
+    #                 file may hold the profile's duration in seconds; it is
+    #                 deleted once read. Works where signals do not, e.g.
+    #                 "echo 10 > path" profiles for 10 seconds.
+    async def watch_trigger(self, path, poll = 1):
+        while True:
+            await asyncio.sleep(poll)
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path) as f:
+                    text = f.read().strip()
+                os.remove(path)
+            except OSError:
+                continue
+            try:
+                duration = float(text) if text else None
+            except ValueError:
+                duration = None
+            self.start(duration)
@@ -0,0 +1,308 @@
+import math
+import os
+import struct
+from collections import namedtuple
+from multiprocessing import resource_tracker, shared_memory
+
+from book import notionalQuote, sizeQuote
+
+# Block layout (little-endian):
+#   header : magic, number of symbols, order sizes and budgets, record size
+#   symbols: one 16-byte null-padded name per symbol
+#   sizes  : one double per order size, then one per budget
+#   records: one record per symbol (in the order of the symbol table), each
+#            starting on a 64-byte boundary so writers of different symbols
+#            never share a cache line
+# Record layout:
+#   sequence (uint64, odd while the record is being written), event time in
+#   ms (int64, 0 if unknown), best bid, best bid quantity, best ask, best ask
+#   quantity, then (bid, ask) average prices per order size and (bid_qty,
+#   bid, ask_qty, ask) per budget. Missing values are NaN.
+MAGIC = b"OBQ1"
+HEADER = struct.Struct("<4sIIII")
+SYMBOL = struct.Struct("<16s")
+SEQUENCE = struct.Struct("<Q")
+RECORD_ALIGN = 64
+
+# sharedQuote : latest quotes of one symbol, as read from shared memory.
+#               Missing prices/quantities are None, as in sizeQuote and
+#               notionalQuote.
+sharedQuote = namedtuple("sharedQuote", ["symbol", "sequence", "event_time",
+                                         "bid", "bid_qty", "ask", "ask_qty",
+                                         "quotes", "notionalQuotes"])
+
+
+# quoteLayout : offsets and record format of a block holding n_symbols
+#               records of n_sizes order sizes and n_budgets budgets
+class quoteLayout:
+    def __init__(self, n_symbols, n_sizes, n_budgets):
+        self.n_symbols = n_symbols
+        self.n_sizes = n_sizes
+        self.n_budgets = n_budgets
+        self.payload = struct.Struct(f"<q{4 + 2 * n_sizes + 4 * n_budgets}d")
+        self.record_size = -(-(SEQUENCE.size + self.payload.size)
+                             // RECORD_ALIGN) * RECORD_ALIGN
+        self.symbols_offset = HEADER.size
+        self.sizes_offset = self.symbols_offset + SYMBOL.size * n_symbols
+        table_end = self.sizes_offset + 8 * (n_sizes + n_budgets)
+        self.records_offset = -(-table_end // RECORD_ALIGN) * RECORD_ALIGN
+        self.size = self.records_offset + self.record_size * n_symbols
+
+    # record : offset of the record of the i-th symbol
+    def record(self, i):
+        return self.records_offset + self.record_size * i
+
+
+# _nan : None as NaN, for packing
+def _nan(value):
+    return math.nan if value is None else value
+
+
+# _none : NaN as None, after unpacking
+def _none(value):
+    return None if math.isnan(value) else value
+
+
+class quotePublisher:
+    def __init__(self, name, symbols, orderSizes, budgets = (),
+                 create = True):
+        """
+        Class publishing the top of book and quotes of every symbol into a
+        named shared memory block, for local readers (see quoteReader)
+
+        name      : name of the shared memory block
+        symbols   : symbols to publish (at most 16 bytes each)
+        orderSizes: order sizes to quote average execution prices for
+        budgets   : quote-currency budgets to quote base quantities for
+        create    : create the block (and unlink it on close), or attach to
+                    one created by another publisher with the same sizes and
+                    budgets and (at least) these symbols - e.g. by a
+                    supervisor whose workers each publish their own symbols
+
+        Every record is guarded by a seqlock: its sequence number is made
+        odd before the record is written and even again afterwards, so a
+        reader that sees the same even number before and after copying a
+        record knows the copy is consistent. Writers never wait for readers,
+        and readers only retry if they raced a write. Each record must have
+        a single writer; records of different symbols may be written by
+        different processes. The 8-byte sequence stores are aligned and are
+        not reordered with the record stores on x86.
+
+        The top of book is written after every update (on_update), which is
+        cheap; average prices and budget quantities are only written when
+        the book is priced anyway (publish_quotes, e.g. from a
+        quoteRenderer's render) or rebuilt, so they may lag the top of book
+        by up to the render interval.
+        """
+        self.symbols = list(symbols)
+        self.orderSizes = list(orderSizes)
+        self.budgets = list(budgets)
+        self.created = create
+        if create:
+            self.layout = quoteLayout(len(self.symbols),
+                                      len(self.orderSizes),
+                                      len(self.budgets))
+            self.shm = shared_memory.SharedMemory(name, create = True,
+                                                  size = self.layout.size)
+            self._write_header()
+            table = self.symbols
+        else:
+            self.shm = shared_memory.SharedMemory(name)
+            table, orderSizes, budgets = _readLayout(self.shm.buf)
+            if (orderSizes != self.orderSizes or budgets != self.budgets or
+                    not set(self.symbols) <= set(table)):
+                self.shm.close()
+                raise ValueError(f"Shared memory block '{name}' does not "
+                                 f"hold these symbols, sizes and budgets")
+            self.layout = quoteLayout(len(table), len(orderSizes),
+                                      len(budgets))
+        self.name = self.shm.name
+        self.slots = {symbol: i for i, symbol in enumerate(table)}
+        # Latest event time, quote values and priced (book, version) of
+        # every symbol, written along with each top of book
+        self.event_times = {}
+        self.quotes = {}
+        self.priced = {}
+        # A record left odd by a writer that died mid-write is rounded up to
+        # even, so the next write makes it odd while busy again rather than
+        # inverting the seqlock
+        self.sequences = []
+        for i in range(len(table)):
+            sequence = SEQUENCE.unpack_from(self.shm.buf,
+                                            self.layout.record(i))[0]
+            self.sequences.append(sequence + (sequence & 1))
+
+    # _write_header : write the header, symbol table and sizes of a new block
+    def _write_header(self):
+        buf = self.shm.buf
+        layout = self.layout
+        HEADER.pack_into(buf, 0, MAGIC, layout.n_symbols, layout.n_sizes,
+                         layout.n_budgets, layout.record_size)
+        for i, symbol in enumerate(self.symbols):
+            SYMBOL.pack_into(buf, layout.symbols_offset + SYMBOL.size * i,
+                             symbol.encode())
+        struct.pack_into(f"<{layout.n_sizes + layout.n_budgets}d", buf,
+                         layout.sizes_offset,
+                         *self.orderSizes, *self.budgets)
+
+    # set_book : price and publish a (re)built book (bookManager on_book
+    #            callback)
+    def set_book(self, symbol, book):
+        self.publish(symbol, book)
+
+    # on_update : publish the top of book after an update was applied to it,
+    #             with the last published quotes (bookManager on_update
+    #             callback)
+    def on_update(self, symbol, book, event):
+        self.event_times[symbol] = event.event_time
+        self._write_record(symbol, book)
+
+    # publish : price `book` and write its record
+    def publish(self, symbol, book, event_time = None):
+        if event_time is not None:
+            self.event_times[symbol] = event_time
+        self.priced.pop(symbol, None)
+        self.publish_quotes(symbol, book, book.quote(self.orderSizes),
+                            book.quote_notional(self.budgets))
+
+    # publish_quotes : write the record of `book` with quotes already priced
+    #                  from it (lists of sizeQuote and notionalQuote for the
+    #                  publisher's sizes and budgets), unless the book is
+    #                  unchanged since it was last priced
+    def publish_quotes(self, symbol, book, quotes, notionalQuotes):
+        if self.priced.get(symbol) == (book, book.version):
+            return
+        self.priced[symbol] = (book, book.version)
+        values = []
+        for q in quotes:
+            values += [_nan(q.bid), _nan(q.ask)]
+        for q in notionalQuotes:
+            values += [_nan(q.bid_qty), _nan(q.bid),
+                       _nan(q.ask_qty), _nan(q.ask)]
+        self.quotes[symbol] = values
+        self._write_record(symbol, book)
+
+    # _write_record : write the event time and top of book of `book` with
+    #                 the symbol's last published quotes (NaN until priced)
+    def _write_record(self, symbol, book):
+        config = book.config
+        values = [self.event_times.get(symbol) or 0]
+        for ladder in (book.bids, book.asks):
+            best = ladder.best()
+            if best is None:
+                values += [math.nan, math.nan]
+            else:
+                values += [config.price(best),
+                           config.quantity(ladder.levels[best])]
+        quotes = self.quotes.get(symbol)
+        if quotes is None:
+            quotes = [math.nan] * (2 * len(self.orderSizes)
+                                   + 4 * len(self.budgets))
+        self.write(self.slots[symbol], values + quotes)
+
+    # write : write the payload values of the i-th record under its seqlock
+    def write(self, i, values):
+        buf = self.shm.buf
+        offset = self.layout.record(i)
+        sequence = self.sequences[i] + 1
+        SEQUENCE.pack_into(buf, offset, sequence)
+        self.layout.payload.pack_into(buf, offset + SEQUENCE.size, *values)
+        SEQUENCE.pack_into(buf, offset, sequence + 1)
+        self.sequences[i] = sequence + 1
+
+    # close : detach from the block, and remove it if this publisher created
+    #         it
+    def close(self):
+        self.shm.close()
+        if self.created:
+            self.shm.unlink()
+
+
+# _readLayout : symbols, order sizes and budgets stored in a block
+def _readLayout(buf):
+    magic, n_symbols, n_sizes, n_budgets, _ = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a quote block")
+    layout = quoteLayout(n_symbols, n_sizes, n_budgets)
+    symbols = [SYMBOL.unpack_from(buf, layout.symbols_offset
+                                  + SYMBOL.size * i)[0]
+               .rstrip(b"\0").decode() for i in range(n_symbols)]
+    sizes = list(struct.unpack_from(f"<{n_sizes + n_budgets}d", buf,
+                                    layout.sizes_offset))
+    return symbols, sizes[:n_sizes], sizes[n_sizes:]
+
+
+class quoteReader:
+    def __init__(self, name, retries = 1000):
+        """
+        Class reading the quotes published by a quotePublisher from another
+        process on the same host
+
+        name   : name of the shared memory block
+        retries: reads of a record to attempt before giving up on it (a
+                 record can only stay busy if its writer died mid-write)
+
+        Reads copy one record straight out of shared memory, without
+        syscalls, locks or deserialisation, and retry only if they raced a
+        write. sequence() is cheaper still, for polling whether a symbol
+        changed since the last read.
+        """
+        self.retries = retries
+        try:
+            self.shm = shared_memory.SharedMemory(name, track = False)
+        except TypeError:
+            # Before Python 3.13, attaching registers the block with this
+            # process' resource tracker, which would remove it on exit. There
+            # is no resource tracker on Windows, where blocks go away with
+            # their last handle instead.
+            self.shm = shared_memory.SharedMemory(name)
+            if os.name == "posix":
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.buf = self.shm.buf
+        self.symbols, self.orderSizes, self.budgets = _readLayout(self.buf)
+        self.layout = quoteLayout(len(self.symbols), len(self.orderSizes),
+                                  len(self.budgets))
+        self.offsets = {symbol: self.layout.record(i)
+                        for i, symbol in enumerate(self.symbols)}
+
+    # sequence : current sequence number of `symbol`'s record (0 if it was
+    #            never published, odd while it is being written)
+    def sequence(self, symbol):
+        return SEQUENCE.unpack_from(self.buf, self.offsets[symbol])[0]
+
+    # read : latest consistent quotes of `symbol` as a sharedQuote, or None
+    #        if nothing was published yet (or the record stayed busy for
+    #        `retries` attempts)
+    def read(self, symbol):
+        buf = self.buf
+        offset = self.offsets[symbol]
+        payload = self.layout.payload
+        for _ in range(self.retries):
+            before = SEQUENCE.unpack_from(buf, offset)[0]
+            if before == 0:
+                return None
+            if before & 1:
+                continue
+            values = payload.unpack_from(buf, offset + SEQUENCE.size)
+            if SEQUENCE.unpack_from(buf, offset)[0] == before:
+                return self._quote(symbol, before, values)
+        return None
+
+    # _quote : sharedQuote from the payload values of a record
+    def _quote(self, symbol, sequence, values):
+        n_sizes = len(self.orderSizes)
+        prices = [_none(value) for value in values[1:]]
+        quotes = [sizeQuote(size, *prices[4 + 2 * i:6 + 2 * i])
+                  for i, size in enumerate(self.orderSizes)]
+        start = 4 + 2 * n_sizes
+        notionalQuotes = [notionalQuote(budget,
+                                        *prices[start + 4 * i:
+                                                start + 4 * i + 4])
+                          for i, budget in enumerate(self.budgets)]
+        return sharedQuote(symbol, sequence, values[0] or None, *prices[:4],
+                           quotes, notionalQuotes)
+
+    # close : detach from the block
+    def close(self):
+        self.buf = None
+        self.shm.close()
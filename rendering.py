@@ -0,0 +1,126 @@
+import asyncio
+import time
+
+from latency import latencyRecorder
+
+
+class quoteRenderer:
+    def __init__(self, orderSizes, budgets = (), interval = 0.1,
+                 latency = None, formatter = None, publisher = None):
+        """
+        Class pricing one or more order books and printing the quotes on a
+        fixed cadence, decoupled from ingestion
+
+        orderSizes: order sizes to quote average execution prices for
+        budgets   : quote-currency budgets to quote base quantities for
+        interval  : seconds between renders (0 renders on every update, from
+                    on_update only)
+        latency   : latencyRecorder for the price/render stages and the
+                    exchange-to-output latency of event_time (the "E" of the
+                    last event applied to a book)
+        formatter : function rendering the size quotes of a book
+                    (formatQuotes by default)
+        publisher : quotePublisher the quotes of every changed book are also
+                    written into on each render, if any (see publishing)
+
+        Only the books' latest state is priced, and only if a version
+        changed since the last render, so updates arriving in between are
+        conflated. With several books, each symbol's quotes are prefixed
+        with its name.
+        """
+        self.orderSizes = orderSizes
+        self.budgets = budgets
+        self.interval = interval
+        self.latency = latencyRecorder() if latency is None else latency
+        self.formatter = formatQuotes if formatter is None else formatter
+        self.publisher = publisher
+        self.books = {}
+        self.event_time = None
+        self.rendered = None
+        self.last_render = 0
+
+    # set_book : render `book` for `symbol` from now on (bookManager on_book
+    #            callback)
+    def set_book(self, symbol, book):
+        self.books[symbol] = book
+
+    # on_update : note the event time of an applied update and render if due
+    #             (bookManager on_update callback)
+    def on_update(self, symbol, book, event):
+        self.event_time = event.event_time
+        self.poll()
+
+    # render : price the current books and print every order size and budget
+    #          on one (overwritten) line, unless nothing changed
+    def render(self):
+        state = [(book, book.version) for book in self.books.values()]
+        if not state or state == self.rendered:
+            return
+        self.rendered = state
+        self.last_render = time.monotonic()
+
+        start = time.perf_counter()
+        quotes = [(symbol, book, book.quote(self.orderSizes),
+                   book.quote_notional(self.budgets))
+                  for symbol, book in self.books.items()]
+        priced = time.perf_counter()
+        if self.publisher is not None:
+            for symbol, book, sizeQuotes, notionalQuotes in quotes:
+                self.publisher.publish_quotes(symbol, book, sizeQuotes,
+                                              notionalQuotes)
+        lines = []
+        for symbol, _, sizeQuotes, notionalQuotes in quotes:
+            line = self.formatter(sizeQuotes)
+            if notionalQuotes:
+                line += " | " + formatNotionalQuotes(notionalQuotes)
+            if len(quotes) > 1:
+                line = f"{symbol}: {line}"
+            lines.append(line)
+        print(" || ".join(lines), end = "\r")
+
+        self.latency.record("price", priced - start)
+        self.latency.record("render", time.perf_counter() - priced)
+        if self.event_time is not None:
+            self.latency.record_since_event("exchange_to_output",
+                                            self.event_time, time.time())
+
+    # poll : render if the cadence is overdue. Called from the ingestion
+    #        loop, so rendering still happens while a burst keeps the loop
+    #        busy and run() cannot get scheduled.
+    def poll(self):
+        if time.monotonic() - self.last_render >= self.interval:
+            self.render()
+
+    # run : render every interval seconds (until cancelled). With an
+    #       interval of 0 every update is rendered by on_update already, so
+    #       there is nothing to schedule and it returns at once.
+    async def run(self):
+        if self.interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.interval)
+            self.render()
+
+
+# formatQuotes : render a list of sizeQuote for the console
+def formatQuotes(quotes):
+    parts = []
+    for q in quotes:
+        bidAvg = ("Insufficient bids" if q.bid is None
+                  else f"Bid Avg = {q.bid}")
+        askAvg = ("Insufficient asks" if q.ask is None
+                  else f"Ask Avg = {q.ask}")
+        parts.append(f"For order size {q.size}, {bidAvg}, {askAvg}")
+    return " | ".join(parts)
+
+
+# formatNotionalQuotes : render a list of notionalQuote for the console
+def formatNotionalQuotes(quotes):
+    parts = []
+    for q in quotes:
+        sell = ("Insufficient bids" if q.bid is None
+                else f"Sells {q.bid_qty} @ {q.bid}")
+        buy = ("Insufficient asks" if q.ask is None
+               else f"Buys {q.ask_qty} @ {q.ask}")
+        parts.append(f"For budget {q.budget}, {sell}, {buy}")
+    return " | ".join(parts)
@@ -0,0 +1,167 @@
+# Replay a capture file (see capture) through the live pipeline.
+#
+# Usage: python replay.py capture_file [venue] [symbols] [speed]
+#
+# venue and symbols are those the capture was recorded with (default:
+# binance BNBBTC). capture_file may also be a columnar file (see columnar),
+# whose events need no decoding; venue and symbols are then ignored.
+# speed 0 (the default) replays as fast as possible; any other speed
+# honours the recorded receive times, scaled (1 is real time).
+# The quotes after every applied update and installed snapshot are printed to
+# stdout, one line each, and the throughput and stage latencies to stderr.
+import sys
+import time
+
+from bookManager import bookManager
+from capture import captureBatches, readCapture
+from columnar import columnarFeed, columnarFile, isColumnar
+from latency import latencyRecorder
+from orderBook import promptQuantities
+from rendering import formatNotionalQuotes, formatQuotes
+from supervisor import makeFeed
+
+
+class replayer:
+    def __init__(self, feed, orderSizes, budgets = (), speed = 0,
+                 out = None, latency = None):
+        """
+        Class driving a bookManager from a capture file instead of the
+        network
+
+        feed      : feed the capture was recorded from (see supervisor.
+                    makeFeed), or a columnarFeed for columnar files; only
+                    its decoding and sequencing are used
+        orderSizes: order sizes to quote average execution prices for
+        budgets   : quote-currency budgets to quote base quantities for
+        speed     : 0 to replay as fast as possible, otherwise the factor
+                    the recorded receive times are scaled by (1 = real time)
+        out       : file the quotes are written to after every applied
+                    update and installed snapshot (None to price without
+                    writing)
+        latency   : latencyRecorder for the pipeline stages
+
+        Messages are replayed in the batches they were received in, and
+        every recorded snapshot is installed at the point of the stream it
+        arrived at, so the books go through the same states as when they
+        were captured. Nothing depends on the local clock, so the output of
+        two replays of the same capture is identical - e.g. to diff an
+        optimized book against the current one. messages, updates and
+        elapsed describe the last run().
+        """
+        self.feed = feed
+        self.orderSizes = orderSizes
+        self.budgets = budgets
+        self.speed = speed
+        self.out = out
+        self.latency = latencyRecorder() if latency is None else latency
+        self.manager = bookManager(feed, latency = self.latency,
+                                   on_book = self.on_book,
+                                   on_update = self.on_update)
+        self.messages = 0
+        self.updates = 0
+        self.elapsed = 0
+
+    # on_book : price a book rebuilt from a snapshot (and the events buffered
+    #           while it was in flight) and write its quotes
+    def on_book(self, symbol, book):
+        last_id = self.manager.sequencers[symbol].last_update_id
+        self.write(symbol, book, f"{last_id} snapshot")
+
+    # on_update : price an updated book and write its quotes
+    def on_update(self, symbol, book, event):
+        self.updates += 1
+        self.write(symbol, book, f"{event.last_id} {event.event_time}")
+
+    # write : price `book` and write its quotes, after `label` (the last
+    #         update id and the event time, or "snapshot")
+    def write(self, symbol, book, label):
+        start = time.perf_counter()
+        quotes = book.quote(self.orderSizes)
+        notionalQuotes = book.quote_notional(self.budgets)
+        self.latency.record("price", time.perf_counter() - start)
+        if self.out is None:
+            return
+        line = formatQuotes(quotes)
+        if notionalQuotes:
+            line += " | " + formatNotionalQuotes(notionalQuotes)
+        self.out.write(f"{symbol} {label} {line}\n")
+
+    # run : replay every record of the capture (or columnar file) at `path`
+    def run(self, path):
+        if not isColumnar(path):
+            self.replay(captureBatches(readCapture(path)))
+            return
+        data = columnarFile(path)
+        try:
+            self.replay(data.batches())
+        finally:
+            data.close()
+
+    # replay : replay batches of raw messages and snapshots (see
+    #          capture.captureBatches)
+    def replay(self, batches):
+        manager = self.manager
+        adapters = self.feed.adapters
+        self.messages = 0
+        self.updates = 0
+        start = time.perf_counter()
+        first = None
+        for kind, received, payload in batches:
+            # Wait for the recorded receive time, scaled
+            if self.speed:
+                if first is None:
+                    first = received
+                delay = ((received - first) / self.speed
+                         - (time.perf_counter() - start))
+                if delay > 0:
+                    time.sleep(delay)
+
+            if kind == "messages":
+                self.messages += len(payload)
+                manager.process(payload, received)
+            else:
+                symbol, raw = payload
+                if symbol in adapters:
+                    manager.install(symbol,
+                                    adapters[symbol].decode_snapshot(raw))
+        self.elapsed = time.perf_counter() - start
+
+
+def main(argv):
+    if len(argv) < 2:
+        print("Usage: python replay.py capture_file [venue] [symbols] "
+              "[speed]")
+        return
+    path = argv[1]
+    venue = argv[2] if len(argv) > 2 else "binance"
+    symbols = (argv[3].upper().split(',') if len(argv) > 3 else ["BNBBTC"])
+    speed = float(argv[4]) if len(argv) > 4 else 0
+
+    if isColumnar(path):
+        data = columnarFile(path)
+        feed = columnarFeed(data.configs)
+        data.close()
+    else:
+        feed = makeFeed(venue, symbols)
+    try:
+        # Obtain input order sizes and optional budgets, as in orderBook.py
+        quantities = promptQuantities([adapter.config for adapter in
+                                       feed.adapters.values()])
+        if quantities is None:
+            return
+        orderSizes, budgets = quantities
+        replay = replayer(feed, orderSizes, budgets, speed, out = sys.stdout)
+        replay.run(path)
+    finally:
+        # The feed's snapshot client (if any) is never used by a replay,
+        # but holds a thread pool and an HTTP session until closed
+        client = getattr(feed, 'client', None)
+        if client is not None:
+            client.close()
+    rate = replay.messages / replay.elapsed if replay.elapsed else 0
+    print(f"{replay.messages} messages, {replay.updates} updates in "
+          f"{replay.elapsed:.3f} s ({rate:,.0f} msgs/s)", file = sys.stderr)
+    replay.latency.dump()
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,115 @@
+import time
+from collections import deque
+
+
+class depthSequencer:
+    def __init__(self, max_buffer = 10000, history = 1000):
+        """
+        Class enforcing the Binance rules for keeping a local order book in
+        sync with a diff depth stream (of normalized depthUpdate events,
+        whose first_id/last_id are Binance's U/u)
+
+        max_buffer: maximum number of events buffered while out of sync
+        history   : number of resync durations kept for statistics
+
+        While out of sync (at start-up, or after a gap) events are buffered
+        until a snapshot arrives. on_snapshot() then drops the buffered events
+        already covered by the snapshot (u <= lastUpdateId), checks that the
+        first remaining event straddles it (U <= lastUpdateId + 1 <= u) and
+        that every following event continues the previous one (U == previous
+        u + 1). Once in sync, push() applies the same continuity check to
+        every live event and reports a gap as soon as one is missing.
+
+        Counters:
+        gaps            : sequence gaps detected on the live stream
+        stale_snapshots : snapshots rejected because the buffered events
+                          start after them (or have a gap of their own)
+        resyncs         : completed (re)synchronisations
+        resync_durations: seconds from losing sync to being back in sync,
+                          for the last `history` resyncs
+        The counters are reported per symbol with the stage latencies (see
+        latencyRecorder.sequencers).
+        """
+        self.last_update_id = None
+        self.buffer = deque(maxlen = max_buffer)
+        self.gaps = 0
+        self.stale_snapshots = 0
+        self.resyncs = 0
+        self.resync_durations = deque(maxlen = history)
+        self._desynced_at = time.monotonic()
+
+    # synced : whether live events can be applied straight to the book
+    @property
+    def synced(self):
+        return self.last_update_id is not None
+
+    # push : classify a decoded depth event. Returns
+    #          'apply'  - the event continues the book; apply it now
+    #          'drop'   - the event is already reflected in the book
+    #          'buffer' - out of sync; the event was buffered for the next
+    #                     snapshot
+    #          'gap'    - events are missing; the event was buffered and a
+    #                     new snapshot is needed
+    def push(self, event):
+        if self.last_update_id is None:
+            self.buffer.append(event)
+            return 'buffer'
+        if event.last_id <= self.last_update_id:
+            return 'drop'
+        if event.first_id > self.last_update_id + 1:
+            self.gaps += 1
+            self.last_update_id = None
+            self._desynced_at = time.monotonic()
+            self.buffer.append(event)
+            return 'gap'
+        self.last_update_id = event.last_id
+        return 'apply'
+
+    # covers : whether one of the buffered events straddles a snapshot with
+    #          the given lastUpdateId (U <= lastUpdateId + 1 <= u), i.e. the
+    #          stream continues it. Used to validate a warm start from a
+    #          checkpoint, which may be arbitrarily old or from another run.
+    def covers(self, last_update_id):
+        return any(event.first_id <= last_update_id + 1 <= event.last_id
+                   for event in self.buffer)
+
+    # on_snapshot : synchronise on a snapshot with the given lastUpdateId.
+    #               Returns the buffered events to apply on top of the
+    #               snapshot, in order, or None if the snapshot cannot be used
+    #               and a newer one must be fetched.
+    def on_snapshot(self, last_update_id):
+        events = []
+        last = last_update_id
+        while self.buffer:
+            event = self.buffer[0]
+            if event.last_id <= last:
+                self.buffer.popleft()
+                continue
+            if event.first_id > last + 1:
+                # Keep this event and everything after it for the next
+                # snapshot
+                self.stale_snapshots += 1
+                return None
+            events.append(self.buffer.popleft())
+            last = event.last_id
+        self.last_update_id = last
+        self.resyncs += 1
+        self.resync_durations.append(time.monotonic() - self._desynced_at)
+        return events
+
+    # stats : the counters, with the median and longest of the recorded
+    #         resync durations in seconds (0 if there are none)
+    def stats(self):
+        durations = sorted(self.resync_durations)
+        return {"gaps": self.gaps, "stale_snapshots": self.stale_snapshots,
+                "resyncs": self.resyncs,
+                "resync_p50": durations[len(durations) // 2]
+                              if durations else 0,
+                "resync_max": durations[-1] if durations else 0}
+
+    # reset_counters : zero the counters and forget the resync durations
+    def reset_counters(self):
+        self.gaps = 0
+        self.stale_snapshots = 0
+        self.resyncs = 0
+        self.resync_durations.clear()
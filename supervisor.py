@@ -0,0 +1,226 @@
+import asyncio
+import multiprocessing
+import multiprocessing.connection
+import sys
+import time
+
+import exchanges
+from bookManager import bookManager
+from profiling import samplingProfiler
+from publishing import quotePublisher
+from rendering import formatNotionalQuotes, formatQuotes
+
+
+# partitionSymbols : split symbols into `shards` groups, dealing them out in
+#                    turn so that symbols listed first (e.g. the busiest)
+#                    end up in different shards
+def partitionSymbols(symbols, shards):
+    shards = max(1, min(shards, len(symbols)))
+    return [symbols[i::shards] for i in range(shards)]
+
+
+# makeFeed : feed carrying `symbols` on `venue` - a single adapter for one
+#            symbol, or the venue's multi-symbol feed
+def makeFeed(venue, symbols):
+    if len(symbols) == 1:
+        return exchanges.ADAPTERS[venue](symbols[0])
+    return exchanges.MULTI_SYMBOL_FEEDS[venue](symbols)
+
+
+# runWorker : entry point of a worker process. Keeps the books of `symbols`
+#             up to date and sends (symbol, sizeQuotes, notionalQuotes) for
+#             every book that changed, at most every `interval` seconds, over
+#             `conn`. If shm_name is given, its symbols are also published
+#             into the supervisor's shared memory block: the top of book
+#             after every update, the quotes whenever they are sent.
+#             Its stage latencies and sequencing counters are dumped to
+#             stderr on SIGUSR1 and every stats_interval seconds if given.
+#             Sending the worker SIGUSR2, or creating the file
+#             profile_trigger if given, profiles it into profile_dir (see
+#             samplingProfiler).
+def runWorker(venue, symbols, orderSizes, budgets, interval, conn,
+              shm_name = None, stats_interval = None, profile_dir = ".",
+              profile_trigger = None):
+    try:
+        asyncio.run(_worker(venue, symbols, orderSizes, budgets, interval,
+                            conn, shm_name, stats_interval, profile_dir,
+                            profile_trigger))
+    except KeyboardInterrupt:
+        pass
+
+
+# _worker : event loop of runWorker
+async def _worker(venue, symbols, orderSizes, budgets, interval, conn,
+                  shm_name, stats_interval, profile_dir, profile_trigger):
+    publisher = None
+    manager = bookManager(makeFeed(venue, symbols))
+    if shm_name:
+        publisher = quotePublisher(shm_name, manager.books, orderSizes,
+                                   budgets, create = False)
+        manager.on_book = publisher.set_book
+        manager.on_update = publisher.on_update
+    publishing = asyncio.ensure_future(
+        _publish(manager, orderSizes, budgets, interval, conn, publisher))
+    manager.latency.install_signal_handler()
+    reporting = None
+    if stats_interval:
+        reporting = asyncio.ensure_future(
+            manager.latency.dump_periodically(stats_interval))
+    profiler = samplingProfiler(directory = profile_dir)
+    profiler.install_signal_handler()
+    watching = None
+    if profile_trigger:
+        watching = asyncio.ensure_future(
+            profiler.watch_trigger(profile_trigger))
+    try:
+        await manager.run()
+    finally:
+        for task in (publishing, reporting, watching):
+            if task is not None:
+                task.cancel()
+        profiler.stop()
+        if publisher is not None:
+            publisher.close()
+
+
+# _publish : price every changed book every `interval` seconds and send the
+#            quotes to the supervisor (and write them into `publisher`, if
+#            any)
+async def _publish(manager, orderSizes, budgets, interval, conn,
+                   publisher = None):
+    published = {}
+    while True:
+        await asyncio.sleep(interval)
+        for symbol, book in manager.books.items():
+            if book is None or published.get(symbol) == (book, book.version):
+                continue
+            published[symbol] = (book, book.version)
+            quotes = book.quote(orderSizes)
+            notionalQuotes = book.quote_notional(budgets)
+            if publisher is not None:
+                publisher.publish_quotes(symbol, book, quotes,
+                                         notionalQuotes)
+            conn.send((symbol, quotes, notionalQuotes))
+
+
+class supervisor:
+    def __init__(self, venue, symbols, workers, orderSizes, budgets = (),
+                 interval = 0.1, restart_delay = 1, shm_name = None,
+                 stats_interval = None, profile_dir = ".",
+                 profile_trigger = None):
+        """
+        Class running the symbols of a venue in several worker processes, to
+        use more than one core
+
+        venue          : venue name (see exchanges.ADAPTERS)
+        symbols        : symbols to track
+        workers        : number of worker processes (symbols are split
+                         between them with partitionSymbols)
+        orderSizes     : order sizes to quote average execution prices for
+        budgets        : quote-currency budgets to quote base quantities for
+        interval       : seconds between quote updates
+        restart_delay  : seconds to wait before restarting a crashed worker
+        shm_name       : name of a shared memory block to create for the
+                         quotes of every symbol (see quotePublisher),
+                         written directly by the workers
+        stats_interval : seconds between the workers' latency reports on
+                         stderr (see runWorker), or None
+        profile_dir    : directory the workers write their profiles to
+        profile_trigger: file whose creation profiles a worker, as
+                         <profile_trigger>-<i> for worker i (see runWorker)
+
+        Every worker owns its connection, books and pricing (see runWorker)
+        and sends the quotes of changed books back over a one-way pipe, so
+        the supervisor only receives small pickled records and renders them.
+        A worker that dies is restarted with the same symbols; its books are
+        rebuilt from fresh snapshots. restarts counts the restarts.
+        """
+        self.venue = venue
+        self.shards = partitionSymbols(list(symbols), workers)
+        self.orderSizes = orderSizes
+        self.budgets = budgets
+        self.interval = interval
+        self.restart_delay = restart_delay
+        self.shm_name = shm_name
+        self.stats_interval = stats_interval
+        self.profile_dir = profile_dir
+        self.profile_trigger = profile_trigger
+        self.quotes = {symbol: None for symbol in symbols}
+        self.processes = [None] * len(self.shards)
+        self.conns = [None] * len(self.shards)
+        self.restarts = 0
+        self.changed = False
+
+    # start_worker : start the worker process for shard `i`
+    def start_worker(self, i):
+        receiver, sender = multiprocessing.Pipe(duplex = False)
+        trigger = (f"{self.profile_trigger}-{i}" if self.profile_trigger
+                   else None)
+        process = multiprocessing.Process(
+            target = runWorker, name = f"bookWorker-{i}", daemon = True,
+            args = (self.venue, self.shards[i], self.orderSizes,
+                    self.budgets, self.interval, sender, self.shm_name,
+                    self.stats_interval, self.profile_dir, trigger))
+        process.start()
+        sender.close()
+        self.processes[i] = process
+        self.conns[i] = receiver
+
+    # _worker_died : forget shard `i`'s quotes and restart its worker
+    def _worker_died(self, i):
+        self.processes[i].join()
+        self.conns[i].close()
+        for symbol in self.shards[i]:
+            self.quotes[symbol] = None
+        print(f"\nWorker for {', '.join(self.shards[i])} exited with code "
+              f"{self.processes[i].exitcode}, restarting", file = sys.stderr)
+        time.sleep(self.restart_delay)
+        self.restarts += 1
+        self.start_worker(i)
+
+    # run : start every worker and render their quotes, restarting workers
+    #       that die (until interrupted)
+    def run(self):
+        publisher = None
+        if self.shm_name:
+            publisher = quotePublisher(self.shm_name, self.quotes,
+                                       self.orderSizes, self.budgets)
+        for i in range(len(self.shards)):
+            self.start_worker(i)
+        try:
+            while True:
+                ready = multiprocessing.connection.wait(self.conns,
+                                                        self.interval)
+                for conn in ready:
+                    i = self.conns.index(conn)
+                    try:
+                        symbol, quotes, notionalQuotes = conn.recv()
+                    except EOFError:
+                        self._worker_died(i)
+                        continue
+                    self.quotes[symbol] = (quotes, notionalQuotes)
+                    self.changed = True
+                self.render()
+        finally:
+            for process in self.processes:
+                if process is not None and process.is_alive():
+                    process.terminate()
+            if publisher is not None:
+                publisher.close()
+
+    # render : print the latest quotes of every symbol on one (overwritten)
+    #          line, if any changed
+    def render(self):
+        if not self.changed:
+            return
+        self.changed = False
+        lines = []
+        for symbol, quotes in self.quotes.items():
+            if quotes is None:
+                lines.append(f"{symbol}: syncing")
+                continue
+            line = formatQuotes(quotes[0])
+            if quotes[1]:
+                line += " | " + formatNotionalQuotes(quotes[1])
+            lines.append(f"{symbol}: {line}")
+        print(" || ".join(lines), end = "\r")
@@ -0,0 +1,109 @@
+# decimalUnits : split a decimal string into its number of decimal places and
+#                its value in units of that precision, ignoring trailing
+#                zeros (e.g. "0.050" -> (2, 5))
+def decimalUnits(size):
+    whole, _, frac = size.partition('.')
+    frac = frac.rstrip('0')
+    return len(frac), int(whole + frac)
+
+
+# decimalString : inverse of decimalUnits (e.g. (2, 5) -> "0.05")
+def decimalString(decimals, units):
+    if not decimals:
+        return str(units)
+    digits = str(units).rjust(decimals + 1, '0')
+    return digits[:-decimals] + '.' + digits[-decimals:]
+
+
+class symbolConfig:
+    def __init__(self, name, tick_size, step_size):
+        """
+        Class holding the fixed-point representation of a single symbol
+
+        name     : asset name (e.g. BNBBTC)
+        tick_size: minimum price increment, as a decimal string
+        step_size: minimum quantity increment, as a decimal string
+
+        Prices are stored as integer ticks (multiples of tick_size) and
+        quantities as integer lots (multiples of step_size), so the book is
+        exact and every comparison is an integer comparison. The sizes are
+        given as strings so that they are never rounded through a float.
+        """
+        self.name = name
+        self.tick_size = float(tick_size)
+        self.step_size = float(step_size)
+        self.px_decimals, self.px_units = decimalUnits(tick_size)
+        self.qty_decimals, self.qty_units = decimalUnits(step_size)
+        self._px_pad = '0' * self.px_decimals
+        self._qty_pad = '0' * self.qty_decimals
+        self._px_scale = 10 ** self.px_decimals
+        self._qty_scale = 10 ** self.qty_decimals
+
+    # parse_px : convert a price string (e.g. "0.00812300") into ticks
+    def parse_px(self, px):
+        whole, _, frac = px.partition('.')
+        units = int(whole + (frac + self._px_pad)[:self.px_decimals])
+        return units // self.px_units
+
+    # parse_qty : convert a quantity string (e.g. "12.34000000") into lots
+    def parse_qty(self, qty):
+        whole, _, frac = qty.partition('.')
+        units = int(whole + (frac + self._qty_pad)[:self.qty_decimals])
+        return units // self.qty_units
+
+    # to_ticks : convert a user-supplied price (float or string) into ticks
+    def to_ticks(self, px):
+        return round(float(px) / self.tick_size)
+
+    # to_lots : convert a user-supplied quantity (float or string) into lots
+    def to_lots(self, qty):
+        return round(float(qty) / self.step_size)
+
+    # is_lots : whether a user-supplied quantity is a whole number of lots,
+    #           i.e. converts through to_lots without rounding (up to float
+    #           representation error, e.g. 0.3 / 0.1)
+    def is_lots(self, qty):
+        lots = float(qty) / self.step_size
+        return abs(lots - round(lots)) <= 1e-9 * max(1, abs(lots))
+
+    # price : convert ticks (or a fractional number of ticks, e.g. an
+    #         average) back into a price
+    def price(self, ticks):
+        return ticks * self.px_units / self._px_scale
+
+    # to_notional : convert a user-supplied quote-currency amount into
+    #               ticks * lots
+    def to_notional(self, amount):
+        return round(float(amount) / (self.tick_size * self.step_size))
+
+    # quantity : convert lots back into a quantity
+    def quantity(self, lots):
+        return lots * self.qty_units / self._qty_scale
+
+    # format_px : convert ticks back into an exact price string (the inverse
+    #             of parse_px, e.g. 8123 -> "0.008123")
+    def format_px(self, ticks):
+        return decimalString(self.px_decimals, ticks * self.px_units)
+
+    # format_qty : convert lots back into an exact quantity string (the
+    #              inverse of parse_qty)
+    def format_qty(self, lots):
+        return decimalString(self.qty_decimals, lots * self.qty_units)
+
+    # sizes : tick and step sizes as decimal strings (e.g. ("0.000001",
+    #         "0.001")), to recreate the configuration elsewhere
+    def sizes(self):
+        return (decimalString(self.px_decimals, self.px_units),
+                decimalString(self.qty_decimals, self.qty_units))
+
+
+# Per-symbol fixed-point configuration (Binance PRICE_FILTER tickSize and
+# LOT_SIZE stepSize). Sizes may be finer than the exchange's, never coarser,
+# or prices/quantities would be truncated.
+SYMBOL_CONFIGS = {
+    "BNBBTC": symbolConfig("BNBBTC", "0.000001", "0.001"),
+    "ETHBTC": symbolConfig("ETHBTC", "0.000001", "0.0001"),
+    "BTCUSDT": symbolConfig("BTCUSDT", "0.01", "0.00001"),
+    "ETHUSDT": symbolConfig("ETHUSDT", "0.01", "0.0001"),
+    "BNBUSDT": symbolConfig("BNBUSDT", "0.01", "0.001"),
+}
@@ -0,0 +1,219 @@
+import random
+
+from book import MAX_INDEX_SLOTS, orderBook, priceLadder
+
+
+# _bestFirst : (price, quantity) pairs of a reference {price: quantity} side,
+#              from the best level outwards
+def _bestFirst(side, levels):
+    return sorted(levels.items(), reverse = side == 'buy')
+
+
+# _fill : brute-force priceLadder.fill over a reference side
+def _fill(side, levels, lots):
+    total = 0
+    remaining = lots
+    for px, qty in _bestFirst(side, levels):
+        take = min(qty, remaining)
+        total += take * px
+        remaining -= take
+        if not remaining:
+            return total
+    return None
+
+
+# _fillNotional : brute-force priceLadder.fill_notional over a reference side
+def _fillNotional(side, levels, budget):
+    lots = 0
+    spent = 0
+    for px, qty in _bestFirst(side, levels):
+        if spent + px * qty >= budget:
+            take = (budget - spent) // px
+            return lots + take, spent + take * px
+        lots += qty
+        spent += px * qty
+    return None
+
+
+# _randomUpdates : a batch of random level changes around `mid`, a third of
+#                  them deletions
+def _randomUpdates(rng, mid, spread = 200):
+    return [(mid + rng.randint(-spread, spread),
+             0 if rng.random() < 0.3 else rng.randint(1, 1000))
+            for _ in range(rng.randint(1, 20))]
+
+
+# _check : compare a ladder with its reference side
+def _check(ladder, levels, sizes, budgets):
+    side = ladder.side
+    assert list(ladder.walk()) == _bestFirst(side, levels)
+    assert ladder.total_qty == sum(levels.values())
+    assert ladder.total_notional == sum(px * qty
+                                        for px, qty in levels.items())
+    for lots in sizes:
+        assert ladder.fill(lots) == _fill(side, levels, lots)
+    for budget in budgets:
+        assert (ladder.fill_notional(budget) ==
+                _fillNotional(side, levels, budget))
+
+
+def test_apply_matches_reference():
+    rng = random.Random(1)
+    for side in ('buy', 'sell'):
+        ladder = priceLadder(side)
+        levels = {}
+        mid = 10000
+        for _ in range(2000):
+            mid += rng.randint(-3, 3)
+            updates = _randomUpdates(rng, mid)
+            ladder.apply(updates)
+            for px, qty in updates:
+                if qty:
+                    levels[px] = qty
+                else:
+                    levels.pop(px, None)
+            # The same sizes every time, so most fills come from the cache
+            _check(ladder, levels, [1, 50, 1000, 20000],
+                   [1, 10 ** 6, 10 ** 8])
+
+
+def test_set_and_remove_level_match_reference():
+    rng = random.Random(2)
+    ladder = priceLadder('sell')
+    levels = {}
+    for _ in range(3000):
+        px = rng.randint(5000, 5500)
+        if rng.random() < 0.3:
+            ladder.remove_level(px)
+            levels.pop(px, None)
+        else:
+            qty = rng.randint(1, 100)
+            ladder.set_level(px, qty)
+            levels[px] = qty
+        _check(ladder, levels, [1, 25, 500], [10 ** 5])
+
+
+def test_fill_cache_survives_deeper_updates_only():
+    ladder = priceLadder('buy')
+    ladder.apply([(100, 5), (99, 5), (98, 5), (90, 5)])
+    assert ladder.fill(7) == 5 * 100 + 2 * 99
+
+    # Beyond the consumed depth: the cached result is kept
+    ladder.apply([(90, 50)])
+    assert 7 in ladder.fills
+    assert ladder.fill(7) == 5 * 100 + 2 * 99
+
+    # Inside it: the cache is dropped and the result follows the book
+    ladder.apply([(99, 1)])
+    assert 7 not in ladder.fills
+    assert ladder.fill(7) == 5 * 100 + 1 * 99 + 1 * 98
+
+    # A better level
+    ladder.apply([(101, 10)])
+    assert ladder.fill(7) == 7 * 101
+
+
+def test_load_matches_apply():
+    rng = random.Random(3)
+    for side in ('buy', 'sell'):
+        levels = {px: rng.randint(1, 100)
+                  for px in rng.sample(range(1000, 3000), 500)}
+        loaded = priceLadder(side)
+        loaded.load(_bestFirst(side, levels))
+        _check(loaded, levels, [1, 100, 10000], [10 ** 6])
+
+        # Updates keep working on a loaded ladder
+        updates = _randomUpdates(rng, 2000, 1500)
+        loaded.apply(updates)
+        for px, qty in updates:
+            if qty:
+                levels[px] = qty
+            else:
+                levels.pop(px, None)
+        _check(loaded, levels, [1, 100, 10000], [10 ** 6])
+
+
+def test_index_follows_drifting_market():
+    # A book of constant depth drifting away from its first prices keeps an
+    # index sized for its depth
+    for side, step in (('buy', -1), ('sell', 1)):
+        ladder = priceLadder(side)
+        best = 500000
+        levels = {best + step * i: 10 for i in range(1000)}
+        ladder.apply(list(levels.items()))
+        for _ in range(20000):
+            # Each step adds a level beyond the worst and removes the best
+            worst = max(levels) if side == 'sell' else min(levels)
+            updates = [(worst + step, 10), (best, 0)]
+            best += step
+            ladder.apply(updates)
+            levels[worst + step] = 10
+            del levels[updates[1][0]]
+        assert ladder.index.size <= 4096
+        _check(ladder, levels, [1, 5000, 10000], [10 ** 6])
+
+
+def test_far_level_stays_out_of_index():
+    # One stray order far from the market must not size the index (one slot
+    # per tick) to reach it; it is priced by walking past the window
+    for side in ('buy', 'sell'):
+        sign = 1 if side == 'buy' else -1
+        ladder = priceLadder(side)
+        levels = {6000000 - sign * 50 * i: 100 for i in range(1000)}
+        ladder.apply(list(levels.items()))
+        far = 6000000 - sign * 6000000 // 2
+        ladder.apply([(far, 300)])
+        levels[far] = 300
+        assert ladder.index.size <= MAX_INDEX_SLOTS
+        total = sum(levels.values())
+        _check(ladder, levels, [1, 50000, total - 300, total - 1, total],
+               [10 ** 6, ladder.total_notional - 1, ladder.total_notional])
+
+        # Updates keep the levels beyond the window in sync
+        ladder.apply([(far, 0), (far - sign, 7)])
+        del levels[far]
+        levels[far - sign] = 7
+        _check(ladder, levels, [total - 300, total - 293], [10 ** 9])
+
+
+def test_random_far_levels_match_reference():
+    rng = random.Random(4)
+    for side in ('buy', 'sell'):
+        ladder = priceLadder(side)
+        levels = {}
+        mid = 10 ** 6
+        for _ in range(500):
+            updates = _randomUpdates(rng, mid)
+            if rng.random() < 0.1:
+                updates.append((mid + rng.randint(-4, 4) * MAX_INDEX_SLOTS,
+                                rng.randint(0, 10)))
+            ladder.apply(updates)
+            for px, qty in updates:
+                if qty:
+                    levels[px] = qty
+                else:
+                    levels.pop(px, None)
+            total = sum(levels.values())
+            _check(ladder, levels, [1, 1000, max(total - 5, 1), total],
+                   [10 ** 6, 10 ** 9, ladder.total_notional])
+
+
+def test_quote_below_one_lot():
+    book = orderBook("BNBBTC")
+    book.apply_diff([["0.008100", "5.000"]], [["0.008200", "5.000"]])
+    small, whole = book.quote([0.0001, 1])
+    assert small.bid is None and small.ask is None
+    assert whole.bid == 0.0081 and whole.ask == 0.0082
+
+
+def test_fill_notional_rejects_non_positive_budgets():
+    for side in ('buy', 'sell'):
+        ladder = priceLadder(side)
+        assert ladder.fill_notional(0) is None
+        ladder.apply([(100, 5), (101, 5)])
+        for budget in (0, -1, -10 ** 6):
+            assert ladder.fill_notional(budget) is None
+    book = orderBook("BNBBTC")
+    book.apply_diff([["0.008100", "5.000"]], [])
+    quote, = book.quote_notional([-1])
+    assert quote.bid_qty is None and quote.ask_qty is None
@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+from bookManager import bookManager
+from exchanges.simulated import simulatedAdapter
+
+
+# _manager : bookManager of a simulated BNBBTC venue, with its adapter
+def _manager():
+    adapter = simulatedAdapter(seed = 1)
+    return bookManager(adapter), adapter
+
+
+# _levels : (ticks, lots) of one side of the simulated venue's book, best
+#           first
+def _levels(adapter, side):
+    generator = adapter.generator
+    levels = generator.bids if side == 'buy' else generator.asks
+    return sorted(levels.items(), reverse = side == 'buy')
+
+
+def test_snapshot_before_first_event_is_held():
+    manager, adapter = _manager()
+    asyncio.run(manager._resync("BNBBTC"))
+    assert manager.books["BNBBTC"] is None
+    assert "BNBBTC" in manager.held
+
+    # The first event continues the snapshot: it is installed, without a gap
+    assert manager.process(adapter.generator.events(5), time.time()) == []
+    book = manager.books["BNBBTC"]
+    assert list(book.bids.walk()) == _levels(adapter, 'buy')
+    assert list(book.asks.walk()) == _levels(adapter, 'sell')
+    assert not manager.held
+    stats = manager.sequencers["BNBBTC"].stats()
+    assert stats["gaps"] == 0 and stats["resyncs"] == 1
+
+
+def test_held_snapshot_waits_for_newer_events():
+    manager, adapter = _manager()
+    older = adapter.generator.events(3)
+    asyncio.run(manager._resync("BNBBTC"))
+
+    # Events already in the snapshot do not tell whether the stream
+    # continues it
+    assert manager.process(older, time.time()) == []
+    assert "BNBBTC" in manager.held
+    assert manager.process(adapter.generator.events(1), time.time()) == []
+    assert list(manager.books["BNBBTC"].asks.walk()) == \
+        _levels(adapter, 'sell')
+
+
+def test_held_snapshot_behind_the_stream_resyncs():
+    manager, adapter = _manager()
+    asyncio.run(manager._resync("BNBBTC"))
+
+    # The first events received start after the snapshot
+    adapter.generator.events(3)
+    assert manager.process(adapter.generator.events(2), time.time()) == \
+        ["BNBBTC"]
+    assert manager.books["BNBBTC"] is None
+    assert not manager.held
+    assert manager.sequencers["BNBBTC"].buffer
@@ -0,0 +1,139 @@
+import time
+
+import book
+from bookManager import bookManager
+from checkpoint import (bookCheckpoint, checkpointPath, checkpointWriter,
+                        readCheckpoint, restoreBook, warmStarts,
+                        writeCheckpoint)
+from exchanges.simulated import simulatedAdapter
+from symbols import SYMBOL_CONFIGS, symbolConfig
+
+
+# _syncedManager : bookManager of a simulated BNBBTC venue, in sync and a
+#                  few hundred updates past its snapshot, with its adapter
+def _syncedManager():
+    adapter = simulatedAdapter(seed = 2)
+    manager = bookManager(adapter)
+    manager.install("BNBBTC", adapter.generator.snapshot())
+    manager.process(adapter.generator.events(300), time.time())
+    return manager, adapter
+
+
+# _venueCheckpoint : bookCheckpoint of the simulated venue's book as of its
+#                    last generated update, with the given configuration
+def _venueCheckpoint(adapter, config = None):
+    depth = adapter.generator.snapshot()
+    return bookCheckpoint("BNBBTC", config or adapter.config,
+                          depth.last_update_id, 1, time.time(), depth.bids,
+                          depth.asks)
+
+
+# _walk : both sides of a book, best levels first
+def _walk(orderBook):
+    return list(orderBook.bids.walk()), list(orderBook.asks.walk())
+
+
+def test_write_read_round_trip(tmp_path):
+    adapter = simulatedAdapter(seed = 2)
+    adapter.generator.events(100)
+    checkpoint = _venueCheckpoint(adapter)
+    path = checkpointPath(str(tmp_path), "BNBBTC")
+    writeCheckpoint(path, checkpoint)
+    read = readCheckpoint(path)
+    assert read._replace(config = None) == checkpoint._replace(config = None)
+    assert read.config.sizes() == checkpoint.config.sizes()
+    assert not (tmp_path / "BNBBTC.ckpt.tmp").exists()
+
+
+def test_writer_saves_synced_books(tmp_path):
+    manager, _ = _syncedManager()
+    writer = checkpointWriter(str(tmp_path))
+    writer.save(manager)
+    # Unchanged books are not saved again
+    writer.save(manager)
+    writer.close()
+    assert writer.saved == 1
+
+    saved = readCheckpoint(checkpointPath(str(tmp_path), "BNBBTC"))
+    orderBook = manager.books["BNBBTC"]
+    assert saved.symbol == "BNBBTC"
+    assert saved.last_update_id == \
+        manager.sequencers["BNBBTC"].last_update_id
+    assert saved.version == orderBook.version
+    assert (saved.bids, saved.asks) == _walk(orderBook)
+
+
+def test_restore_book_equals_saved_book(tmp_path):
+    manager, _ = _syncedManager()
+    writer = checkpointWriter(str(tmp_path))
+    writer.save(manager)
+    writer.close()
+    saved = manager.books["BNBBTC"]
+    restored = restoreBook(readCheckpoint(checkpointPath(str(tmp_path),
+                                                         "BNBBTC")))
+    assert _walk(restored) == _walk(saved)
+    for side in ('bids', 'asks'):
+        ladder = getattr(restored, side)
+        assert ladder.total_qty == getattr(saved, side).total_qty
+        assert ladder.total_notional == getattr(saved, side).total_notional
+    assert restored.quote([0.001, 1, 1000]) == saved.quote([0.001, 1, 1000])
+    assert (restored.quote_notional([0.01, 10]) ==
+            saved.quote_notional([0.01, 10]))
+
+
+def test_warm_start_when_covered(tmp_path, monkeypatch):
+    adapter = simulatedAdapter(seed = 3)
+    writeCheckpoint(checkpointPath(str(tmp_path), "BNBBTC"),
+                    _venueCheckpoint(adapter))
+    loaded = []
+    load_levels = book.orderBook.load_levels
+
+    def recordLoad(self, bids, asks):
+        loaded.append(self)
+        load_levels(self, bids, asks)
+    monkeypatch.setattr(book.orderBook, "load_levels", recordLoad)
+
+    checkpoints = warmStarts(str(tmp_path), adapter)
+    assert list(checkpoints) == ["BNBBTC"]
+    manager = bookManager(adapter, checkpoints = checkpoints)
+    assert manager.process(adapter.generator.events(5), time.time()) == []
+
+    # Installed from the checkpoint, in linear time, and caught up
+    orderBook = manager.books["BNBBTC"]
+    assert loaded == [orderBook]
+    depth = adapter.generator.snapshot()
+    assert _walk(orderBook) == (depth.bids, depth.asks)
+    assert manager.sequencers["BNBBTC"].last_update_id == \
+        depth.last_update_id
+
+
+def test_warm_start_not_covered_resyncs(tmp_path):
+    adapter = simulatedAdapter(seed = 3)
+    writeCheckpoint(checkpointPath(str(tmp_path), "BNBBTC"),
+                    _venueCheckpoint(adapter))
+    manager = bookManager(adapter,
+                          checkpoints = warmStarts(str(tmp_path), adapter))
+
+    # The stream moved on since the checkpoint was saved
+    adapter.generator.events(10)
+    assert manager.process(adapter.generator.events(5), time.time()) == \
+        ["BNBBTC"]
+    assert manager.books["BNBBTC"] is None
+    assert not manager.held
+
+
+def test_warm_start_skips_other_sizes(tmp_path):
+    adapter = simulatedAdapter(seed = 3)
+    assert warmStarts(str(tmp_path), adapter) == {}
+
+    # Saved with another tick size: the levels would be misread
+    config = symbolConfig("BNBBTC", "0.0000001", "0.001")
+    assert config.sizes() != SYMBOL_CONFIGS["BNBBTC"].sizes()
+    writeCheckpoint(checkpointPath(str(tmp_path), "BNBBTC"),
+                    _venueCheckpoint(adapter, config))
+    assert warmStarts(str(tmp_path), adapter) == {}
+
+    # Not a checkpoint
+    with open(checkpointPath(str(tmp_path), "BNBBTC"), "wb") as f:
+        f.write(b"not a checkpoint")
+    assert warmStarts(str(tmp_path), adapter) == {}
@@ -0,0 +1,155 @@
+import io
+import json
+
+import pytest
+
+import columnar
+from capture import captureBatches, captureWriter, readCapture
+from columnar import (columnarFeed, columnarFile, columnarWriter,
+                      convertCapture)
+from exchanges.base import depthSnapshot, depthUpdate
+from exchanges.binance import binanceAdapter
+from exchanges.simulated import diffGenerator
+from replay import replayer
+
+
+# adapter : binanceAdapter of BNBBTC, the venue the test captures are
+#           recorded from (its snapshot client is never used)
+@pytest.fixture
+def adapter():
+    adapter = binanceAdapter("BNBBTC")
+    yield adapter
+    adapter.client.close()
+
+
+# columnViews : run the test with the NumPy column views (if NumPy is
+#               installed) and with the memoryviews used without it
+@pytest.fixture(params = ["numpy", "memoryview"])
+def columnViews(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(columnar, "numpy", None)
+    return request.param
+
+
+# _capture : write a capture of a BNBBTC stream into `path`. Messages are
+#            received in batches sharing their receive time, including one
+#            update without levels, a message that is not a depth update,
+#            and a snapshot received at the same time as the messages before
+#            and after it.
+def _capture(path):
+    generator = diffGenerator("BNBBTC", seed = 7)
+    writer = captureWriter(str(path))
+    received = 1620000000.0
+    writer.snapshot(received, "BNBBTC",
+                    generator.snapshot_message(generator.snapshot(100)))
+    for batch in range(200):
+        received += 0.000125
+        for _ in range(batch % 4 + 1):
+            writer.message(received,
+                           generator.message(generator.next_update()))
+        if batch == 50:
+            generator.update_id += 1
+            writer.message(received, json.dumps({
+                "e": "depthUpdate", "E": generator.event_time, "s": "BNBBTC",
+                "U": generator.update_id, "u": generator.update_id,
+                "b": [], "a": []}))
+            writer.message(received, json.dumps({"result": None, "id": 1}))
+        if batch == 100:
+            writer.snapshot(received, "BNBBTC", generator.snapshot_message(
+                generator.snapshot(100)))
+            writer.message(received,
+                           generator.message(generator.next_update()))
+    writer.close()
+
+
+# _decoded : captureBatches with the messages decoded by `adapter` (as
+#            (symbol, depthUpdate) pairs, dropping those that are not
+#            updates) and the snapshots decoded
+def _decoded(batches, adapter):
+    for kind, received, payload in batches:
+        if kind == "messages":
+            events = [adapter.route(raw) for raw in payload]
+            events = [event for event in events if event is not None]
+            if events:
+                yield kind, received, events
+        else:
+            symbol, raw = payload
+            yield kind, received, (symbol, adapter.decode_snapshot(raw))
+
+
+# _replay : quotes written by a replay of `path`
+def _replay(feed, path):
+    out = io.StringIO()
+    replayer(feed, [0.01, 1, 100], [0.001], out = out).run(str(path))
+    return out.getvalue()
+
+
+def test_batches_match_capture(tmp_path, adapter, columnViews):
+    capture = tmp_path / "stream.cap"
+    converted = tmp_path / "stream.col"
+    _capture(capture)
+    rows = convertCapture(str(capture), str(converted), adapter)
+
+    data = columnarFile(str(converted))
+    try:
+        assert data.rows == rows
+        assert (data.configs["BNBBTC"].sizes() ==
+                adapter.config.sizes())
+        expected = list(_decoded(captureBatches(readCapture(str(capture))),
+                                 adapter))
+        batches = list(data.batches())
+    finally:
+        data.close()
+    assert [kind for kind, _, _ in batches] == \
+        [kind for kind, _, _ in expected]
+    for (_, received, payload), (_, expected_received, expected_payload) \
+            in zip(batches, expected):
+        # Receive times are stored in whole microseconds
+        assert received == pytest.approx(expected_received, abs = 1e-6)
+        assert payload == expected_payload
+
+
+def test_same_time_events_stay_apart(tmp_path, columnViews):
+    # Consecutive events of one symbol received together differ only by
+    # their ids, and an update without levels is a single row
+    configs = {"BNBBTC": diffGenerator("BNBBTC").config}
+    writer = columnarWriter(configs)
+    events = [depthUpdate(1, 2, 5, [(100, 1)], [(101, 1)]),
+              depthUpdate(3, 3, 5, [(100, 2)], []),
+              depthUpdate(4, 4, 5, [], []),
+              depthUpdate(5, 6, 5, [], [(102, 3), (103, 4)])]
+    for event in events:
+        writer.update(1.5, "BNBBTC", event)
+    writer.snapshot(1.5, "BNBBTC",
+                    depthSnapshot(6, [(100, 2)], [(101, 1)]))
+    writer.update(1.5, "BNBBTC", depthUpdate(7, 7, 6, [(99, 1)], []))
+    path = str(tmp_path / "events.col")
+    writer.write(path)
+
+    data = columnarFile(path)
+    try:
+        assert data._starts() == [0, 2, 3, 4, 6, 8]
+        assert list(data.batches()) == [
+            ("messages", 1.5, [("BNBBTC", event) for event in events]),
+            ("snapshot", 1.5, ("BNBBTC", depthSnapshot(
+                6, [(100, 2)], [(101, 1)]))),
+            ("messages", 1.5, [("BNBBTC", depthUpdate(
+                7, 7, 6, [(99, 1)], []))])]
+    finally:
+        data.close()
+
+
+def test_replay_matches_capture(tmp_path, adapter, columnViews):
+    capture = tmp_path / "stream.cap"
+    converted = tmp_path / "stream.col"
+    _capture(capture)
+    convertCapture(str(capture), str(converted), adapter)
+
+    data = columnarFile(str(converted))
+    configs = data.configs
+    data.close()
+    expected = _replay(adapter, capture)
+    assert expected.count("snapshot") == 2
+    assert _replay(columnarFeed(configs), converted) == expected
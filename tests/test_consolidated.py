@@ -0,0 +1,197 @@
+import random
+
+from book import orderBook
+from consolidated import _commonSize, commonConfig, consolidatedBook
+from symbols import symbolConfig
+
+# Two venues quoting the same symbol on grids neither of which is a multiple
+# of the other: the common grid is 0.01 x 0.0001, with multiples 2 and 3
+CONFIGS = {"a": symbolConfig("BTCUSDT", "0.02", "0.0002"),
+           "b": symbolConfig("BTCUSDT", "0.03", "0.0003")}
+MULTS = {"a": 2, "b": 3}
+
+
+# _reference : (sort key, venue, price, quantity) of every level of one side
+#              of the venues' books on the common grid, best first - the
+#              order consolidatedSide merges them in
+def _reference(books, side):
+    sign = 1 if side == 'buy' else -1
+    levels = []
+    for venue, book in books.items():
+        ladder = book.bids if side == 'buy' else book.asks
+        mult = MULTS[venue]
+        for px, qty in ladder.levels.items():
+            levels.append((-sign * px * mult, venue, px * mult, qty * mult))
+    return sorted(levels)
+
+
+# _fill : brute-force consolidatedSide.fill
+def _fill(levels, lots):
+    total = 0
+    remaining = lots
+    venues = {}
+    for _, venue, px, qty in levels:
+        take = min(qty, remaining)
+        total += take * px
+        venues[venue] = venues.get(venue, 0) + take
+        remaining -= take
+        if not remaining:
+            return total, venues
+    return None
+
+
+# _fillNotional : brute-force consolidatedSide.fill_notional
+def _fillNotional(levels, budget):
+    lots = 0
+    spent = 0
+    for _, _, px, qty in levels:
+        if spent + px * qty >= budget:
+            take = (budget - spent) // px
+            return lots + take, spent + take * px
+        lots += qty
+        spent += px * qty
+    return None
+
+
+# _randomUpdates : random level changes around `mid` (in the venue's ticks),
+#                  a third of them deletions
+def _randomUpdates(rng, mid):
+    return [(mid + rng.randint(-50, 50),
+             0 if rng.random() < 0.3 else rng.randint(1, 500))
+            for _ in range(rng.randint(1, 10))]
+
+
+# _check : compare both sides of a consolidatedBook with the reference
+def _check(book, books, sizes, budgets):
+    for side, merged in (('buy', book.bids), ('sell', book.asks)):
+        levels = _reference(books, side)
+        for lots in sizes:
+            assert merged.fill(lots) == _fill(levels, lots)
+        for budget in budgets:
+            assert merged.fill_notional(budget) == \
+                _fillNotional(levels, budget)
+
+
+def test_common_size():
+    assert _commonSize(["0.01", "0.005"]) == ("0.005", [2, 1])
+    assert _commonSize(["0.02", "0.03"]) == ("0.01", [2, 3])
+    assert _commonSize(["1", "0.25", "0.1"]) == ("0.05", [20, 5, 2])
+
+
+def test_common_config():
+    config, mults = commonConfig("BTCUSDT", list(CONFIGS.values()))
+    assert config.name == "BTCUSDT"
+    assert config.sizes() == ("0.01", "0.0001")
+    assert mults == [(2, 2), (3, 3)]
+
+    # One venue's grid is already common
+    config, mults = commonConfig("BNBBTC", [
+        symbolConfig("BNBBTC", "0.000001", "0.001"),
+        symbolConfig("BNBBTC", "0.000005", "0.01")])
+    assert config.sizes() == ("0.000001", "0.001")
+    assert mults == [(1, 1), (5, 10)]
+
+
+def test_fills_match_reference():
+    rng = random.Random(5)
+    books = {venue: orderBook("BTCUSDT", config = config)
+             for venue, config in CONFIGS.items()}
+    book = consolidatedBook("BTCUSDT")
+    for venue, venueBook in books.items():
+        book.set_book(venue, venueBook)
+
+    # Both venues quote around the same price on their own grids (3000.00
+    # is 150000 ticks of 0.02 and 100000 ticks of 0.03)
+    mids = {"a": 150000, "b": 100000}
+    for _ in range(1000):
+        venue = rng.choice(list(books))
+        mids[venue] += rng.randint(-2, 2)
+        bids = _randomUpdates(rng, mids[venue] - 60)
+        asks = _randomUpdates(rng, mids[venue] + 60)
+        books[venue].apply_levels(bids, asks)
+        # The same sizes every time, so most fills come from the cache and
+        # an update on either venue must drop it when it matters
+        _check(book, books, [1, 300, 3000, 20000], [10 ** 6, 10 ** 9])
+
+
+def test_quotes_match_reference():
+    rng = random.Random(6)
+    books = {venue: orderBook("BTCUSDT", config = config)
+             for venue, config in CONFIGS.items()}
+    books["a"].apply_levels(_randomUpdates(rng, 149940),
+                            _randomUpdates(rng, 150060))
+    books["b"].apply_levels(_randomUpdates(rng, 99960),
+                            _randomUpdates(rng, 100040))
+    book = consolidatedBook("BTCUSDT")
+    for venue, venueBook in books.items():
+        book.set_book(venue, venueBook)
+    config = book.config
+    for q in book.quote([0.0001, 0.06, 0.5]):
+        lots = config.to_lots(q.size)
+        for price, venues, side in ((q.bid, q.bid_venues, 'buy'),
+                                    (q.ask, q.ask_venues, 'sell')):
+            result = _fill(_reference(books, side), lots)
+            if result is None:
+                assert price is None and venues is None
+                continue
+            total, lotsByVenue = result
+            assert price == config.price(total / lots)
+            assert venues == {venue: config.quantity(taken)
+                              for venue, taken in lotsByVenue.items()}
+
+
+def test_cache_follows_updates_on_every_venue():
+    books = {venue: orderBook("BTCUSDT", config = config)
+             for venue, config in CONFIGS.items()}
+    book = consolidatedBook("BTCUSDT")
+    for venue, venueBook in books.items():
+        book.set_book(venue, venueBook)
+    # Bids at 3000.00 on a (150000 * 2 common ticks, 5 * 2 common lots)
+    # and 2999.97 on b (99999 * 3 common ticks, 10 * 3 common lots)
+    books["a"].apply_levels([(150000, 5)], [])
+    books["b"].apply_levels([(99999, 10)], [])
+    assert book.bids.fill(20) == (10 * 300000 + 10 * 299997,
+                                  {"a": 10, "b": 10})
+
+    # Deeper than the fill on either venue: the cached result is kept
+    books["b"].apply_levels([(99990, 10)], [])
+    books["a"].apply_levels([(149000, 10)], [])
+    assert 20 in book.bids.fills
+
+    # Inside it, on the other venue than the last update: the cache is
+    # dropped and the fill follows the book
+    books["b"].apply_levels([(99999, 0)], [])
+    assert 20 not in book.bids.fills
+    assert book.bids.fill(20) == (10 * 300000 + 10 * 299970,
+                                  {"a": 10, "b": 10})
+
+
+def test_set_book_swaps_component():
+    book = consolidatedBook("BTCUSDT")
+    old = orderBook("BTCUSDT", config = CONFIGS["a"])
+    other = orderBook("BTCUSDT", config = CONFIGS["b"])
+    old.apply_levels([(150000, 5)], [(150001, 5)])
+    other.apply_levels([(99999, 5)], [(100001, 5)])
+    book.set_book("a", old)
+    book.set_book("b", other)
+    assert len(old.bids.watchers) == len(old.asks.watchers) == 1
+
+    # A rebuilt book replaces the venue's component, and the old ladders no
+    # longer report to the consolidated view
+    new = orderBook("BTCUSDT", config = CONFIGS["a"])
+    new.apply_levels([(149999, 5)], [(150002, 5)])
+    version = book.version
+    book.set_book("a", new)
+    assert book.version != version
+    assert not old.bids.watchers and not old.asks.watchers
+    assert len(new.bids.watchers) == len(new.asks.watchers) == 1
+    assert len(other.bids.watchers) == len(other.asks.watchers) == 1
+    assert book.bids.fill(20) == (10 * 299998 + 10 * 299997,
+                                  {"a": 10, "b": 10})
+
+    # Updates of the old book leave the cached fill alone
+    old.apply_levels([(160000, 5)], [])
+    assert 20 in book.bids.fills
+    new.apply_levels([(160000, 5)], [])
+    assert 20 not in book.bids.fills
+    assert book.bids.fill(20) == (10 * 320000 + 10 * 299998, {"a": 20})
@@ -0,0 +1,137 @@
+import os
+
+import pytest
+
+from book import orderBook
+from exchanges.base import depthUpdate
+import publishing
+from publishing import SEQUENCE, quotePublisher, quoteReader
+from rendering import quoteRenderer
+
+
+# sameProcessReaders : readers here attach in the process that created the
+#                      block, where unregistering it from the resource
+#                      tracker (as readers do before Python 3.13) would drop
+#                      the creator's registration too
+@pytest.fixture(autouse = True)
+def sameProcessReaders(monkeypatch):
+    monkeypatch.setattr(publishing.resource_tracker, "unregister",
+                        lambda name, rtype: None)
+
+
+# publisher : quotePublisher of BNBBTC and ETHBTC on a block unique to the
+#             test, removed afterwards
+@pytest.fixture
+def publisher(request):
+    name = f"test-{os.getpid()}-{request.node.name}"[:30]
+    publisher = quotePublisher(name, ["BNBBTC", "ETHBTC"], [1.0, 100.0],
+                               [0.01])
+    yield publisher
+    publisher.close()
+
+
+# _event : stand-in for the depthUpdate handed to on_update callbacks
+def _event(event_time):
+    return depthUpdate(1, 1, event_time, [], [])
+
+
+# _book : BNBBTC book with one level per side
+def _book():
+    book = orderBook("BNBBTC")
+    book.apply_diff([["0.008100", "5.000"]], [["0.008200", "2.000"]])
+    return book
+
+
+def test_round_trip(publisher):
+    reader = quoteReader(publisher.name)
+    try:
+        assert reader.symbols == ["BNBBTC", "ETHBTC"]
+        assert reader.read("BNBBTC") is None
+        assert reader.sequence("BNBBTC") == 0
+
+        publisher.publish("BNBBTC", _book(), 1620000000000)
+        quote = reader.read("BNBBTC")
+        assert quote.sequence == reader.sequence("BNBBTC") == 2
+        assert quote.event_time == 1620000000000
+        assert (quote.bid, quote.bid_qty, quote.ask, quote.ask_qty) == \
+            (0.0081, 5.0, 0.0082, 2.0)
+        assert [(q.size, q.bid, q.ask) for q in quote.quotes] == \
+            [(1.0, 0.0081, 0.0082), (100.0, None, None)]
+        notional = quote.notionalQuotes[0]
+        assert notional.budget == 0.01
+        assert notional.bid_qty == pytest.approx(0.01 / 0.0081, abs = 0.001)
+        assert notional.ask_qty == pytest.approx(0.01 / 0.0082, abs = 0.001)
+
+        # Other records are untouched
+        assert reader.read("ETHBTC") is None
+    finally:
+        reader.close()
+
+
+def test_quotes_follow_the_render_cadence(publisher, capsys):
+    reader = quoteReader(publisher.name)
+    try:
+        renderer = quoteRenderer([1.0, 100.0], [0.01], interval = 60,
+                                 publisher = publisher)
+        book = orderBook("BNBBTC")
+        renderer.set_book("BNBBTC", book)
+
+        # Updates only publish the top of book
+        book.apply_diff([["0.008100", "5.000"]], [["0.008200", "2.000"]])
+        publisher.on_update("BNBBTC", book, _event(1620000000000))
+        book.apply_diff([], [["0.008150", "1.000"]])
+        publisher.on_update("BNBBTC", book, _event(1620000000001))
+        quote = reader.read("BNBBTC")
+        assert quote.event_time == 1620000000001
+        assert (quote.bid, quote.ask, quote.ask_qty) == (0.0081, 0.00815, 1.0)
+        assert [q.bid for q in quote.quotes] == [None, None]
+
+        # Rendering prices the changed book and publishes its quotes
+        renderer.render()
+        quote = reader.read("BNBBTC")
+        assert [(q.bid, q.ask) for q in quote.quotes] == \
+            [(0.0081, 0.00815), (None, None)]
+        assert quote.notionalQuotes[0].bid is not None
+
+        # Nothing is written again until the book changes
+        sequence = reader.sequence("BNBBTC")
+        renderer.rendered = None
+        renderer.render()
+        assert reader.sequence("BNBBTC") == sequence
+    finally:
+        reader.close()
+
+
+def test_busy_record_is_not_read(publisher):
+    reader = quoteReader(publisher.name, retries = 10)
+    try:
+        publisher.publish("BNBBTC", _book())
+        offset = publisher.layout.record(0)
+        SEQUENCE.pack_into(publisher.shm.buf, offset, 3)
+        assert reader.read("BNBBTC") is None
+    finally:
+        reader.close()
+
+
+def test_attach_after_interrupted_write(publisher):
+    # A writer that died mid-write left its record odd; the next one rounds
+    # it up, so records are odd only while being written again
+    publisher.publish("BNBBTC", _book())
+    SEQUENCE.pack_into(publisher.shm.buf, publisher.layout.record(0), 3)
+    worker = quotePublisher(publisher.name, ["BNBBTC"], [1.0, 100.0],
+                            [0.01], create = False)
+    reader = quoteReader(publisher.name)
+    try:
+        worker.publish("BNBBTC", _book())
+        quote = reader.read("BNBBTC")
+        assert quote is not None
+        assert quote.sequence == 6
+    finally:
+        reader.close()
+        worker.close()
+
+
+def test_attach_checks_layout(publisher):
+    with pytest.raises(ValueError):
+        quotePublisher(publisher.name, ["BNBBTC"], [2.0], [0.01],
+                       create = False)
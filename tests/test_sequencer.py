@@ -0,0 +1,97 @@
+from exchanges.base import depthUpdate
+from sequencer import depthSequencer
+
+
+# _event : depthUpdate covering update ids first_id..last_id, without levels
+def _event(first_id, last_id):
+    return depthUpdate(first_id, last_id, 0, [], [])
+
+
+def test_buffers_until_snapshot():
+    sequencer = depthSequencer()
+    assert not sequencer.synced
+    for first_id, last_id in ((1, 5), (6, 10), (11, 15)):
+        assert sequencer.push(_event(first_id, last_id)) == 'buffer'
+
+    # Events covered by the snapshot are dropped; the one straddling it and
+    # those after it are returned in order
+    events = sequencer.on_snapshot(7)
+    assert [(e.first_id, e.last_id) for e in events] == [(6, 10), (11, 15)]
+    assert sequencer.synced
+    assert sequencer.last_update_id == 15
+    assert sequencer.resyncs == 1
+    assert not sequencer.buffer
+
+
+def test_snapshot_newer_than_buffer():
+    sequencer = depthSequencer()
+    sequencer.push(_event(1, 5))
+    assert sequencer.on_snapshot(20) == []
+    assert sequencer.last_update_id == 20
+    assert sequencer.push(_event(15, 20)) == 'drop'
+    assert sequencer.push(_event(18, 22)) == 'apply'
+
+
+def test_stale_snapshot_keeps_buffer():
+    sequencer = depthSequencer()
+    sequencer.push(_event(10, 15))
+    sequencer.push(_event(16, 20))
+    assert sequencer.on_snapshot(5) is None
+    assert sequencer.stale_snapshots == 1
+    assert not sequencer.synced
+    assert len(sequencer.buffer) == 2
+
+    # A newer snapshot still lines up with the buffered events
+    events = sequencer.on_snapshot(12)
+    assert [(e.first_id, e.last_id) for e in events] == [(10, 15), (16, 20)]
+
+
+def test_gap_in_buffer_is_stale():
+    sequencer = depthSequencer()
+    sequencer.push(_event(1, 5))
+    sequencer.push(_event(8, 10))
+    assert sequencer.on_snapshot(3) is None
+    assert sequencer.stale_snapshots == 1
+
+
+def test_live_gap():
+    sequencer = depthSequencer()
+    sequencer.on_snapshot(100)
+    assert sequencer.push(_event(101, 105)) == 'apply'
+    assert sequencer.push(_event(90, 105)) == 'drop'
+    assert sequencer.push(_event(110, 112)) == 'gap'
+    assert sequencer.gaps == 1
+    assert not sequencer.synced
+
+    # Out of sync: events are buffered for the next snapshot
+    assert sequencer.push(_event(113, 115)) == 'buffer'
+    events = sequencer.on_snapshot(111)
+    assert [(e.first_id, e.last_id) for e in events] == [(110, 112),
+                                                         (113, 115)]
+    assert sequencer.resyncs == 2
+
+
+def test_covers():
+    sequencer = depthSequencer()
+    sequencer.push(_event(10, 15))
+    sequencer.push(_event(16, 20))
+    assert sequencer.covers(9)
+    assert sequencer.covers(17)
+    assert not sequencer.covers(8)
+    assert not sequencer.covers(20)
+
+
+def test_stats_and_reset():
+    sequencer = depthSequencer()
+    sequencer.on_snapshot(10)
+    sequencer.push(_event(20, 25))
+    sequencer.on_snapshot(30)
+    stats = sequencer.stats()
+    assert (stats["gaps"], stats["stale_snapshots"], stats["resyncs"]) == \
+        (1, 0, 2)
+    assert 0 <= stats["resync_p50"] <= stats["resync_max"]
+
+    sequencer.reset_counters()
+    assert sequencer.stats() == {"gaps": 0, "stale_snapshots": 0,
+                                 "resyncs": 0, "resync_p50": 0,
+                                 "resync_max": 0}